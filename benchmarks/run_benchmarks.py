@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the co2calculator calculations, station matching, import time and batch throughput
+
+All benchmarks run offline: geocoding and routing requests are replaced by functions returning fixed results, and
+train stations are matched against a synthetic station table of realistic size. Results are written as JSON
+(default: benchmarks/results/<commit>.json) and can be compared with the results of another commit.
+
+Usage: python benchmarks/run_benchmarks.py [--output FILE] [--compare FILE] [--sizes N ...] [--filter TEXT]
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import warnings
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import co2calculator  # noqa: E402
+import run_calculate  # noqa: E402
+from co2calculator import calculate, distances  # noqa: E402
+from co2calculator.stations import StationIndex, build_station_index  # noqa: E402
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# stations per country of the synthetic station table, roughly as in the Trainline station database
+STATION_COUNTS = {"DE": 12000, "FR": 8000, "IT": 5000, "CH": 3000, "AT": 2000}
+SYLLABLES = [
+    "berg", "burg", "heim", "feld", "bach", "dorf", "hausen", "stadt", "au", "brück", "wald", "see", "ingen",
+    "kirch", "lingen", "neu", "alt", "ober", "unter", "groß", "klein", "mar", "ville", "mont", "san", "saint",
+    "val", "ris", "lan", "ton", "sur", "bel", "ro", "na", "te", "li", "ga", "vi", "lo", "ma",
+]  # fmt: skip
+SUFFIXES = [
+    "",
+    "",
+    "",
+    " Hbf",
+    " Bahnhof",
+    " Gare",
+    " Centrale",
+    " Nord",
+    " Süd",
+    " West",
+    " Ost",
+    " (Main)",
+]
+
+
+def measure(function: Callable, repeat: int = 5) -> dict:
+    """Time a function: best time per call out of several runs of as many calls as fit into about 0.2 seconds"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {"seconds": best, "calls": number}
+
+
+def synthetic_stations(
+    path: Path, counts: Dict[str, int] = STATION_COUNTS, seed: int = 0
+) -> List[str]:
+    """Write a station database in the format of the Trainline stations.csv and return some of its names"""
+    rng = random.Random(seed)
+    names = []
+    lines = [
+        "id;name;slug;uic;uic8_sncf;latitude;longitude;parent_station_id;country;time_zone"
+    ]
+    for country, count in counts.items():
+        for _ in range(count):
+            n_syllables = rng.randint(2, 4)
+            name = "".join(
+                rng.choice(SYLLABLES) for _ in range(n_syllables)
+            ).capitalize() + rng.choice(SUFFIXES)
+            slug = name.lower().replace(" ", "-").replace("(", "").replace(")", "")
+            lat, lon = rng.uniform(36, 55), rng.uniform(-5, 17)
+            lines.append(
+                f"{len(lines)};{name};{slug};;;{lat:.6f};{lon:.6f};;{country};Europe/Berlin"
+            )
+            names.append((name, country))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return names
+
+
+def _fake_geocoding_structured(loc: dict):
+    """Offline replacement of geocoding_structured, with coordinates derived from the location"""
+    h = zlib.crc32(repr(sorted(loc.items())).encode()) % 10000
+    return loc.get("locality", ""), "DEU", [5 + h / 1000, 45 + h / 1000], 1.0
+
+
+@contextmanager
+def offline(station_index: StationIndex) -> Iterator[None]:
+    """Replace the requests to openrouteservice, and the station index"""
+    with mock.patch.object(
+        calculate, "geocoding_structured", _fake_geocoding_structured
+    ), mock.patch.object(calculate, "get_route", return_value=432.1), mock.patch.object(
+        distances, "load_station_index", return_value=station_index
+    ):
+        yield
+
+
+def calculator_benchmarks(station_names: List[str]) -> Dict[str, Callable]:
+    """Single calls of each calculation function"""
+    rng = random.Random(1)
+    queries = [
+        {"station_name": name, "country": country}
+        for name, country in rng.sample(station_names, 200)
+    ]
+    # slightly misspelled names, which cannot be matched exactly
+    fuzzy = [{**q, "station_name": q["station_name"][:-1].lower()} for q in queries]
+    next_query = itertools.cycle(queries).__next__
+    next_fuzzy = itertools.cycle(fuzzy).__next__
+    stops = [
+        {"locality": "Heidelberg", "country": "Germany"},
+        {"locality": "Berlin", "country": "Germany"},
+    ]
+    port_a = {"locality": "Nice", "country": "France"}
+    port_b = {"locality": "Bastia", "country": "France"}
+
+    return {
+        "calc_co2_car[distance]": lambda: co2calculator.calc_co2_car(
+            distance=100, passengers=2, size="medium"
+        ),
+        "calc_co2_car[stops]": lambda: co2calculator.calc_co2_car(
+            stops=stops, fuel_type="diesel"
+        ),
+        "calc_co2_motorbike": lambda: co2calculator.calc_co2_motorbike(
+            distance=100, size="large"
+        ),
+        "calc_co2_bus[distance]": lambda: co2calculator.calc_co2_bus(
+            distance=100, size="large", occupancy=80
+        ),
+        "calc_co2_bus[stops]": lambda: co2calculator.calc_co2_bus(stops=stops),
+        "calc_co2_train[distance]": lambda: co2calculator.calc_co2_train(distance=100),
+        "calc_co2_train[stations]": lambda: co2calculator.calc_co2_train(
+            stops=[next_query(), next_query()]
+        ),
+        "calc_co2_plane": lambda: co2calculator.calc_co2_plane(
+            "FRA", "JFK", seating_class="economy_class"
+        ),
+        "calc_co2_ferry": lambda: co2calculator.calc_co2_ferry(
+            port_a, port_b, seating_class="car_passenger"
+        ),
+        "calc_co2_electricity": lambda: co2calculator.calc_co2_electricity(
+            10000, "german_energy_mix"
+        ),
+        "calc_co2_heating": lambda: co2calculator.calc_co2_heating(
+            250, "woodchips", unit="kg"
+        ),
+        "calc_co2_businesstrip": lambda: co2calculator.calc_co2_businesstrip(
+            "car", distance=100, size="medium", fuel_type="diesel", roundtrip=True
+        ),
+        "calc_co2_commuting": lambda: co2calculator.calc_co2_commuting(
+            "bus", weekly_distance=60
+        ),
+        "geocoding_train_stations[exact]": lambda: distances.geocoding_train_stations(
+            next_query()
+        ),
+        "geocoding_train_stations[fuzzy]": lambda: distances.geocoding_train_stations(
+            next_fuzzy()
+        ),
+        "haversine": lambda: distances.haversine(49.4, 8.7, 52.5, 13.4),
+        "range_categories": lambda: co2calculator.range_categories(1234.5),
+    }
+
+
+def array_benchmarks(n: int = 10**6) -> Dict[str, Callable]:
+    """Vectorized functions on arrays of n elements"""
+    rng = np.random.default_rng(0)
+    lat1, lat2 = rng.uniform(-90, 90, (2, n))
+    lon1, lon2 = rng.uniform(-180, 180, (2, n))
+    distance = rng.uniform(0, 15000, n)
+    iata = np.array(list(distances.airports())[:500], dtype=object)
+    iata_start, iata_dest = iata[rng.integers(0, len(iata), (2, n))]
+    return {
+        f"haversine[{n}]": lambda: distances.haversine(lat1, lon1, lat2, lon2),
+        f"range_categories_batch[{n}]": lambda: co2calculator.range_categories_batch(
+            distance
+        ),
+        f"calc_co2_plane_batch[{n}]": lambda: co2calculator.calc_co2_plane_batch(
+            iata_start, iata_dest, "economy_class"
+        ),
+    }
+
+
+def import_time(repeat: int = 5) -> dict:
+    """Best time to import co2calculator in a new interpreter"""
+    code = "import time; t = time.perf_counter(); import co2calculator; print(time.perf_counter() - t)"
+    times = [
+        float(
+            subprocess.run(
+                [sys.executable, "-c", code],
+                cwd=ROOT,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        )
+        for _ in range(repeat)
+    ]
+    return {"seconds": min(times), "calls": 1}
+
+
+def batch_input(name: str, n: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic input file of run_calculate.py with n rows"""
+    rng = np.random.default_rng(seed)
+    columns = {"id": np.arange(1, n + 1), "user_id": rng.integers(1, 100, n)}
+    if name == "business_trips_car":
+        columns.update(
+            passengers=rng.integers(1, 5, n),
+            car_fuel=rng.choice(["gasoline", "diesel", "electric"], n),
+            car_size=rng.choice(["small", "medium", "large"], n),
+            distance_km=rng.uniform(1, 1000, n).round(1),
+            stops="",
+        )
+    elif name == "business_trips_plane":
+        columns.update(
+            IATA_start=rng.choice(["FRA", "MUC", "BER", "ZRH"], n),
+            IATA_destination=rng.choice(["JFK", "LJU", "CDG", "LHR", "NRT"], n),
+            flight_class=rng.choice(["Economy class", "Business class"], n),
+        )
+    elif name == "electricity":
+        columns.update(
+            consumption_kwh=rng.uniform(1000, 100000, n).round(),
+            fuel_type="german energy mix",
+        )
+    elif name == "heating":
+        columns.update(
+            consumption=rng.uniform(10, 10000, n).round(),
+            energy_unit="kWh",
+            fuel_type="gas",
+        )
+    if name.startswith("business_trips_"):
+        columns["roundtrip"] = rng.choice([True, False], n)
+    return pd.DataFrame(columns)
+
+
+def batch_throughput(
+    sizes: List[int], chunksize: int = 10000, name_filter: str = ""
+) -> Dict[str, dict]:
+    """Rows per second of run_calculate.py for input files of the given numbers of rows
+
+    Only the benchmarks whose name (run_calculate[<input file>,<rows>]) contains name_filter are run.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in [
+            "business_trips_car",
+            "business_trips_plane",
+            "electricity",
+            "heating",
+        ]:
+            for n in sizes:
+                if name_filter not in f"run_calculate[{name},{n}]":
+                    continue
+                path = Path(tmp) / f"{name}.csv"
+                batch_input(name, n).to_csv(path, sep=";", index=False)
+                start = time.perf_counter()
+                n_rows, _, _, _ = run_calculate.process_file(
+                    path, Path(tmp) / f"{name}_calc.csv", chunksize
+                )
+                seconds = time.perf_counter() - start
+                results[f"run_calculate[{name},{n}]"] = {
+                    "seconds": seconds,
+                    "rows": n_rows,
+                    "rows_per_s": n_rows / seconds,
+                }
+    return results
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {
+        "commit": commit,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """Print the times of the results relative to the baseline (ratio > 1: slower than the baseline)"""
+    print(f"\n{'benchmark':<48} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old, new = baseline["results"][name]["seconds"], result["seconds"]
+        print(f"{name:<48} {old:>12.3e} {new:>12.3e} {new / old:>7.2f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--output", type=Path, default=None, help="JSON file of the results"
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        default=None,
+        help="JSON file of results to compare with",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="*",
+        default=[1000, 100000, 1000000],
+        help="numbers of rows of the batch throughput benchmarks (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--filter", default="", help="only run benchmarks whose name contains this text"
+    )
+    args = parser.parse_args(argv)
+
+    results = {"meta": metadata(), "results": {}}
+
+    def record(name: str, result: dict) -> None:
+        results["results"][name] = result
+        extra = (
+            f" ({result['rows_per_s']:,.0f} rows/s)" if "rows_per_s" in result else ""
+        )
+        print(f"{name:<48} {result['seconds']:>12.3e} s{extra}", flush=True)
+
+    name = "import co2calculator"
+    if args.filter in name:
+        record(name, import_time())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        station_names = synthetic_stations(Path(tmp) / "stations.csv")
+        station_index = StationIndex(
+            build_station_index(Path(tmp) / "stations.csv", Path(tmp) / "index.npz")
+        )
+        # warnings about default values would be printed once per call site; they are not part of the results
+        with offline(station_index), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            benchmarks = {**calculator_benchmarks(station_names), **array_benchmarks()}
+            for name, function in benchmarks.items():
+                if args.filter in name:
+                    record(name, measure(function))
+            for name, result in batch_throughput(
+                args.sizes, name_filter=args.filter
+            ).items():
+                record(name, result)
+
+    output = args.output or RESULTS_DIR / f"{results['meta']['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print(f"Results written to {output}")
+    if args.compare is not None:
+        compare(results, json.loads(args.compare.read_text(encoding="utf-8")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
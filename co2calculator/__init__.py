@@ -1 +1,26 @@
 from .calculate import *
+
+# The batch functions require pandas, which is only imported when one of them is accessed
+_BATCH_FUNCTIONS = {
+    "calc_co2_businesstrip_batch",
+    "calc_co2_commuting_batch",
+    "calc_co2_electricity_batch",
+    "calc_co2_heating_batch",
+    "calc_co2_plane_batch",
+    "commuting_emissions_group_batch",
+    "lookup_emission_factors",
+    "range_categories_batch",
+}
+
+
+def __getattr__(name: str):
+    if name in _BATCH_FUNCTIONS:
+        from . import batch
+
+        return getattr(batch, name)
+    # the DataFrames of the factor tables are loaded (with pandas) on first access, so "import *" does not export them
+    from . import calculate
+
+    if name in calculate._DATAFRAME_FILES:
+        return getattr(calculate, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
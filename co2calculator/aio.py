@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Async variants of the calculation functions, for use in asyncio applications
+
+The stops of a trip are geocoded concurrently, and requests to openrouteservice run in worker threads, so that they
+do not block the event loop. All requests of the process share the rate limits of the openrouteservice endpoints
+(see ``co2calculator.distances.set_rate_limit``): requests beyond the quota wait in their worker thread instead of
+being rejected by the API.
+"""
+
+import asyncio
+from typing import List, Tuple
+
+from ._types import Kilogram, Kilometer
+from .calculate import (
+    _businesstrip_stops,
+    _crow_flies_distance,
+    _geocoding_stop,
+    _geocoding_train_stop,
+    calc_co2_bus,
+    calc_co2_businesstrip,
+    calc_co2_car,
+    calc_co2_ferry,
+    calc_co2_motorbike,
+    calc_co2_plane,
+    calc_co2_train,
+)
+from .distances import get_route
+
+
+async def _geocode_stops(stops: list, geocode=_geocoding_stop) -> List[list]:
+    """Geocode all stops concurrently and return their coordinates in the order of the stops"""
+    return await asyncio.gather(*(asyncio.to_thread(geocode, loc) for loc in stops))
+
+
+async def _route_distance(stops: list) -> Kilometer:
+    """Driving distance along the stops"""
+    coords = await _geocode_stops(stops)
+    return await asyncio.to_thread(get_route, coords, "driving-car")
+
+
+async def _bus_distance(stops: list) -> Kilometer:
+    """Distance along the bus stops as the crow flies, accounted for detour"""
+    return _crow_flies_distance(await _geocode_stops(stops), "bus")
+
+
+async def _train_distance(stops: list) -> Kilometer:
+    """Distance along the train stations as the crow flies, accounted for detour"""
+    coords = await _geocode_stops(stops, geocode=_geocoding_train_stop)
+    return _crow_flies_distance(coords, "train")
+
+
+async def acalc_co2_car(
+    distance: Kilometer = None,
+    stops: list = None,
+    passengers: int = None,
+    size: str = None,
+    fuel_type: str = None,
+) -> Tuple[Kilogram, Kilometer]:
+    """Async variant of ``calc_co2_car``, with the same parameters and return values"""
+    if distance is None and stops is not None:
+        distance = await _route_distance(stops)
+    return calc_co2_car(
+        distance=distance, passengers=passengers, size=size, fuel_type=fuel_type
+    )
+
+
+async def acalc_co2_motorbike(
+    distance: Kilometer = None, stops: list = None, size: str = None
+) -> Tuple[Kilogram, Kilometer]:
+    """Async variant of ``calc_co2_motorbike``, with the same parameters and return values"""
+    if distance is None and stops is not None:
+        distance = await _route_distance(stops)
+    return calc_co2_motorbike(distance=distance, size=size)
+
+
+async def acalc_co2_bus(
+    distance: Kilometer = None,
+    stops: list = None,
+    size: str = None,
+    fuel_type: str = None,
+    occupancy: int = None,
+    vehicle_range: str = None,
+) -> Tuple[Kilogram, Kilometer]:
+    """Async variant of ``calc_co2_bus``, with the same parameters and return values"""
+    if distance is None and stops is not None:
+        distance = await _bus_distance(stops)
+    return calc_co2_bus(
+        distance=distance,
+        size=size,
+        fuel_type=fuel_type,
+        occupancy=occupancy,
+        vehicle_range=vehicle_range,
+    )
+
+
+async def acalc_co2_train(
+    distance: Kilometer = None,
+    stops: list = None,
+    fuel_type: str = None,
+    vehicle_range: str = None,
+) -> Tuple[Kilogram, Kilometer]:
+    """Async variant of ``calc_co2_train``, with the same parameters and return values"""
+    if distance is None and stops is not None:
+        distance = await _train_distance(stops)
+    return calc_co2_train(
+        distance=distance, fuel_type=fuel_type, vehicle_range=vehicle_range
+    )
+
+
+async def acalc_co2_plane(
+    start: str, destination: str, seating_class: str = None
+) -> Tuple[Kilogram, Kilometer]:
+    """Async variant of ``calc_co2_plane``, with the same parameters and return values"""
+    return await asyncio.to_thread(
+        calc_co2_plane, start, destination, seating_class=seating_class
+    )
+
+
+async def acalc_co2_ferry(
+    start: dict, destination: dict, seating_class: str = None
+) -> Tuple[Kilogram, Kilometer]:
+    """Async variant of ``calc_co2_ferry``, with the same parameters and return values"""
+    return await asyncio.to_thread(
+        calc_co2_ferry, start, destination, seating_class=seating_class
+    )
+
+
+# distance along the stops of a trip, as computed by the calc_co2_<mode> functions
+_STOP_DISTANCES = {
+    "car": _route_distance,
+    "bus": _bus_distance,
+    "train": _train_distance,
+}
+
+
+async def acalc_co2_businesstrip(
+    transportation_mode: str,
+    start=None,
+    destination=None,
+    distance: Kilometer = None,
+    size: str = None,
+    fuel_type: str = None,
+    occupancy: int = None,
+    seating: str = None,
+    passengers: int = None,
+    roundtrip: bool = False,
+) -> Tuple[Kilogram, Kilometer, str, str]:
+    """Async variant of ``calc_co2_businesstrip``, with the same parameters and return values"""
+    if transportation_mode not in _STOP_DISTANCES:
+        return await asyncio.to_thread(
+            calc_co2_businesstrip,
+            transportation_mode,
+            start=start,
+            destination=destination,
+            distance=distance,
+            size=size,
+            fuel_type=fuel_type,
+            occupancy=occupancy,
+            seating=seating,
+            passengers=passengers,
+            roundtrip=roundtrip,
+        )
+
+    stops = _businesstrip_stops(transportation_mode, start, destination, distance)
+    if stops is not None:
+        distance = await _STOP_DISTANCES[transportation_mode](stops)
+    return calc_co2_businesstrip(
+        transportation_mode,
+        distance=distance,
+        size=size,
+        fuel_type=fuel_type,
+        occupancy=occupancy,
+        seating=seating,
+        passengers=passengers,
+        roundtrip=roundtrip,
+    )
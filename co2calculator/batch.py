@@ -0,0 +1,762 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Functions to calculate co2 emissions for many records at once"""
+
+import functools
+from typing import Mapping, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from . import calculate, instrumentation
+from .constants import KWH_TO_TJ
+from .diagnostics import current_diagnostics, report
+from .distances import airports, haversine
+from .factors import conversion_factors, detour_parameters, emission_factors
+from .prefetch import prefetch_airports, prefetch_businesstrips
+from .ranges import FLIGHT_RANGES, TRIP_RANGES, RangeBins
+
+BUSINESSTRIP_COLUMNS = [
+    "transportation_mode",
+    "start",
+    "destination",
+    "distance",
+    "size",
+    "fuel_type",
+    "occupancy",
+    "seating",
+    "passengers",
+    "roundtrip",
+]
+# optional column: list of locations of car, bus and train trips with intermediate stops
+STOPS_COLUMN = "stops"
+PLANE_SEATING_CLASSES = [
+    "average",
+    "economy_class",
+    "business_class",
+    "premium_economy_class",
+    "first_class",
+]
+
+
+def _as_frame(records: Union[pd.DataFrame, Mapping], columns: list) -> pd.DataFrame:
+    """Return the records as a DataFrame with all given columns (missing columns are filled with None)"""
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+    df = df.reset_index(drop=True)
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        df = df.assign(**{c: None for c in missing})
+    return df
+
+
+def _fill_default(values: pd.Series, default, code: str, message: str) -> pd.Series:
+    """Fill missing values with a default and report it once for all filled rows (given by the index)"""
+    missing = values.isna().to_numpy()
+    n_missing = int(missing.sum())
+    if n_missing:
+        report(
+            code,
+            message + " for {count} record(s). Using default value: '{default}'",
+            rows=values.index[missing],
+            n=n_missing,
+            count=n_missing,
+            default=default,
+        )
+        values = values.astype(object).where(~missing, default)
+    return values
+
+
+def lookup_emission_factors(keys: pd.DataFrame) -> np.ndarray:
+    """Look up the emission factor for every row of a table of key fields
+
+    Each distinct combination of key values is resolved once; the result is broadcast back to the rows.
+
+    :param keys: table whose columns are emission factor key fields (e.g. subcategory, size_class, fuel_type)
+    :type keys: pd.DataFrame
+    :return: emission factor for every row of ``keys``
+    :rtype: np.ndarray
+    :raises ValueError: listing all key combinations for which no unique emission factor is available
+    """
+    if keys.empty:
+        return np.empty(0)
+    codes = keys.groupby(list(keys.columns), dropna=False, sort=False).ngroup()
+    distinct = keys.drop_duplicates().to_dict("records")
+    factors = np.empty(len(distinct))
+    invalid = []
+    for i, key in enumerate(distinct):
+        try:
+            factors[i] = emission_factors().get(**key)
+        except (KeyError, ValueError):
+            invalid.append(key)
+    if invalid:
+        raise ValueError(
+            f"No emission factor available for the following combinations: {invalid}"
+        )
+    return factors[codes.to_numpy()]
+
+
+def range_categories_batch(
+    distance, bins: RangeBins = TRIP_RANGES
+) -> Tuple[pd.Categorical, pd.Categorical]:
+    """Function to categorize trips according to the travelled distance
+
+    :param distance: Distances travelled in km
+    :param bins: Table of range categories; default: very short haul (up to 500 km), short haul (up to 1500 km),
+                 medium haul (up to 4000 km) and long haul
+    :type distance: array-like
+    :type bins: RangeBins
+    :return: Range categories of the trips [very short haul, short haul, medium haul, long haul]
+             Range descriptions (i.e., what range of distances does to category correspond to)
+             Both share the codes of the bins (``.codes``); missing distances have no category.
+    :rtype: tuple[pd.Categorical, pd.Categorical]
+    """
+    codes = bins.codes(distance)
+    return (
+        pd.Categorical.from_codes(codes, bins.categories, validate=False),
+        pd.Categorical.from_codes(codes, bins.descriptions, validate=False),
+    )
+
+
+def _car_factors(trips: pd.DataFrame) -> np.ndarray:
+    size = _fill_default(
+        trips["size"], "average", "car.size.default", "Size of car was not provided"
+    )
+    fuel_type = _fill_default(
+        trips["fuel_type"],
+        "average",
+        "car.fuel_type.default",
+        "Car fuel type was not provided",
+    )
+    passengers = _fill_default(
+        trips["passengers"],
+        1,
+        "car.passengers.default",
+        "Number of car passengers was not provided",
+    )
+    keys = pd.DataFrame(
+        {"subcategory": "car", "size_class": size, "fuel_type": fuel_type}
+    )
+    return lookup_emission_factors(keys) / passengers.to_numpy(dtype=float)
+
+
+def _motorbike_factors(trips: pd.DataFrame) -> np.ndarray:
+    size = _fill_default(
+        trips["size"],
+        "average",
+        "motorbike.size.default",
+        "Size of motorbike was not provided",
+    )
+    keys = pd.DataFrame({"subcategory": "motorbike", "size_class": size})
+    return lookup_emission_factors(keys)
+
+
+def _bus_factors(
+    trips: pd.DataFrame, vehicle_range: str = "long-distance"
+) -> np.ndarray:
+    size = _fill_default(
+        trips["size"], "average", "bus.size.default", "Size of bus was not provided"
+    )
+    fuel_type = _fill_default(
+        trips["fuel_type"],
+        "diesel",
+        "bus.fuel_type.default",
+        "Bus fuel type was not provided",
+    )
+    unavailable = ~fuel_type.isin(["diesel", "cng", "hydrogen"]).to_numpy()
+    if unavailable.any():
+        n_unavailable = int(unavailable.sum())
+        report(
+            "bus.fuel_type.unavailable",
+            "Bus fuel type not available for {count} record(s). Using default value: 'diesel'",
+            rows=fuel_type.index[unavailable],
+            n=n_unavailable,
+            count=n_unavailable,
+        )
+        fuel_type = fuel_type.where(~unavailable, "diesel")
+    occupancy = _fill_default(
+        trips["occupancy"],
+        50,
+        "bus.occupancy.default",
+        "Occupancy was not provided",
+    )
+    keys = pd.DataFrame(
+        {
+            "subcategory": "bus",
+            "size_class": size,
+            "fuel_type": fuel_type,
+            "occupancy": occupancy.astype(float),
+            "range": vehicle_range,
+        }
+    )
+    return lookup_emission_factors(keys)
+
+
+def _train_factors(
+    trips: pd.DataFrame, vehicle_range: str = "long-distance"
+) -> np.ndarray:
+    fuel_type = _fill_default(
+        trips["fuel_type"],
+        "average",
+        "train.fuel_type.default",
+        "Train fuel type was not provided",
+    )
+    keys = pd.DataFrame(
+        {
+            "subcategory": "train",
+            "size_class": "average",
+            "fuel_type": fuel_type,
+            "range": vehicle_range,
+        }
+    )
+    return lookup_emission_factors(keys)
+
+
+# Modes which are computed column-wise if the distance is known. All other trips are passed to the scalar
+# calc_co2_businesstrip one by one.
+_FACTOR_FUNCTIONS = {"car": _car_factors, "bus": _bus_factors, "train": _train_factors}
+
+
+def _calc_co2_stops(record: dict, stops: list) -> Tuple[float, float]:
+    """Emissions and distance of a trip along several stops, computed like calc_co2_businesstrip would"""
+    transportation_mode = record["transportation_mode"]
+    if transportation_mode == "car":
+        return calculate.calc_co2_car(
+            stops=stops,
+            passengers=record["passengers"],
+            size=record["size"],
+            fuel_type=record["fuel_type"],
+        )
+    elif transportation_mode == "bus":
+        return calculate.calc_co2_bus(
+            stops=stops,
+            size=record["size"],
+            fuel_type=record["fuel_type"],
+            occupancy=record["occupancy"],
+            vehicle_range="long-distance",
+        )
+    elif transportation_mode == "train":
+        return calculate.calc_co2_train(
+            stops=stops, fuel_type=record["fuel_type"], vehicle_range="long-distance"
+        )
+    raise ValueError(
+        f"Intermediate stops are not supported for mode of transport '{transportation_mode}'."
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _plane_factor_matrix() -> Tuple[np.ndarray, np.ndarray]:
+    """Emission factors of flights by flight range (rows) and seating class (columns), and whether the seating class
+    is unavailable for the range, so that the factor of economy class is used instead"""
+    factors = np.empty((len(FLIGHT_RANGES.categories), len(PLANE_SEATING_CLASSES)))
+    unavailable = np.zeros(factors.shape, dtype=bool)
+    for i, flight_range in enumerate(FLIGHT_RANGES.categories):
+        for j, seating in enumerate(PLANE_SEATING_CLASSES):
+            try:
+                factors[i, j] = emission_factors().get(
+                    subcategory="plane", range=flight_range, seating=seating
+                )
+            except KeyError:
+                unavailable[i, j] = True
+                factors[i, j] = emission_factors().get(
+                    subcategory="plane", range=flight_range, seating="economy_class"
+                )
+    return factors, unavailable
+
+
+def _plane_emissions(
+    trips: pd.DataFrame, max_workers: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Emissions and distances of flights given by start and destination airport, computed like calc_co2_plane
+    would; events are reported for the rows given by the index of the trips"""
+    seating = _fill_default(
+        trips["seating"],
+        "average",
+        "plane.seating.default",
+        "Seating class was not provided",
+    )
+    seating_codes = pd.Index(PLANE_SEATING_CLASSES).get_indexer(seating)
+    if (seating_codes < 0).any():
+        raise ValueError(
+            f"No emission factor available for the specified seating classes "
+            f"{seating[seating_codes < 0].unique().tolist()}.\n"
+            f"Please use one of the following: {PLANE_SEATING_CLASSES}"
+        )
+
+    # coordinates of each distinct airport, geocoding those missing in the airport table once
+    codes = pd.concat([trips["start"], trips["destination"]]).str.strip().str.upper()
+    positions, iata = pd.factorize(codes)
+    if (positions < 0).any():
+        raise ValueError("Start and destination airport must be given as IATA codes.")
+    not_found = prefetch_airports(iata, max_workers=max_workers)
+    if not_found:
+        raise ValueError(f"Airports {not_found} not found.")
+    coords = np.array([airports()[code][1] for code in iata])[positions]
+    start, destination = coords[: len(trips)], coords[len(trips) :]
+
+    # great circle distance between the airports, with detour
+    distance = haversine(start[:, 1], start[:, 0], destination[:, 1], destination[:, 0])
+    detour_coefficient, detour_constant = detour_parameters().get(
+        transportation_mode="plane"
+    )
+    distance = detour_coefficient * distance + detour_constant
+
+    range_codes = FLIGHT_RANGES.codes(distance)
+    if (range_codes < 0).any():
+        missing = range_codes < 0
+        routes = (
+            pd.DataFrame(
+                {
+                    "start": iata[positions[: len(trips)]][missing],
+                    "destination": iata[positions[len(trips) :]][missing],
+                }
+            )
+            .value_counts(sort=False)
+            .to_dict()
+        )
+        raise ValueError(
+            f"Distance could not be computed for the following routes (with number of records): {routes}."
+        )
+    factors, unavailable = _plane_factor_matrix()
+    fallback = unavailable[range_codes, seating_codes]
+    if fallback.any():
+        combinations = range_codes[fallback] * len(PLANE_SEATING_CLASSES) + (
+            seating_codes[fallback]
+        )
+        for combination in np.unique(combinations):
+            i, j = divmod(int(combination), len(PLANE_SEATING_CLASSES))
+            rows = trips.index[fallback][combinations == combination]
+            report(
+                "plane.seating.unavailable",
+                "Seating class '{seating}' not available for {range} flights for {count} record(s). Switching to "
+                "'{default}'...",
+                rows=rows,
+                n=len(rows),
+                seating=PLANE_SEATING_CLASSES[j],
+                range=FLIGHT_RANGES.categories[i],
+                count=len(rows),
+                default="economy_class",
+            )
+
+    return distance * factors[range_codes, seating_codes], distance
+
+
+def calc_co2_businesstrip_batch(
+    trips: Union[pd.DataFrame, Mapping],
+    max_workers: int = 8,
+    range_bins: RangeBins = TRIP_RANGES,
+) -> Tuple[np.ndarray, np.ndarray, pd.Categorical, pd.Categorical]:
+    """Function to compute emissions for many business trips at once
+
+    The locations of trips given by start and destination are resolved first, with one request per distinct
+    location, route and airport (see :func:`co2calculator.prefetch.prefetch_businesstrips`; its statistics are recorded
+    as ``prefetch.<statistic>`` counters, see :mod:`co2calculator.instrumentation`). Car, bus and train
+    trips are then computed column-wise, with one emission factor lookup per distinct combination of trip specifics,
+    and plane trips as by :func:`calc_co2_plane_batch`. All other trips (ferries and trips whose locations could not
+    be resolved) are computed with :func:`co2calculator.calculate.calc_co2_businesstrip`.
+
+    :param trips: Table of trips with one row per trip, given as DataFrame or as mapping of column names to arrays.
+                  The columns correspond to the parameters of ``calc_co2_businesstrip``:
+                  transportation_mode, start, destination, distance, size, fuel_type, occupancy, seating,
+                  passengers, roundtrip. Except for transportation_mode, all columns are optional; missing values
+                  are treated like parameters that were not provided. Car, bus and train trips with intermediate
+                  stops can be given by a list of locations in the column ``stops`` instead of start and destination.
+    :param max_workers: maximum number of concurrent requests to openrouteservice
+    :param range_bins: Table of range categories (see ``range_categories_batch``)
+    :type trips: pd.DataFrame or dict
+    :type max_workers: int
+    :type range_bins: RangeBins
+    :return:    Emissions of the business trips in co2 equivalents,
+                Distances of the business trips,
+                Range categories of the business trips [very short haul, short haul, medium haul, long haul]
+                Range descriptions (i.e., what range of distances does to category correspond to)
+    :rtype: tuple[np.ndarray, np.ndarray, pd.Categorical, pd.Categorical]
+    """
+    columns = BUSINESSTRIP_COLUMNS + [STOPS_COLUMN]
+    trips = _as_frame(trips, columns)
+    mode = trips["transportation_mode"].to_numpy()
+    distance = pd.to_numeric(trips["distance"]).to_numpy(dtype=float, copy=True)
+    emissions = np.full(len(trips), np.nan)
+
+    has_distance = ~np.isnan(distance)
+    has_stops = (
+        trips["start"].notna()
+        | trips["destination"].notna()
+        | trips[STOPS_COLUMN].notna()
+    ).to_numpy()
+    both = has_distance & has_stops
+    if both.any():
+        report(
+            "businesstrip.locations.ignored",
+            "Both distance and start/stop location were provided. "
+            "Only distance will be used for emission calculation.",
+            rows=np.flatnonzero(both),
+            n=int(both.sum()),
+        )
+
+    # resolve start and destination of the remaining trips, each distinct location, route and airport once
+    pending = np.flatnonzero(~has_distance & has_stops)
+    if len(pending):
+        records = trips.iloc[pending][columns]
+        records = records.astype(object).where(records.notna(), None)
+        resolved, stats = prefetch_businesstrips(
+            records.to_dict("records"), max_workers=max_workers
+        )
+        for key, value in stats.items():
+            instrumentation.count(f"prefetch.{key}", value)
+        resolved = np.array(resolved, dtype=float)
+        distance[pending] = resolved
+        has_distance[pending] = ~np.isnan(resolved)
+
+    for transportation_mode, factor_function in _FACTOR_FUNCTIONS.items():
+        rows = np.flatnonzero((mode == transportation_mode) & has_distance)
+        if len(rows):
+            emissions[rows] = distance[rows] * factor_function(trips.iloc[rows])
+
+    # flights between airports, each distinct airport resolved once
+    flights = np.flatnonzero(mode == "plane")
+    if len(flights):
+        given = [
+            isinstance(start, str) and isinstance(destination, str)
+            for start, destination in zip(
+                trips["start"].iloc[flights], trips["destination"].iloc[flights]
+            )
+        ]
+        flights = flights[np.array(given, dtype=bool)]
+    if len(flights):
+        emissions[flights], distance[flights] = _plane_emissions(
+            trips.iloc[flights], max_workers
+        )
+
+    # remaining trips one by one
+    scalar_rows = np.flatnonzero(np.isnan(emissions))
+    if len(scalar_rows):
+        records = trips.iloc[scalar_rows][columns]
+        records = records.astype(object).where(records.notna(), None)
+        # events reported by the scalar functions are attributed to the row being calculated
+        diagnostics = current_diagnostics()
+        try:
+            for row, record in zip(scalar_rows, records.to_dict("records")):
+                if diagnostics is not None:
+                    diagnostics.row = int(row)
+                record["roundtrip"] = False
+                stops = record.pop(STOPS_COLUMN)
+                if stops is not None and record["distance"] is None:
+                    emissions[row], distance[row] = _calc_co2_stops(record, stops)
+                else:
+                    emissions[row], distance[row], _, _ = (
+                        calculate.calc_co2_businesstrip(**record)
+                    )
+        finally:
+            if diagnostics is not None:
+                diagnostics.row = None
+
+    roundtrip = trips["roundtrip"].eq(True).to_numpy(dtype=bool, na_value=False)
+    emissions[roundtrip] *= 2
+
+    range_category, range_description = range_categories_batch(distance, range_bins)
+
+    return emissions, distance, range_category, range_description
+
+
+def calc_co2_plane_batch(
+    iata_start, iata_dest, seating=None, roundtrip=False, max_workers: int = 8
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Function to compute emissions for many plane trips at once
+
+    Each distinct airport is looked up once (airports missing in the airport table are geocoded concurrently). The
+    distances, flight ranges and emission factors of all trips are then computed with array operations.
+
+    :param iata_start: IATA codes of the start airports
+    :param iata_dest: IATA codes of the destination airports
+    :param seating: Seating class per trip, or one for all trips ["average", "economy_class", "business_class",
+                    "premium_economy_class", "first_class"]; missing values default to average
+    :param roundtrip: whether the trip is a round trip, per trip or one for all trips
+    :param max_workers: maximum number of concurrent requests to openrouteservice
+    :type iata_start: array-like
+    :type iata_dest: array-like
+    :type seating: array-like or str
+    :type roundtrip: array-like or bool
+    :type max_workers: int
+    :return: Emissions of the flights in co2 equivalents, distances of the flights (one way)
+    :rtype: tuple[np.ndarray, np.ndarray]
+    :raises ValueError: if seating classes are invalid, or airports cannot be found
+    """
+    trips = pd.DataFrame(
+        {
+            "start": np.asarray(iata_start, dtype=object),
+            "destination": np.asarray(iata_dest, dtype=object),
+        }
+    )
+    trips["seating"] = np.broadcast_to(np.asarray(seating, dtype=object), len(trips))
+    emissions, distance = _plane_emissions(trips, max_workers)
+    roundtrip = pd.Series(
+        np.broadcast_to(np.asarray(roundtrip, dtype=object), len(trips))
+    )
+    emissions[roundtrip.eq(True).to_numpy(dtype=bool)] *= 2
+    return emissions, distance
+
+
+def calc_co2_electricity_batch(
+    consumption, fuel_type=None, energy_share=1.0
+) -> np.ndarray:
+    """Function to compute electricity emissions for many records at once
+
+    :param consumption: energy consumption in kWh per record
+    :param fuel_type: energy (mix) used for electricity per record, or one for all records
+                      [german_energy_mix, solar]; missing values default to german_energy_mix
+    :param energy_share: the research group's approximate share of the total electricity energy consumption, per
+                         record or one for all records
+    :type consumption: array-like
+    :type fuel_type: array-like or str
+    :type energy_share: array-like or float
+    :return: total emissions of electricity energy consumption per record
+    :rtype: np.ndarray
+    """
+    consumption = np.asarray(consumption, dtype=float)
+    fuel_type = pd.Series(
+        np.broadcast_to(np.asarray(fuel_type, dtype=object), consumption.shape)
+    )
+    fuel_type = _fill_default(
+        fuel_type,
+        "german_energy_mix",
+        "electricity.fuel_type.default",
+        "No fuel type or energy mix specified",
+    )
+    co2e = lookup_emission_factors(
+        pd.DataFrame({"category": "electricity", "fuel_type": fuel_type})
+    )
+    # co2 equivalents for heating and electricity refer to a consumption of 1 TJ
+    return consumption * np.asarray(energy_share, dtype=float) / KWH_TO_TJ * co2e
+
+
+# units of heating energy consumption; consumption in other units is converted to kWh
+HEATING_UNITS = ("kWh", "l", "kg", "m^3")
+
+
+@functools.lru_cache(maxsize=None)
+def heating_factor_matrix() -> Tuple[pd.Index, pd.Index, np.ndarray]:
+    """Emission factors of heating per unit of consumption, for all combinations of fuel type and unit
+
+    The emission factors per TJ are combined with the conversion factors to kWh (1 for kWh), so that the emissions
+    of a consumption are ``consumption * matrix[fuel_code, unit_code]``. The codes are the positions of the fuel type
+    and unit in the returned indices, as returned by ``get_indexer``; the code -1 of an unknown fuel type or unit
+    selects the last row or column, which is NaN like all combinations without conversion factor.
+
+    :return: fuel types (rows), units (columns), emission factors in kg co2e per unit of consumption
+    :rtype: tuple[pd.Index, pd.Index, np.ndarray]
+    """
+    fuel_types = pd.Index(
+        sorted(
+            {
+                fuel_type
+                for category, fuel_type in emission_factors().index(
+                    ("category", "fuel_type")
+                )
+                if category == "heating" and fuel_type is not None
+            }
+        )
+    )
+    units = pd.Index(HEATING_UNITS)
+    conversion = np.full((len(fuel_types) + 1, len(units) + 1), np.nan)
+    conversion[:-1, units.get_loc("kWh")] = 1.0
+    for (fuel, unit), value in conversion_factors().items():
+        if fuel in fuel_types and unit in units:
+            conversion[fuel_types.get_loc(fuel), units.get_loc(unit)] = value
+    co2e = np.append(
+        [emission_factors().get(category="heating", fuel_type=f) for f in fuel_types],
+        np.nan,
+    )
+    # co2 equivalents for heating and electricity refer to a consumption of 1 TJ
+    return fuel_types, units, conversion * co2e[:, np.newaxis] / KWH_TO_TJ
+
+
+def calc_co2_heating_batch(
+    consumption, fuel_type, unit=None, area_share=1.0
+) -> np.ndarray:
+    """Function to compute heating emissions for many records at once
+
+    :param consumption: energy consumption per record
+    :param fuel_type: fuel type used for heating per record, or one for all records [coal, district_heating,
+                      electricity, gas, heat_pump_air, heat_pump_ground, liquid_gas, oil, pellet, solar, woodchips]
+    :param unit: unit of energy consumption per record, or one for all records [kWh, l, kg, m^3]; missing values
+                 default to kWh
+    :param area_share: share of building area used by research group, per record or one for all records
+    :type consumption: array-like
+    :type fuel_type: array-like or str
+    :type unit: array-like or str
+    :type area_share: array-like or float
+    :return: total emissions of heating energy consumption per record
+    :rtype: np.ndarray
+    :raises ValueError: listing all combinations of fuel type and unit of the records for which no emission or
+                        conversion factor is available, with their numbers of records
+    """
+    consumption = np.asarray(consumption, dtype=float)
+    fuel_type = np.broadcast_to(np.asarray(fuel_type, dtype=object), consumption.shape)
+    unit = pd.Series(np.broadcast_to(np.asarray(unit, dtype=object), consumption.shape))
+    unit = _fill_default(
+        unit, "kWh", "heating.unit.default", "Unit was not provided"
+    ).to_numpy()
+
+    fuel_types, units, matrix = heating_factor_matrix()
+    co2e = matrix[fuel_types.get_indexer(fuel_type), units.get_indexer(unit)]
+
+    invalid = np.isnan(co2e)
+    if invalid.any():
+        combinations = (
+            pd.DataFrame({"fuel_type": fuel_type[invalid], "unit": unit[invalid]})
+            .value_counts(dropna=False, sort=False)
+            .to_dict()
+        )
+        raise ValueError(
+            f"No conversion factor available for the following combinations of fuel type and unit (with number "
+            f"of records): {combinations}. Alternatively, provide consumption in the unit kWh."
+        )
+
+    area_share = np.asarray(area_share, dtype=float)
+    invalid_share = np.broadcast_to(area_share > 1, consumption.shape)
+    if invalid_share.any():
+        rows = np.flatnonzero(invalid_share)
+        report(
+            "heating.area_share.invalid",
+            "Share of building area must be a float in the interval (0,1], but was larger for {count} record(s). "
+            "The parameter will be set to '1.0' instead",
+            rows=rows,
+            n=len(rows),
+            count=len(rows),
+        )
+
+    return consumption * area_share * co2e
+
+
+COMMUTING_COLUMNS = [
+    "user",
+    "group",
+    "transportation_mode",
+    "weekly_distance",
+    "size",
+    "fuel_type",
+    "occupancy",
+    "passengers",
+    "workweeks",
+]
+# columns of a table of working groups, as in data/test_data_users/working_groups.csv
+WORKING_GROUP_COLUMNS = ["id", "name", "representative_user_id", "n_members"]
+
+# Modes of commutes whose emission factor depends on the specifics of the commute; buses and trains are local
+# (modes with one emission factor are shared with the scalar path: calculate._COMMUTING_FACTOR_KEYS)
+_COMMUTING_FACTOR_FUNCTIONS = {
+    "car": _car_factors,
+    "motorbike": _motorbike_factors,
+    "bus": functools.partial(_bus_factors, vehicle_range="local"),
+    "train": functools.partial(_train_factors, vehicle_range="local"),
+}
+
+
+def calc_co2_commuting_batch(
+    commutes: Union[pd.DataFrame, Mapping],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Function to compute emissions for many commutes at once
+
+    :param commutes: Table of commutes with one row per user and mode of transport, given as DataFrame or as mapping
+                     of column names to arrays. The columns correspond to the parameters of ``calc_co2_commuting``:
+                     transportation_mode, weekly_distance, size, fuel_type, occupancy, passengers; and workweeks,
+                     the number of weeks the user was working in the period (e.g., the previous year). The columns
+                     user and group are not used here (see ``commuting_emissions_group_batch``). Except for
+                     transportation_mode, weekly_distance and workweeks, all columns are optional; missing values are
+                     treated like parameters that were not provided.
+    :type commutes: pd.DataFrame or dict
+    :return:    Weekly emissions of the commutes in co2 equivalents,
+                Emissions of the commutes in the period (weekly emissions times workweeks)
+    :rtype: tuple[np.ndarray, np.ndarray]
+    :raises ValueError: if a mode of transport is not supported, or if weekly_distance or workweeks are missing
+    """
+    commutes = _as_frame(commutes, COMMUTING_COLUMNS)
+    mode = commutes["transportation_mode"]
+    unknown = ~mode.isin(
+        list(_COMMUTING_FACTOR_FUNCTIONS) + list(calculate._COMMUTING_FACTOR_KEYS)
+    ).to_numpy()
+    if unknown.any():
+        raise ValueError(
+            f"Transportation modes {mode[unknown].unique().tolist()} not found in database."
+        )
+    weekly_distance = pd.to_numeric(commutes["weekly_distance"]).to_numpy(dtype=float)
+    workweeks = pd.to_numeric(commutes["workweeks"]).to_numpy(dtype=float)
+    for name, values in (
+        ("weekly_distance", weekly_distance),
+        ("workweeks", workweeks),
+    ):
+        n_missing = int(np.isnan(values).sum())
+        if n_missing:
+            raise ValueError(f"Parameter {name} missing for {n_missing} record(s).")
+
+    mode = mode.to_numpy()
+    factors = np.empty(len(commutes))
+    for transportation_mode, factor_function in _COMMUTING_FACTOR_FUNCTIONS.items():
+        rows = np.flatnonzero(mode == transportation_mode)
+        if len(rows):
+            factors[rows] = factor_function(commutes.iloc[rows])
+    for transportation_mode, key in calculate._COMMUTING_FACTOR_KEYS.items():
+        rows = mode == transportation_mode
+        if rows.any():
+            factors[rows] = emission_factors().get(**key)
+
+    weekly_co2e = weekly_distance * factors
+    return weekly_co2e, weekly_co2e * workweeks
+
+
+def commuting_emissions_group_batch(
+    commutes: Union[pd.DataFrame, Mapping],
+    groups: Union[pd.DataFrame, Mapping],
+    emissions=None,
+) -> pd.DataFrame:
+    """Function to compute the commuting emissions of many groups at once, extrapolated from the participants
+    of each group to all its members (see ``commuting_emissions_group``)
+
+    .. note:: Assumption: a representative sample of group members answered the questionnaire.
+
+    :param commutes: Table of commutes as for ``calc_co2_commuting_batch``, with the columns user (id of the user who
+                     answered the questionnaire) and group (id of the user's working group)
+    :param groups: Table of working groups with the columns of ``data/test_data_users/working_groups.csv``: id, name,
+                   representative_user_id and n_members (total number of members of the group)
+    :param emissions: Emissions of the commutes (e.g., the second result of ``calc_co2_commuting_batch``), calculated
+                      from the commutes if not given
+    :type commutes: pd.DataFrame or dict
+    :type groups: pd.DataFrame or dict
+    :type emissions: array-like
+    :return: The groups, indexed by id, with the additional columns n_participants (number of users with commutes),
+             co2e (emissions aggregated for the participants) and group_co2e (estimated emissions of the entire
+             group; NaN for groups without participants)
+    :rtype: pd.DataFrame
+    :raises ValueError: if commutes refer to groups which are not in the table of groups
+    """
+    commutes = _as_frame(commutes, COMMUTING_COLUMNS)
+    groups = _as_frame(groups, WORKING_GROUP_COLUMNS).set_index("id")
+    if emissions is None:
+        _, emissions = calc_co2_commuting_batch(commutes)
+
+    unknown = ~commutes["group"].isin(groups.index).to_numpy()
+    if unknown.any():
+        raise ValueError(
+            f"Working groups {commutes['group'][unknown].unique().tolist()} not found."
+        )
+    participants = (
+        pd.DataFrame(
+            {
+                "group": commutes["group"].to_numpy(),
+                "user": commutes["user"].to_numpy(),
+                "co2e": np.asarray(emissions, dtype=float),
+            }
+        )
+        .groupby("group")
+        .agg(n_participants=("user", "nunique"), co2e=("co2e", "sum"))
+    )
+
+    result = groups.join(participants)
+    result["n_participants"] = result["n_participants"].fillna(0).astype(int)
+    result["co2e"] = result["co2e"].fillna(0.0)
+    result["group_co2e"] = (
+        result["co2e"]
+        / result["n_participants"].where(result["n_participants"] > 0)
+        * result["n_members"]
+    )
+    return result
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Caches for results of openrouteservice requests"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+
+def _canonical(value):
+    """Normalize a key component: case and whitespace of strings, order of dictionary keys"""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {
+            str(k): _canonical(v) for k, v in sorted(value.items()) if v is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def canonical_key(*parts) -> str:
+    """Build a cache key from the given parts, so that equivalent requests share one entry
+
+    Strings are compared case-insensitively with collapsed whitespace, dictionaries irrespective of the order of
+    their keys. Dictionary entries with value None are ignored.
+
+    :param parts: JSON-serializable components of the request, e.g. endpoint name and parameters
+    :return: key
+    :rtype: str
+    """
+    return json.dumps(_canonical(list(parts)), sort_keys=True, separators=(",", ":"))
+
+
+class Cache(ABC):
+    """Base class for caches of JSON-serializable values with optional expiry and size limit
+
+    ``None`` cannot be stored, since ``get`` returns it for missing entries. Negative results (e.g. no place found)
+    should be stored as empty containers.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        """
+        :param ttl: time in seconds after which entries expire; None for no expiry
+        :param max_entries: maximum number of entries; least recently used entries are evicted beyond this size.
+                            None for no limit
+        :type ttl: float
+        :type max_entries: int
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created >= self.ttl
+
+    @abstractmethod
+    def get(self, key: str):
+        """Return the cached value for the key, or None if there is no valid entry"""
+
+    @abstractmethod
+    def set(self, key: str, value) -> None:
+        """Store a value for the key"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all entries"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of entries"""
+
+    def stats(self) -> dict:
+        """Number of hits, misses and evictions since the cache was created, hit rate and number of entries
+
+        :rtype: dict
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+
+class MemoryCache(Cache):
+    """Cache kept in memory for the lifetime of the process"""
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1], time.time()):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# SQLite connections must not be used across fork(); forked processes (e.g. workers of a process pool) reconnect
+_sqlite_caches: "weakref.WeakSet[SQLiteCache]" = weakref.WeakSet()
+
+
+def _reconnect_sqlite_caches() -> None:
+    for cache in list(_sqlite_caches):
+        cache._connect()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reconnect_sqlite_caches)
+
+
+class SQLiteCache(Cache):
+    """Cache stored in an SQLite database file, which persists across processes and restarts
+
+    Several caches can share one database file by using different tables. A cache can be used by several processes
+    at once, including processes forked after it was created, which open their own connection.
+
+    Reading an entry does not write to the database: the access times, which decide which entries are evicted, are
+    kept in memory and written in batches, together with the next stored value (or when ``ACCESS_BATCH`` accesses
+    are pending, or the cache is closed). Lookups of concurrent processes therefore do not wait for each other.
+    """
+
+    # number of pending access times which are written at once
+    ACCESS_BATCH = 100
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        table: str = "cache",
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        """
+        :param path: path of the database file; parent directories are created if necessary
+        :param table: name of the table holding the entries
+        :param ttl: time in seconds after which entries expire; None for no expiry
+        :param max_entries: maximum number of entries; least recently used entries are evicted beyond this size.
+                            None for no limit
+        :type path: str or Path
+        :type table: str
+        :type ttl: float
+        :type max_entries: int
+        """
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name '{table}'")
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self._connect()
+        _sqlite_caches.add(self)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)"
+            )
+
+    def _connect(self) -> None:
+        # the connection of the parent process is left open: closing it would interfere with the parent's transactions
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        # access times of the entries read since the last write, by key
+        self._accessed: Dict[str, float] = {}
+
+    def _write_accessed(self) -> None:
+        """Write the pending access times; called with the lock held, within a transaction"""
+        if self._accessed:
+            self._db.executemany(
+                f"UPDATE {self.table} SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self._expired(row[1], now):
+                self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= self.ACCESS_BATCH:
+                self._write_accessed()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value) -> None:
+        now = time.time()
+        with self._lock, self._db:
+            # before evicting entries, and before the access time of this entry is reset
+            self._write_accessed()
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            if self.max_entries is not None:
+                (n_entries,) = self._db.execute(
+                    f"SELECT COUNT(*) FROM {self.table}"
+                ).fetchone()
+                excess = n_entries - self.max_entries
+                if excess > 0:
+                    self._db.execute(
+                        f"DELETE FROM {self.table} WHERE key IN "
+                        f"(SELECT key FROM {self.table} ORDER BY accessed LIMIT ?)",
+                        (excess,),
+                    )
+                    self.evictions += excess
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._accessed.clear()
+            self._db.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self) -> None:
+        """Write the pending access times and close the database connection"""
+        with self._lock, self._db:
+            self._write_accessed()
+        self._db.close()
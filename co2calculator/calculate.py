@@ -4,21 +4,57 @@
 
 import os
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
 from ._types import Kilogram, Kilometer
-import pandas as pd
-import warnings
+import numpy as np
 from .distances import haversine
 from .distances import geocoding_airport, geocoding_structured, geocoding_train_stations
-from .distances import get_route
+from .distances import airports, get_route
 from .constants import KWH_TO_TJ
+from .factors import conversion_factors, detour_parameters, emission_factors
+from .ranges import FLIGHT_RANGES, TRIP_RANGES, RangeBins
+from .stations import STATIONS_CSV, STATIONS_INDEX, load_station_index
+from .instrumentation import timed as _timed
+from .diagnostics import report as _report
 
 script_path = str(Path(__file__).parent)
-emission_factor_df = pd.read_csv(f"{script_path}/../data/emission_factors.csv")
-conversion_factor_df = pd.read_csv(
-    f"{script_path}/../data/conversion_factors_heating.csv"
-)
-detour_df = pd.read_csv(f"{script_path}/../data/detour.csv")
+
+# The factor tables are available as DataFrames for analysis, but the calculations only use the indices in
+# co2calculator.factors, so that pandas is not imported unless one of these is accessed.
+_DATAFRAME_FILES = {
+    "emission_factor_df": "emission_factors.csv",
+    "conversion_factor_df": "conversion_factors_heating.csv",
+    "detour_df": "detour.csv",
+}
+
+
+def __getattr__(name: str):
+    if name in _DATAFRAME_FILES:
+        import pandas as pd
+
+        df = pd.read_csv(f"{script_path}/../data/{_DATAFRAME_FILES[name]}")
+        globals()[name] = df
+        return df
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warmup(batch: bool = False) -> None:
+    """Load all data used by the calculations up front, instead of on first use
+
+    Short-lived processes do not need to call this. Long-running services can call it at startup, so that the
+    first requests do not pay for loading the factor tables.
+
+    :param batch: whether to also import the batch functions (and pandas)
+    :type batch: bool
+    """
+    emission_factors()
+    conversion_factors()
+    detour_parameters()
+    airports()
+    if STATIONS_CSV.exists() or STATIONS_INDEX.exists():
+        load_station_index()
+    if batch:
+        from . import batch as _  # noqa: F401
 
 
 def calc_co2_car(
@@ -62,16 +98,24 @@ def calc_co2_car(
     # Set default values
     if passengers is None:
         passengers = 1
-        warnings.warn(
-            f"Number of car passengers was not provided. Using default value: '{passengers}'"
+        _report(
+            "car.passengers.default",
+            "Number of car passengers was not provided. Using default value: '{default}'",
+            default=passengers,
         )
     if size is None:
         size = "average"
-        warnings.warn(f"Size of car was not provided. Using default value: '{size}'")
+        _report(
+            "car.size.default",
+            "Size of car was not provided. Using default value: '{default}'",
+            default=size,
+        )
     if fuel_type is None:
         fuel_type = "average"
-        warnings.warn(
-            f"Car fuel type was not provided. Using default value: '{fuel_type}'"
+        _report(
+            "car.fuel_type.default",
+            "Car fuel type was not provided. Using default value: '{default}'",
+            default=fuel_type,
         )
     # Check if distance of stops provided
     if distance is None and stops is None:
@@ -85,11 +129,9 @@ def calc_co2_car(
             loc_name, loc_country, loc_coords, _ = geocoding_structured(loc)
             coords.append(loc_coords)
         distance = get_route(coords, "driving-car")
-    co2e = emission_factor_df[
-        (emission_factor_df["subcategory"] == transport_mode)
-        & (emission_factor_df["size_class"] == size)
-        & (emission_factor_df["fuel_type"] == fuel_type)
-    ]["co2e"].values[0]
+    co2e = emission_factors().get(
+        subcategory=transport_mode, size_class=size, fuel_type=fuel_type
+    )
     emissions = distance * co2e / passengers
 
     return emissions, distance
@@ -123,8 +165,10 @@ def calc_co2_motorbike(
     # Set default values
     if size is None:
         size = "average"
-        warnings.warn(
-            f"Size of motorbike was not provided. Using default value: '{size}'"
+        _report(
+            "motorbike.size.default",
+            "Size of motorbike was not provided. Using default value: '{default}'",
+            default=size,
         )
     if distance is None and stops is None:
         raise ValueError(
@@ -137,10 +181,7 @@ def calc_co2_motorbike(
             loc_name, loc_country, loc_coords, _ = geocoding_structured(loc)
             coords.append(loc_coords)
         distance = get_route(coords, "driving-car")
-    co2e = emission_factor_df[
-        (emission_factor_df["subcategory"] == transport_mode)
-        & (emission_factor_df["size_class"] == size)
-    ]["co2e"].values[0]
+    co2e = emission_factors().get(subcategory=transport_mode, size_class=size)
     emissions = distance * co2e
 
     return emissions, distance
@@ -157,27 +198,54 @@ def apply_detour(distance: Kilometer, transportation_mode: str) -> Kilometer:
     :rtype: float
     """
     try:
-        detour_coefficient = detour_df[
-            detour_df["transportation_mode"] == transportation_mode
-        ]["coefficient"].values[0]
-        detour_constant = detour_df[
-            detour_df["transportation_mode"] == transportation_mode
-        ]["constant [km]"].values[0]
+        detour_coefficient, detour_constant = detour_parameters().get(
+            transportation_mode=transportation_mode
+        )
     except KeyError:
         detour_coefficient = 1.0
         detour_constant = 0.0
-        warnings.warn(
-            f"""
+        _report(
+            "detour.default",
+            """
         No detour coefficient or constant available for this transportation mode.
         Detour parameters are available for the following transportation modes:
-        Using detour_coefficient = {detour_coefficient} and detour_constant = {detour_constant}.
-        """
+        Using detour_coefficient = {coefficient} and detour_constant = {constant}.
+        """,
+            coefficient=detour_coefficient,
+            constant=detour_constant,
         )
     distance_with_detour = detour_coefficient * distance + detour_constant
 
     return distance_with_detour
 
 
+def _crow_flies_distance(coords: list, transport_mode: str) -> Kilometer:
+    """Distance along the given locations ([long, lat]) as the crow flies, accounted for detour"""
+    # compute great circle distances between consecutive locations in one call
+    coords = np.array(coords, dtype=float)
+    legs = haversine(coords[:-1, 1], coords[:-1, 0], coords[1:, 1], coords[1:, 0])
+    return apply_detour(float(np.sum(legs)), transportation_mode=transport_mode)
+
+
+@_timed("calculate.geocoding_stop")
+def _geocoding_stop(loc: dict) -> list:
+    """Coordinates ([long, lat]) of a location"""
+    loc_name, loc_country, loc_coords, _ = geocoding_structured(loc)
+    return loc_coords
+
+
+@_timed("calculate.geocoding_train_stop")
+def _geocoding_train_stop(loc: dict) -> list:
+    """Coordinates ([long, lat]) of a train station, geocoded as an address if it is not found by name"""
+    try:
+        loc_name, loc_country, loc_coords = geocoding_train_stations(loc)
+    except RuntimeWarning:
+        loc_name, loc_country, loc_coords, _ = geocoding_structured(loc)
+    except ValueError:
+        loc_name, loc_country, loc_coords, res = geocoding_structured(loc)
+    return loc_coords
+
+
 def calc_co2_bus(
     distance: Kilometer = None,
     stops: list = None,
@@ -219,24 +287,38 @@ def calc_co2_bus(
     # Set default values
     if size is None:
         size = "average"
-        warnings.warn(f"Size of bus was not provided. Using default value: '{size}'")
+        _report(
+            "bus.size.default",
+            "Size of bus was not provided. Using default value: '{default}'",
+            default=size,
+        )
     if fuel_type is None:
         fuel_type = "diesel"
-        warnings.warn(
-            f"Bus fuel type was not provided. Using default value: '{fuel_type}'"
+        _report(
+            "bus.fuel_type.default",
+            "Bus fuel type was not provided. Using default value: '{default}'",
+            default=fuel_type,
         )
     elif fuel_type not in ["diesel", "cng", "hydrogen"]:
-        warnings.warn(
-            f"Bus fuel type {fuel_type} not available. Using default value: 'diesel'"
+        _report(
+            "bus.fuel_type.unavailable",
+            "Bus fuel type {fuel_type} not available. Using default value: 'diesel'",
+            fuel_type=fuel_type,
         )
         fuel_type = "diesel"
     if occupancy is None:
         occupancy = 50
-        warnings.warn(f"Occupancy was not provided. Using default value: '{occupancy}'")
+        _report(
+            "bus.occupancy.default",
+            "Occupancy was not provided. Using default value: '{default}'",
+            default=occupancy,
+        )
     if vehicle_range is None:
         vehicle_range = "long-distance"
-        warnings.warn(
-            f"Intended range of trip was not provided. Using default value: '{vehicle_range}'"
+        _report(
+            "bus.vehicle_range.default",
+            "Intended range of trip was not provided. Using default value: '{default}'",
+            default=vehicle_range,
         )
     if distance is None and stops is None:
         raise ValueError(
@@ -244,24 +326,18 @@ def calc_co2_bus(
             "dictionaries for each travelled bus station"
         )
     elif distance is None and stops is not None:
-        distance = 0
         coords = []
         for loc in stops:
             loc_name, loc_country, loc_coords, _ = geocoding_structured(loc)
             coords.append(loc_coords)
-        for i in range(0, len(coords) - 1):
-            # compute great circle distance between locations
-            distance += haversine(
-                coords[i][1], coords[i][0], coords[i + 1][1], coords[i + 1][0]
-            )
-        distance = apply_detour(distance, transportation_mode=transport_mode)
-    co2e = emission_factor_df[
-        (emission_factor_df["subcategory"] == transport_mode)
-        & (emission_factor_df["size_class"] == size)
-        & (emission_factor_df["fuel_type"] == fuel_type)
-        & (emission_factor_df["occupancy"] == occupancy)
-        & (emission_factor_df["range"] == vehicle_range)
-    ]["co2e"].values[0]
+        distance = _crow_flies_distance(coords, transport_mode)
+    co2e = emission_factors().get(
+        subcategory=transport_mode,
+        size_class=size,
+        fuel_type=fuel_type,
+        occupancy=occupancy,
+        range=vehicle_range,
+    )
     emissions = distance * co2e
 
     return emissions, distance
@@ -297,13 +373,17 @@ def calc_co2_train(
     # Set default values
     if fuel_type is None:
         fuel_type = "average"
-        warnings.warn(
-            f"Car fuel type was not provided. Using default value: '{fuel_type}'"
+        _report(
+            "train.fuel_type.default",
+            "Train fuel type was not provided. Using default value: '{default}'",
+            default=fuel_type,
         )
     if vehicle_range is None:
         vehicle_range = "long-distance"
-        warnings.warn(
-            f"Intended range of trip was not provided. Using default value: '{vehicle_range}'"
+        _report(
+            "train.vehicle_range.default",
+            "Intended range of trip was not provided. Using default value: '{default}'",
+            default=vehicle_range,
         )
     if distance is None and stops is None:
         raise ValueError(
@@ -311,27 +391,15 @@ def calc_co2_train(
             "dictionaries for each travelled train station"
         )
     elif distance is None:
-        distance = 0
-        coords = []
-        for loc in stops:
-            try:
-                loc_name, loc_country, loc_coords = geocoding_train_stations(loc)
-            except RuntimeWarning:
-                loc_name, loc_country, loc_coords, _ = geocoding_structured(loc)
-            except ValueError:
-                loc_name, loc_country, loc_coords, res = geocoding_structured(loc)
-            coords.append(loc_coords)
-        for i in range(len(coords) - 1):
-            # compute great circle distance between locations
-            distance += haversine(
-                coords[i][1], coords[i][0], coords[i + 1][1], coords[i + 1][0]
-            )
-        distance = apply_detour(distance, transportation_mode=transport_mode)
-    co2e = emission_factor_df[
-        (emission_factor_df["subcategory"] == transport_mode)
-        & (emission_factor_df["fuel_type"] == fuel_type)
-        & (emission_factor_df["range"] == vehicle_range)
-    ]["co2e"].values[0]
+        coords = [_geocoding_train_stop(loc) for loc in stops]
+        distance = _crow_flies_distance(coords, transport_mode)
+    # the size class separates the UBA averages from the per-model Öko-Institut entries
+    co2e = emission_factors().get(
+        subcategory=transport_mode,
+        size_class="average",
+        fuel_type=fuel_type,
+        range=vehicle_range,
+    )
     emissions = distance * co2e
 
     return emissions, distance
@@ -358,8 +426,10 @@ def calc_co2_plane(
     # Set defaults
     if seating_class is None:
         seating_class = "average"
-        warnings.warn(
-            f"Seating class was not provided. Using default value: '{seating_class}'"
+        _report(
+            "plane.seating.default",
+            "Seating class was not provided. Using default value: '{default}'",
+            default=seating_class,
         )
 
     # get geographic coordinates of airports
@@ -370,10 +440,12 @@ def calc_co2_plane(
     # add detour constant
     distance = apply_detour(distance, transportation_mode=transport_mode)
     # retrieve whether distance is below or above 1500 km
-    if distance <= 1500:
-        flight_range = "short-haul"
-    elif distance > 1500:
-        flight_range = "long-haul"
+    range_code = FLIGHT_RANGES.code(distance)
+    if range_code < 0:
+        raise ValueError(
+            f"Distance between airports {start} and {destination} could not be computed."
+        )
+    flight_range = FLIGHT_RANGES.categories[range_code]
     # NOTE: Should be checked before geocoding and haversine calculation
     seating_choices = [
         "average",
@@ -388,21 +460,22 @@ def calc_co2_plane(
             f"Please use one of the following: {seating_choices}"
         )
     try:
-        co2e = emission_factor_df[
-            (emission_factor_df["subcategory"] == transport_mode)
-            & (emission_factor_df["range"] == flight_range)
-            & (emission_factor_df["seating"] == seating_class)
-        ]["co2e"].values[0]
-    except IndexError:
+        co2e = emission_factors().get(
+            subcategory=transport_mode, range=flight_range, seating=seating_class
+        )
+    except KeyError:
         default_seating = "economy_class"
-        warnings.warn(
-            f"Seating class '{seating_class}' not available for {flight_range} flights. Switching to "
-            f"'{default_seating}'..."
-        )
-        co2e = emission_factor_df[
-            (emission_factor_df["range"] == flight_range)
-            & (emission_factor_df["seating"] == default_seating)
-        ]["co2e"].values[0]
+        _report(
+            "plane.seating.unavailable",
+            "Seating class '{seating}' not available for {range} flights. Switching to "
+            "'{default}'...",
+            seating=seating_class,
+            range=flight_range,
+            default=default_seating,
+        )
+        co2e = emission_factors().get(
+            subcategory=transport_mode, range=flight_range, seating=default_seating
+        )
     # multiply emission factor with distance
     emissions = distance * co2e
 
@@ -430,8 +503,10 @@ def calc_co2_ferry(
     transport_mode = "ferry"
     if seating_class is None:
         seating_class = "average"
-        warnings.warn(
-            f"Seating class was not provided. Using default value: '{seating_class}'"
+        _report(
+            "ferry.seating.default",
+            "Seating class was not provided. Using default value: '{default}'",
+            default=seating_class,
         )
     # todo: Do we have a way of checking if there even exists a ferry connection between the given cities (of if the
     #  cities even have a port?
@@ -443,10 +518,7 @@ def calc_co2_ferry(
 
     distance = apply_detour(distance, transportation_mode=transport_mode)
     # get emission factor
-    co2e = emission_factor_df[
-        (emission_factor_df["subcategory"] == transport_mode)
-        & (emission_factor_df["seating"] == seating_class)
-    ]["co2e"].values[0]
+    co2e = emission_factors().get(subcategory=transport_mode, seating=seating_class)
     # multiply emission factor with distance
     emissions = distance * co2e
 
@@ -470,13 +542,12 @@ def calc_co2_electricity(
     # Set defaults
     if fuel_type is None:
         fuel_type = "german_energy_mix"
-        warnings.warn(
-            f"No fuel type or energy mix specified. Using default value: '{fuel_type}'"
+        _report(
+            "electricity.fuel_type.default",
+            "No fuel type or energy mix specified. Using default value: '{default}'",
+            default=fuel_type,
         )
-    co2e = emission_factor_df[
-        (emission_factor_df["category"] == "electricity")
-        & (emission_factor_df["fuel_type"] == fuel_type)
-    ]["co2e"].values[0]
+    co2e = emission_factors().get(category="electricity", fuel_type=fuel_type)
     # co2 equivalents for heating and electricity refer to a consumption of 1 TJ
     # so consumption needs to be converted to TJ
     emissions = consumption * energy_share / KWH_TO_TJ * co2e
@@ -503,11 +574,17 @@ def calc_co2_heating(
     # Set defaults
     if unit is None:
         unit = "kWh"
-        warnings.warn(f"Unit was not provided. Assuming default value: '{unit}'")
+        _report(
+            "heating.unit.default",
+            "Unit was not provided. Assuming default value: '{default}'",
+            default=unit,
+        )
     if area_share > 1:
-        warnings.warn(
-            f"Share of building area must be a float in the interval (0,1], but was set to '{area_share}'\n."
-            f"The parameter will be set to '1.0' instead"
+        _report(
+            "heating.area_share.invalid",
+            "Share of building area must be a float in the interval (0,1], but was set to '{area_share}'\n."
+            "The parameter will be set to '1.0' instead",
+            area_share=area_share,
         )
     valid_unit_choices = ["kWh", "l", "kg", "m^3"]
     assert (
@@ -515,16 +592,13 @@ def calc_co2_heating(
     ), f"unit={unit} is invalid. Valid choices are {', '.join(valid_unit_choices)}"
     if unit != "kWh":
         try:
-            conversion_factor = conversion_factor_df[
-                (conversion_factor_df["fuel"] == fuel_type)
-                & (conversion_factor_df["unit"] == unit)
-            ]["conversion_value"].values[0]
+            conversion_factor = conversion_factors().get(fuel=fuel_type, unit=unit)
         except KeyError:
             raise ValueError(
                 f"""
                 No conversion data is available for this fuel type.
                 Conversion is only supported for the following fuel types and units:
-                {conversion_factor_df["fuel", "unit"]}.
+                {[key for key, _ in conversion_factors().items()]}.
                 Alternatively, provide consumption in the unit kWh.
                 """
             )
@@ -533,10 +607,7 @@ def calc_co2_heating(
     else:
         consumption_kwh = consumption
 
-    co2e = emission_factor_df[
-        (emission_factor_df["category"] == "heating")
-        & (emission_factor_df["fuel_type"] == fuel_type)
-    ]["co2e"].values[0]
+    co2e = emission_factors().get(category="heating", fuel_type=fuel_type)
     # co2 equivalents for heating and electricity refer to a consumption of 1 TJ
     # so consumption needs to be converted to TJ
     emissions = consumption_kwh * area_share / KWH_TO_TJ * co2e
@@ -585,34 +656,7 @@ def calc_co2_businesstrip(
                 Range description (i.e., what range of distances does to category correspond to)
     :rtype: tuple[float, float, str, str]
     """
-    if distance is None and (start is None or destination is None):
-        assert ValueError("Either start and destination or distance must be provided.")
-    elif distance is not None and (start is not None or destination is not None):
-        warnings.warn(
-            "Both distance and start/stop location were provided. "
-            "Only distance will be used for emission calculation."
-        )
-        stops = None
-    elif start is None and destination is None and distance is not None:
-        stops = None
-    elif start is not None and destination is not None and distance is None:
-        # check if stops are provided in the right form
-        if transportation_mode == "car" and (
-            type(start) != str or type(destination) != str
-        ):
-            raise ValueError(
-                "Wrong data type for start and destination."
-                "Please provide a three letter IATA code for train stations."
-            )
-        elif transportation_mode != "car" and (
-            type(start) != dict or type(destination) != dict
-        ):
-            raise ValueError(
-                "Wrong data type for start and destination."
-                "Please provide a dictionary."
-            )
-
-        stops = [start, destination]
+    stops = _businesstrip_stops(transportation_mode, start, destination, distance)
     if transportation_mode == "car":
         emissions, dist = calc_co2_car(
             distance=distance,
@@ -654,29 +698,72 @@ def calc_co2_businesstrip(
     return emissions, dist, range_category, range_description
 
 
-def range_categories(distance: Kilogram) -> Tuple[str, str]:
+def _businesstrip_stops(
+    transportation_mode: str, start, destination, distance: Kilometer
+) -> Optional[list]:
+    """Check the locations of a business trip and return them as list of stops (None if the distance is used)"""
+    stops = None
+    if distance is None and (start is None or destination is None):
+        raise ValueError("Either start and destination or distance must be provided.")
+    elif distance is not None and (start is not None or destination is not None):
+        _report(
+            "businesstrip.locations.ignored",
+            "Both distance and start/stop location were provided. "
+            "Only distance will be used for emission calculation.",
+        )
+        stops = None
+    elif start is None and destination is None and distance is not None:
+        stops = None
+    elif start is not None and destination is not None and distance is None:
+        # check if stops are provided in the right form
+        if transportation_mode == "plane" and (
+            type(start) != str or type(destination) != str
+        ):
+            raise ValueError(
+                "Wrong data type for start and destination."
+                "Please provide a three letter IATA code for airports."
+            )
+        elif transportation_mode != "plane" and (
+            type(start) != dict or type(destination) != dict
+        ):
+            raise ValueError(
+                "Wrong data type for start and destination."
+                "Please provide a dictionary."
+            )
+
+        stops = [start, destination]
+    return stops
+
+
+def range_categories(
+    distance: Kilometer, bins: RangeBins = TRIP_RANGES
+) -> Tuple[str, str]:
     """Function to categorize a trip according to the travelled distance
 
     :param distance: Distance travelled in km
+    :param bins: Table of range categories; default: very short haul (up to 500 km), short haul (up to 1500 km),
+                 medium haul (up to 4000 km) and long haul
     :type distance: float
+    :type bins: RangeBins
     :return: Range category of the trip [very short haul, short haul, medium haul, long haul]
              Range description (i.e., what range of distances does to category correspond to)
     :rtype: tuple[str, str]
     """
-    if distance <= 500:
-        range_cat = "very short haul"
-        range_description = "below 500 km"
-    elif distance <= 1500:
-        range_cat = "short haul"
-        range_description = "500 to 1500 km"
-    elif distance <= 4000:
-        range_cat = "medium haul"
-        range_description = "1500 to 4000 km"
-    else:
-        range_cat = "long haul"
-        range_description = "above 4000 km"
+    return bins.categorize(distance)
 
-    return range_cat, range_description
+
+# Modes of commutes with one emission factor, given by its key
+_COMMUTING_FACTOR_KEYS = {
+    # UBA factor for trams, light rail and underground ("Strassen-Stadt-U-Bahn")
+    "tram": {
+        "subcategory": "train",
+        "size_class": "average",
+        "fuel_type": "electric",
+        "range": None,
+    },
+    "bicycle": {"subcategory": "bicycle"},
+    "pedelec": {"subcategory": "pedelec"},
+}
 
 
 def calc_co2_commuting(
@@ -723,18 +810,11 @@ def calc_co2_commuting(
             distance=weekly_distance,
         )
     elif transportation_mode == "train":
-        weekly_co2e = calc_co2_train(
+        weekly_co2e, _ = calc_co2_train(
             fuel_type=fuel_type, vehicle_range="local", distance=weekly_distance
         )
-    elif transportation_mode == "tram":
-        co2e = emission_factor_df[
-            (emission_factor_df["name"] == "Strassen-Stadt-U-Bahn")
-        ]["co2e"].values[0]
-        weekly_co2e = co2e * weekly_distance
-    elif transportation_mode == "pedelec" or transportation_mode == "bicycle":
-        co2e = emission_factor_df[
-            (emission_factor_df["subcategory"] == transportation_mode)
-        ]["co2e"].values[0]
+    elif transportation_mode in _COMMUTING_FACTOR_KEYS:
+        co2e = emission_factors().get(**_COMMUTING_FACTOR_KEYS[transportation_mode])
         weekly_co2e = co2e * weekly_distance
     else:
         raise ValueError(
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Events where a calculation used a default value or a fallback, e.g. a missing car size
+
+By default, each event is reported with ``warnings.warn``, as interactive users expect. Within
+``collect_diagnostics()``, events are recorded as counters instead, without formatting or emitting a warning per
+call. The batch functions attribute events to the rows of the batch:
+
+.. code-block:: python
+
+    with collect_diagnostics() as diagnostics:
+        emissions, _, _, _ = calc_co2_businesstrip_batch(trips)
+    diagnostics.counts  # {'car.size.default': 12, 'plane.seating.default': 3}
+    diagnostics.rows("car.size.default")  # array([0, 4, 5, ...])
+
+Events are identified by codes of the form ``<subject>.<parameter>.<event>``; see the ``report`` calls in
+``co2calculator.calculate`` and ``co2calculator.distances``.
+"""
+
+import threading
+import warnings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+_collector: ContextVar[Optional["Diagnostics"]] = ContextVar(
+    "co2calculator_diagnostics", default=None
+)
+
+
+class Diagnostics:
+    """Events recorded within ``collect_diagnostics()``: number of events per code, and the rows they occurred in"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        # message of the first event of each code
+        self.messages: Dict[str, str] = {}
+        # position of the row being calculated, set by the batch functions for events of the scalar functions
+        self.row: Optional[int] = None
+        self._rows: Dict[str, List[np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, code: str, message: str, values: dict, rows=None, n: int = 1):
+        """Record n events of a code, which occurred in the given rows (positions in the batch)"""
+        if rows is None and self.row is not None:
+            rows = [self.row]
+        with self._lock:
+            self.counts[code] = self.counts.get(code, 0) + n
+            if code not in self.messages:
+                self.messages[code] = message.format(**values) if values else message
+            if rows is not None:
+                self._rows.setdefault(code, []).append(np.asarray(rows, dtype=int))
+
+    def rows(self, code: str) -> np.ndarray:
+        """Positions of the rows in which events of a code occurred
+
+        :param code: code of the event, e.g. 'car.size.default'
+        :type code: str
+        :rtype: np.ndarray
+        """
+        rows = self._rows.get(code)
+        if not rows:
+            return np.empty(0, dtype=int)
+        return np.unique(np.concatenate(rows))
+
+    def per_row(self) -> Dict[int, Dict[str, int]]:
+        """Number of events of each code per row (only rows with events)"""
+        result: Dict[int, Dict[str, int]] = {}
+        for code, rows in self._rows.items():
+            for row in np.concatenate(rows).tolist():
+                events = result.setdefault(row, {})
+                events[code] = events.get(code, 0) + 1
+        return result
+
+    def summary(self) -> Dict[str, dict]:
+        """Number of events and an example message per code"""
+        return {
+            code: {"count": count, "message": self.messages[code]}
+            for code, count in self.counts.items()
+        }
+
+
+@contextmanager
+def collect_diagnostics() -> Iterator[Diagnostics]:
+    """Record events as counters instead of warnings within the context
+
+    The collector is local to the current thread or task, and inherited by the threads and tasks started by the
+    calculation functions.
+    """
+    diagnostics = Diagnostics()
+    token = _collector.set(diagnostics)
+    try:
+        yield diagnostics
+    finally:
+        _collector.reset(token)
+
+
+def current_diagnostics() -> Optional[Diagnostics]:
+    """Return the active collector, or None if events are reported as warnings"""
+    return _collector.get()
+
+
+def report(
+    code: str, message: str, rows=None, n: int = 1, stacklevel: int = 1, **values
+) -> None:
+    """Report an event: record it if diagnostics are collected, else emit a warning
+
+    :param code: code of the event, e.g. 'car.size.default'
+    :param message: message of the warning; formatted with the values (``str.format``) only when needed
+    :param rows: positions of the rows in the batch in which the event occurred
+    :param n: number of events
+    :param stacklevel: as for ``warnings.warn``, counted from the caller of this function
+    :param values: values to format the message with
+    """
+    collector = _collector.get()
+    if collector is None:
+        warnings.warn(
+            message.format(**values) if values else message,
+            stacklevel=stacklevel + 1,
+        )
+    else:
+        collector.record(code, message, values, rows=rows, n=n)
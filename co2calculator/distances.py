@@ -3,46 +3,314 @@
 
 """Functions for obtaining the distance between given addresses."""
 
-
-from typing import Tuple
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from . import instrumentation
 from ._types import Kilometer
+from .diagnostics import report
+from .cache import Cache, SQLiteCache, canonical_key
+from .factors import DATA_DIR, read_table
+from .ratelimit import TokenBucket
+from .stations import load_station_index
+import functools
+import logging
 import numpy as np
 import openrouteservice
 from openrouteservice.directions import directions
+from openrouteservice.distance_matrix import distance_matrix
 from openrouteservice.geocode import pelias_search, pelias_structured
 import os
 from pathlib import Path
+import threading
 from dotenv import load_dotenv
-import pandas as pd
-from thefuzz import fuzz
-from thefuzz import process
-import warnings
+from requests.adapters import HTTPAdapter
 
 load_dotenv()  # take environment variables from .env.
 
+logger = logging.getLogger(__name__)
+
 ORS_API_KEY = os.environ.get("ORS_API_KEY")
+ORS_BASE_URL = os.environ.get("ORS_BASE_URL")
 script_path = str(Path(__file__).parent)
 
+# All requests go through one openrouteservice client, so that connections (and TLS sessions) are reused
+_client: Optional[openrouteservice.Client] = None
+_client_settings = {
+    "timeout": 60,
+    "retry_timeout": 60,
+    "pool_connections": 10,
+    "pool_maxsize": 10,
+}
+_client_lock = threading.Lock()
+
+
+def configure_client(
+    key: str = None,
+    base_url: str = None,
+    timeout: float = 60,
+    retry_timeout: float = 60,
+    pool_connections: int = 10,
+    pool_maxsize: int = 10,
+) -> None:
+    """Configure the openrouteservice client shared by all requests
+
+    The client is (re)created with these settings on the next request.
+
+    :param key: ORS API key; defaults to the environment variable ORS_API_KEY
+    :param base_url: URL of the openrouteservice API, e.g. of a self-hosted instance; defaults to the environment
+                     variable ORS_BASE_URL or the public ORS API
+    :param timeout: combined connect and read timeout of a request in seconds
+    :param retry_timeout: timeout across retries of a request (e.g. when the query limit was reached) in seconds
+    :param pool_connections: number of connection pools (one per host) to keep
+    :param pool_maxsize: maximum number of connections kept per host; should be at least the number of threads
+                         sending requests concurrently
+    :type key: str
+    :type base_url: str
+    :type timeout: float
+    :type retry_timeout: float
+    :type pool_connections: int
+    :type pool_maxsize: int
+    """
+    global _client, _client_settings
+    with _client_lock:
+        _client_settings = {
+            "key": key,
+            "base_url": base_url,
+            "timeout": timeout,
+            "retry_timeout": retry_timeout,
+            "pool_connections": pool_connections,
+            "pool_maxsize": pool_maxsize,
+        }
+        _client = None
+
+
+def get_client() -> openrouteservice.Client:
+    """Return the shared openrouteservice client, creating it on first use
+
+    :return: client
+    :rtype: openrouteservice.Client
+    """
+    global _client
+    client = _client
+    if client is not None:
+        return client
+    with _client_lock:
+        if _client is None:
+            settings = dict(_client_settings)
+            kwargs = {
+                "key": settings.get("key") or ORS_API_KEY,
+                "timeout": settings["timeout"],
+                "retry_timeout": settings["retry_timeout"],
+            }
+            base_url = settings.get("base_url") or ORS_BASE_URL
+            if base_url:
+                kwargs["base_url"] = base_url.rstrip("/")
+            client = openrouteservice.Client(**kwargs)
+            # openrouteservice does not expose the size of the connection pool of its session
+            adapter = HTTPAdapter(
+                pool_connections=settings["pool_connections"],
+                pool_maxsize=settings["pool_maxsize"],
+            )
+            client._session.mount("https://", adapter)
+            client._session.mount("http://", adapter)
+            _client = client
+        return _client
+
+
+def _reset_client() -> None:
+    """Discard the shared client, e.g. in a forked process which must not share its connections"""
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_client)
+
+# Requests per minute allowed for each endpoint by the standard openrouteservice plan. Requests beyond these rates
+# are delayed (in the calling thread) instead of being rejected by the API.
+_rate_limits: Dict[str, TokenBucket] = {
+    "pelias": TokenBucket(100),
+    "directions": TokenBucket(40),
+    "matrix": TokenBucket(40),
+}
+
+
+def set_rate_limit(
+    endpoint: str, rate: Optional[float], burst: Optional[float] = None
+) -> None:
+    """Set the rate limit of an openrouteservice endpoint, e.g. for a self-hosted instance or another plan
+
+    The limits are shared by all threads and coroutines of the process; cached results do not count.
+
+    :param endpoint: "pelias" (geocoding), "directions" or "matrix"
+    :param rate: number of requests per minute; None to disable rate limiting
+    :param burst: number of requests which may be sent at once; defaults to the rate
+    :type endpoint: str
+    :type rate: float
+    :type burst: float
+    """
+    if rate is None:
+        _rate_limits.pop(endpoint, None)
+    else:
+        _rate_limits[endpoint] = TokenBucket(rate, capacity=burst)
+
+
+def get_rate_limit(endpoint: str) -> Optional[Tuple[float, float]]:
+    """Return the rate limit of an openrouteservice endpoint
+
+    :param endpoint: "pelias" (geocoding), "directions" or "matrix"
+    :type endpoint: str
+    :return: requests per minute and burst size, or None if the endpoint is not rate limited
+    :rtype: tuple[float, float]
+    """
+    limiter = _rate_limits.get(endpoint)
+    if limiter is None:
+        return None
+    return limiter.rate, limiter.capacity
+
+
+def _throttle(endpoint: str) -> None:
+    """Wait until a request to the endpoint is allowed by its rate limit"""
+    limiter = _rate_limits.get(endpoint)
+    if limiter is not None:
+        with instrumentation.stage(f"throttle.{endpoint}"):
+            limiter.acquire()
+
+
+# Pelias responses are cached if a cache is set, either with set_geocoding_cache() or by giving the path of an
+# SQLite database in the environment variable GEOCODING_CACHE.
+_geocoding_cache: Optional[Cache] = None
+if os.environ.get("GEOCODING_CACHE"):
+    _geocoding_cache = SQLiteCache(
+        os.environ["GEOCODING_CACHE"], table="geocoding", max_entries=100000
+    )
+
+
+def set_geocoding_cache(cache: Optional[Cache]) -> None:
+    """Set the cache for geocoding results, e.g. ``SQLiteCache("~/.cache/co2calculator.sqlite", table="geocoding")``
+
+    Results of ``geocoding``, ``geocoding_structured`` and ``geocoding_airport`` are cached, including searches
+    which found no place.
+
+    :param cache: cache to use; None to disable caching
+    :type cache: co2calculator.cache.Cache
+    """
+    global _geocoding_cache
+    _geocoding_cache = cache
+
+
+def get_geocoding_cache() -> Optional[Cache]:
+    """Return the cache used for geocoding results, or None if caching is disabled"""
+    return _geocoding_cache
+
+
+# Route distances are cached likewise, with set_route_cache() or the environment variable ROUTE_CACHE.
+_route_cache: Optional[Cache] = None
+_route_cache_precision = 4
+_route_cache_symmetric = False
+if os.environ.get("ROUTE_CACHE"):
+    _route_cache = SQLiteCache(
+        os.environ["ROUTE_CACHE"], table="routes", max_entries=100000
+    )
+
+
+def set_route_cache(
+    cache: Optional[Cache], precision: int = 4, symmetric: bool = False
+) -> None:
+    """Set the cache for route distances obtained with ``get_route``
+
+    Routes are identified by their profile and their waypoints, rounded to the given number of decimals. The
+    default of 4 decimals corresponds to about 10 m, so repeated geocoding results of one address share an entry.
+
+    :param cache: cache to use; None to disable caching
+    :param precision: number of decimals to which the coordinates are rounded
+    :param symmetric: whether a route and its reverse (B to A) share an entry. Road distances are usually similar,
+                      but not identical in both directions (e.g. one-way streets, motorway exits)
+    :type cache: co2calculator.cache.Cache
+    :type precision: int
+    :type symmetric: bool
+    """
+    global _route_cache, _route_cache_precision, _route_cache_symmetric
+    _route_cache = cache
+    _route_cache_precision = precision
+    _route_cache_symmetric = symmetric
+
+
+def get_route_cache() -> Optional[Cache]:
+    """Return the cache used for route distances, or None if caching is disabled"""
+    return _route_cache
+
+
+def _route_key(coords, profile: str) -> str:
+    """Cache key of a route: the profile and the waypoints rounded to the configured precision"""
+    waypoints = [
+        [round(float(c), _route_cache_precision) for c in point] for point in coords
+    ]
+    if _route_cache_symmetric and waypoints[::-1] < waypoints:
+        waypoints = waypoints[::-1]
+    return canonical_key("directions", profile, waypoints)
+
+
+def _pelias(endpoint: str, **params) -> list:
+    """Query a Pelias endpoint of openrouteservice and return the found features
+
+    :param endpoint: "search" (free text, parameter ``text``) or "structured"
+    :param params: parameters of the request
+    :return: list of GeoJSON features; empty if no place was found
+    """
+    cache = _geocoding_cache
+    if cache is not None:
+        key = canonical_key("pelias", endpoint, params)
+        features = cache.get(key)
+        if features is not None:
+            instrumentation.count("cache.geocoding.hit")
+            return features
+        instrumentation.count("cache.geocoding.miss")
+    _throttle("pelias")
+    clnt = get_client()
+    instrumentation.count("requests.pelias")
+    try:
+        with instrumentation.stage("pelias"):
+            if endpoint == "search":
+                call = pelias_search(clnt, params["text"])
+            else:
+                call = pelias_structured(clnt, **params)
+    except Exception:
+        instrumentation.count("errors.pelias")
+        raise
+    features = call["features"]
+    if cache is not None:
+        cache.set(key, features)
+    return features
+
+
+EARTH_RADIUS = 6371  # km
+
 
 def haversine(
     lat_start: float, long_start: float, lat_dest: float, long_dest: float
 ) -> Kilometer:
     """Function to compute the distance as the crow flies between given locations
 
+    The coordinates may also be arrays, which are broadcast against each other, e.g. to compute the distances of all
+    legs of a trip in one call.
+
     :param lat_start: latitude of start
     :param long_start: Longitude of start
     :param lat_dest: Latitude of destination
     :param long_dest: Longitude of destination
-    :type lat_start: float
-    :type long_start: float
-    :type lat_dest: float
-    :type long_dest: float
+    :type lat_start: float or np.ndarray
+    :type long_start: float or np.ndarray
+    :type lat_dest: float or np.ndarray
+    :type long_dest: float or np.ndarray
     :return: Distance in km
-    :rtype: float
+    :rtype: float or np.ndarray
     """
     # convert angles from degree to radians
-    lat_start, long_start, lat_dest, long_dest = np.deg2rad(
-        [lat_start, long_start, lat_dest, long_dest]
+    lat_start, long_start, lat_dest, long_dest = (
+        np.deg2rad(np.asarray(x, dtype=float))
+        for x in (lat_start, long_start, lat_dest, long_dest)
     )
     # compute zeta
     a = (
@@ -52,24 +320,96 @@ def haversine(
         * np.sin((long_dest - long_start) / 2) ** 2
     )
     c = 2 * np.arcsin(np.sqrt(a))
-    r = 6371
 
-    return c * r
+    return c * EARTH_RADIUS
+
+
+def pairwise_haversine(
+    coords_a: np.ndarray,
+    coords_b: np.ndarray = None,
+    dtype=np.float64,
+    chunk_size: Optional[int] = None,
+) -> np.ndarray:
+    """Function to compute the distances as the crow flies between all pairs of two sets of locations
+
+    :param coords_a: coordinates (latitude, longitude) of n locations, shape (n, 2)
+    :param coords_b: coordinates (latitude, longitude) of m locations, shape (m, 2); defaults to coords_a
+    :param dtype: float type of the computation and the result, e.g. np.float32 to halve the memory
+    :param chunk_size: number of rows of the matrix computed at once, to limit the memory of intermediate results;
+                       None to compute the whole matrix at once
+    :type coords_a: np.ndarray
+    :type coords_b: np.ndarray
+    :type dtype: np.dtype
+    :type chunk_size: int
+    :return: distance matrix in km, shape (n, m)
+    :rtype: np.ndarray
+    """
+    rad_a = np.deg2rad(np.asarray(coords_a, dtype=dtype).reshape(-1, 2))
+    rad_b = (
+        rad_a
+        if coords_b is None
+        else np.deg2rad(np.asarray(coords_b, dtype=dtype).reshape(-1, 2))
+    )
+    lat_b, long_b = rad_b[:, 0], rad_b[:, 1]
+    cos_lat_b = np.cos(lat_b)
+    if chunk_size is None:
+        chunk_size = max(len(rad_a), 1)
+
+    result = np.empty((len(rad_a), len(rad_b)), dtype=dtype)
+    for start in range(0, len(rad_a), chunk_size):
+        lat_a, long_a = rad_a[start : start + chunk_size].T
+        a = (
+            np.sin((lat_b - lat_a[:, None]) / 2) ** 2
+            + np.cos(lat_a)[:, None]
+            * cos_lat_b
+            * np.sin((long_b - long_a[:, None]) / 2) ** 2
+        )
+        # rounding may push a slightly above 1 for antipodal points
+        np.clip(a, 0, 1, out=a)
+        result[start : start + chunk_size] = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+    return result
+
+
+AIRPORTS_CSV = DATA_DIR / "airports.csv"
+
+
+@functools.lru_cache(maxsize=None)
+def airports() -> Dict[str, Tuple[str, List[float], str]]:
+    """Airports in ``data/airports.csv`` by IATA code, loaded on first use
+
+    :return: name, coordinates ([long, lat]) and country (ISO 3166-1 alpha-3) of each airport
+    :rtype: dict[str, tuple[str, list[float], str]]
+    """
+    return {
+        row["iata"]: (
+            row["name"],
+            [float(row["longitude"]), float(row["latitude"])],
+            row["country"],
+        )
+        for row in read_table(AIRPORTS_CSV)
+    }
 
 
 def geocoding_airport(iata: str) -> Tuple[str, Tuple[float, float], str]:
     """Function to obtain the coordinates of an airport by the IATA code
 
+    The airport is looked up in the bundled airport table first; only codes missing there are searched with Pelias.
+    Airports found with Pelias are added to the table for the lifetime of the process.
+
     :param iata: IATA airport code
     :type iata: str
-    :return: name, coordinates and country of the found airport
+    :return: name, coordinates ([long, lat]) and country of the found airport
     :rtype: Tuple[str, Tuple[float, float], str]
     """
-    clnt = openrouteservice.Client(key=ORS_API_KEY)
+    airport = airports().get(iata.strip().upper())
+    if airport is not None:
+        name, geom, country = airport
+        return name, list(geom), country
 
-    call = pelias_search(clnt, f"{iata} Airport")
+    features = _pelias("search", text=f"{iata} Airport")
 
-    for feature in call["features"]:
+    for feature in features:
         try:
             if feature["properties"]["addendum"]["osm"]["iata"] == iata:
                 name = feature["properties"]["name"]
@@ -87,6 +427,8 @@ def geocoding_airport(iata: str) -> Tuple[str, Tuple[float, float], str]:
                 country = feature["properties"]["country_a"]
                 break
 
+    # keep the result for further flights from or to this airport
+    airports()[iata.strip().upper()] = (name, list(geom), country)
     return name, geom, country
 
 
@@ -102,10 +444,8 @@ def geocoding(address):
     :return: Name, country and coordinates of the found location
     """
 
-    clnt = openrouteservice.Client(key=ORS_API_KEY)
-
-    call = pelias_search(clnt, address)
-    for feature in call["features"]:
+    features = _pelias("search", text=address)
+    for feature in features:
         name = feature["properties"]["name"]
         country = feature["properties"]["country"]
         coords = feature["geometry"]["coordinates"]
@@ -151,14 +491,11 @@ def geocoding_structured(loc_dict):
     :return: Name, country and coordinates of the found location
     """
 
-    clnt = openrouteservice.Client(key=ORS_API_KEY)
-
     is_valid_geocoding_dict(loc_dict)
 
-    call = pelias_structured(clnt, **loc_dict)
-    n_results = len(call["features"])
-    res = call["features"]
-    print(res)
+    res = _pelias("structured", **loc_dict)
+    n_results = len(res)
+    logger.debug("Pelias response: %s", res)
     assert n_results != 0, "No places found with these search parameters"
     if n_results == 0:
         raise Exception("No places found with these search parameters")
@@ -172,20 +509,31 @@ def geocoding_structured(loc_dict):
             if (
                 layer != "address" and layer != "locality" and layer != "street"
             ) and n_results > 1:
-                print(
-                    f"Data type not matching search ({layer} instead of address or locality. Skipping {name}, {coords}"
+                logger.debug(
+                    "Data type not matching search (%s instead of address or locality). Skipping %s, %s",
+                    layer,
+                    name,
+                    coords,
                 )
                 continue
         confidence = feature["properties"]["confidence"]
         if confidence < 0.8:
-            warnings.warn(
-                f"Low confidence: {confidence:.1f} for result {name}, {coords}"
+            report(
+                "geocoding.confidence.low",
+                "Low confidence: {confidence:.1f} for result {name}, {coords}",
+                confidence=confidence,
+                name=name,
+                coords=coords,
             )
         break
-    print(
-        f"{n_results} location(s) found. Using this result: {name}, {country} (data type: {layer})"
+    logger.info(
+        "%d location(s) found. Using this result: %s, %s (data type: %s)",
+        n_results,
+        name,
+        country,
+        layer,
     )
-    print("Coords: ", coords)
+    logger.debug("Coords: %s", coords)
 
     # todo: check if to return res or not!
     return name, country, coords, res
@@ -207,24 +555,10 @@ def geocoding_train_stations(loc_dict):
         station_name:   Name of the train station
                         e.g., 'Heidelberg Hbf'
 
-    :return: Name, country and coordinates of the found location
+    :return: Name, country and coordinates ([long, lat]) of the found location
     """
-    stations_df = pd.read_csv(
-        f"{script_path}/../data/stations/stations.csv",
-        sep=";",
-        low_memory=False,
-        usecols=[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14],
-    )
-    # remove stations with no coordinates
-    stations_df.dropna(subset=["latitude", "longitude"], inplace=True)
-    countries_eu = stations_df["country"].unique()
     if "country" in loc_dict:
         country_code = loc_dict["country"]
-        if country_code not in countries_eu:
-            warnings.warn(
-                "The provided country is not within Europe. "
-                "Please provide the address of the station instead of the station name for accurate results."
-            )
     else:
         raise ValueError("No 'country' provided. Cannot search for train station")
     if "station_name" in loc_dict:
@@ -232,19 +566,25 @@ def geocoding_train_stations(loc_dict):
     else:
         raise ValueError("No 'station_name' provided. Cannot search for train station.")
 
-    # filter stations by country
-    stations_in_country_df = stations_df[stations_df["country"] == country_code]
-
-    # use thefuzz to find best match
-    choices = stations_in_country_df["slug"].values
-    res_station_slug, score = process.extractOne(
-        station_name, choices, scorer=fuzz.partial_ratio
-    )
-    res_station = stations_in_country_df[
-        stations_in_country_df["slug"] == res_station_slug
-    ]
-    res_country, res_station_name = res_station[["country", "name"]].values[0]
-    coords = res_station[["latitude", "longitude"]].values
+    stations = load_station_index()
+    if country_code not in stations:
+        report(
+            "stations.country.unavailable",
+            "The provided country is not within Europe. "
+            "Please provide the address of the station instead of the station name for accurate results.",
+        )
+        raise ValueError(f"No train stations available for country '{country_code}'")
+    stations_in_country = stations.partition(country_code)
+
+    # find best match (same score as thefuzz's partial_ratio, see StationMatcher)
+    matcher = stations.matcher(country_code)
+    with instrumentation.stage("stations.match"):
+        i, score = matcher.match(station_name)
+    res_station_name = stations_in_country.names[i]
+    res_country = country_code
+    lat, long = stations_in_country.coords[i]
+    # same order as the coordinates returned by the Pelias geocoding functions
+    coords = [float(long), float(lat)]
 
     return res_station_name, res_country, coords
 
@@ -272,11 +612,30 @@ def is_valid_geocoding_dict(geocoding_dict):
         ), f"Error! Parameter {key} is not available. Please check the input data."
     # warnings
     if "country" not in geocoding_dict.keys():
-        warnings.warn("Country was not provided. The results may be wrong.")
+        report(
+            "geocoding.country.missing",
+            "Country was not provided. The results may be wrong.",
+        )
     if "locality" not in geocoding_dict.keys():
-        warnings.warn(
-            "Locality (city) was not provided. The results may be inaccurate."
+        report(
+            "geocoding.locality.missing",
+            "Locality (city) was not provided. The results may be inaccurate.",
+        )
+
+
+def _check_profile(profile: str) -> str:
+    """Return the profile if it is supported, else the default profile"""
+    # profile may be: driving-car, cycling-regular
+    allowed_profiles = ["driving-car", "cycling-regular"]
+    if profile not in allowed_profiles or profile is None:
+        profile = "driving-car"
+        report(
+            "route.profile.default",
+            "Warning! Specified profile not available or no profile passed.\n"
+            "Profile set to '{default}' by default.",
+            default=profile,
         )
+    return profile
 
 
 def get_route(coords, profile: str = None) -> Kilometer:
@@ -287,19 +646,158 @@ def get_route(coords, profile: str = None) -> Kilometer:
     :return: distance of the route
     """
     # coords: list of [lat,long] lists
-    # profile may be: driving-car, cycling-regular
-    clnt = openrouteservice.Client(key=ORS_API_KEY)
+    profile = _check_profile(profile)
+    cache = _route_cache
+    if cache is not None:
+        key = _route_key(coords, profile)
+        dist = cache.get(key)
+        if dist is not None:
+            instrumentation.count("cache.route.hit")
+            return dist
+        instrumentation.count("cache.route.miss")
+
+    dist = _directions_distance(coords, profile)
+    if cache is not None:
+        cache.set(key, dist)
 
-    allowed_profiles = ["driving-car", "cycling-regular"]
-    if profile not in allowed_profiles or profile is None:
-        profile = "driving-car"
-        warnings.warn(
-            f"Warning! Specified profile not available or no profile passed.\n"
-            f"Profile set to '{profile}' by default."
-        )
-    route = directions(clnt, coords, profile=profile)
-    dist = (
+    return dist
+
+
+def _directions_distance(coords, profile: str) -> Kilometer:
+    """Request the distance of a route from the openrouteservice directions endpoint, without the route cache"""
+    _throttle("directions")
+    clnt = get_client()
+    instrumentation.count("requests.directions")
+    try:
+        with instrumentation.stage("directions"):
+            route = directions(clnt, coords, profile=profile)
+    except Exception:
+        instrumentation.count("errors.directions")
+        raise
+    return (
         route["routes"][0]["summary"]["distance"] / 1000
     )  # divide my 1000, as we're working with distances in km
 
-    return dist
+
+# maximum number of sources x destinations in one matrix request to the public openrouteservice API
+MATRIX_MAX_ELEMENTS = 3500
+
+
+def _matrix_groups(pairs: list, max_elements: int) -> Tuple[List[list], list]:
+    """Group origin-destination pairs (of location indices) into matrix requests
+
+    Pairs sharing an origin or destination are requested together as one row or column of a matrix, starting with
+    the location shared by most pairs, so that every element of a matrix is a requested pair. The remaining pairs
+    share no location with another pair: a matrix of them would bill n x n elements against the quota for n routes,
+    so they are left to the directions endpoint.
+
+    :return: pairs of each matrix request, remaining pairs
+    """
+    by_location = defaultdict(list)
+    for pair in pairs:
+        by_location["source", pair[0]].append(pair)
+        by_location["destination", pair[1]].append(pair)
+
+    groups = []
+    assigned = set()
+    for (side, hub), members in sorted(
+        by_location.items(), key=lambda item: len(item[1]), reverse=True
+    ):
+        members = [pair for pair in members if pair not in assigned]
+        if len(members) < 2:
+            continue
+        assigned.update(members)
+        for start in range(0, len(members), max_elements):
+            groups.append(members[start : start + max_elements])
+
+    singles = [pair for pair in pairs if pair not in assigned]
+    return groups, singles
+
+
+def get_route_distances(
+    routes: Sequence[list],
+    profile: str = "driving-car",
+    max_elements: int = MATRIX_MAX_ELEMENTS,
+) -> List[Optional[Kilometer]]:
+    """Obtain the distances of many routes, with as few requests as possible
+
+    Routes from a start to a destination are obtained from the openrouteservice matrix endpoint, which computes the
+    distances between many sources and destinations in one request. Routes sharing a start or destination (e.g. many
+    commutes to one workplace) are requested together, as one row or column of a matrix, so that the quota is only
+    billed for the requested routes. Routes sharing neither start nor destination with another route, and routes
+    with intermediate stops, are obtained from the directions endpoint (one request per route, as ``get_route``).
+    Route distances are cached like those of ``get_route``.
+
+    :param routes: waypoints of each route, as list of [long, lat] coordinates
+    :param profile: driving-car, cycling-regular
+    :param max_elements: maximum number of sources x destinations in one matrix request
+    :type routes: Sequence[list]
+    :type profile: str
+    :type max_elements: int
+    :return: distance of each route in km; None if no route was found
+    :rtype: list[float]
+    """
+    profile = _check_profile(profile)
+    cache = _route_cache
+    distances: List[Optional[Kilometer]] = [None] * len(routes)
+
+    # distinct locations and origin-destination pairs of the routes without intermediate stops
+    locations: Dict[tuple, int] = {}
+    pairs: Dict[Tuple[int, int], list] = defaultdict(list)
+    for i, coords in enumerate(routes):
+        if len(coords) != 2:
+            distances[i] = get_route(coords, profile)
+            continue
+        if cache is not None:
+            distances[i] = cache.get(_route_key(coords, profile))
+            if distances[i] is not None:
+                instrumentation.count("cache.route.hit")
+                continue
+            instrumentation.count("cache.route.miss")
+        start, dest = (
+            locations.setdefault(tuple(float(c) for c in point), len(locations))
+            for point in coords
+        )
+        pairs[start, dest].append(i)
+
+    points = [list(point) for point in locations]
+    groups, singles = _matrix_groups(list(pairs), max_elements)
+    for start, dest in singles:
+        coords = [points[start], points[dest]]
+        dist = _directions_distance(coords, profile)
+        for i in pairs[start, dest]:
+            distances[i] = dist
+        if cache is not None:
+            cache.set(_route_key(coords, profile), dist)
+
+    for group in groups:
+        # rows and columns of the matrix by location
+        rows = {start: i for i, start in enumerate(dict.fromkeys(s for s, _ in group))}
+        columns = {dest: i for i, dest in enumerate(dict.fromkeys(d for _, d in group))}
+        request_locations = list(dict.fromkeys([*rows, *columns]))
+        index = {location: i for i, location in enumerate(request_locations)}
+        _throttle("matrix")
+        clnt = get_client()
+        instrumentation.count("requests.matrix")
+        try:
+            with instrumentation.stage("matrix"):
+                matrix = distance_matrix(
+                    clnt,
+                    [points[location] for location in request_locations],
+                    profile=profile,
+                    sources=[index[location] for location in rows],
+                    destinations=[index[location] for location in columns],
+                    metrics=["distance"],
+                    units="km",
+                )["distances"]
+        except Exception:
+            instrumentation.count("errors.matrix")
+            raise
+        for start, dest in group:
+            dist = matrix[rows[start]][columns[dest]]
+            for i in pairs[start, dest]:
+                distances[i] = dist
+            if dist is not None and cache is not None:
+                cache.set(_route_key([points[start], points[dest]], profile), dist)
+
+    return distances
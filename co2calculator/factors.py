@@ -0,0 +1,442 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Keyed lookup tables for emission factors, conversion factors and detour parameters
+
+The tables are compiled from their csv files into one binary snapshot (``data/factors.snapshot``), which is built
+automatically on first use (or with ``python -m co2calculator.factors``) and rebuilt when a csv file changes. The
+snapshot holds a table of contents (key fields and keys of each table, as JSON) and the factors as a float64 array,
+which is memory-mapped, so that processes loading the snapshot share its pages. It carries the hash of the csv files
+it was built from and a checksum of its contents, which are verified on load.
+"""
+
+import csv
+import functools
+import hashlib
+import json
+import math
+import struct
+import tempfile
+import warnings
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from .instrumentation import instrument, timed
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+FACTORS_SNAPSHOT = DATA_DIR / "factors.snapshot"
+
+# Snapshot layout: header (magic, format version, length of the table of contents, SHA-256 of table of contents and
+# factors), table of contents, zero padding to a multiple of 64 bytes, factors (little-endian float64)
+SNAPSHOT_MAGIC = b"CO2FACT\0"
+SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<8sII32s")
+_SNAPSHOT_ALIGNMENT = 64
+
+EMISSION_FACTOR_FIELDS = (
+    "category",
+    "subcategory",
+    "size_class",
+    "fuel_type",
+    "occupancy",
+    "range",
+    "seating",
+)
+
+_AMBIGUOUS = object()
+
+
+def _normalize(value):
+    """Normalize a key value, so that empty cells and numeric types compare equal
+
+    :param value: raw value of a key field
+    :return: None for empty values (None, NaN, ""), int for integral numbers, the value itself otherwise
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value if value != "" else None
+    try:
+        if math.isnan(value):
+            return None
+    except TypeError:
+        return value
+    if float(value).is_integer():
+        return int(value)
+    return float(value)
+
+
+class FactorIndex:
+    """Factor table indexed by its key fields, built once from table records.
+
+    Every record is stored under the tuple of all its key fields; records with identical keys are rejected when the
+    index is built. Lookups may use any subset of the key fields. The index for a subset is built on first use and
+    kept, so that each lookup is a single dictionary access. A lookup raises ``ValueError`` if the requested subset of
+    fields does not identify a single record, instead of silently using the first match.
+    """
+
+    def __init__(
+        self,
+        records: Iterable[Mapping],
+        key_fields: Tuple[str, ...],
+        value_field: Union[str, Tuple[str, ...]],
+    ):
+        """
+        :param records: rows of the factor table as mappings from column name to value
+        :param key_fields: names of the columns that identify a factor
+        :param value_field: name of the column holding the factor; if a tuple of names is given, the factor is the
+                            tuple of these columns' values
+        :type records: iterable of dict
+        :type key_fields: tuple[str]
+        :type value_field: str or tuple[str]
+        """
+        self.key_fields = tuple(key_fields)
+        self.value_field = value_field
+        self._factors: Dict[tuple, object] = {}
+        for record in records:
+            key = tuple(_normalize(record.get(field)) for field in self.key_fields)
+            if key in self._factors:
+                raise ValueError(
+                    f"Ambiguous factor table: more than one entry for {self._describe(self.key_fields, key)}"
+                )
+            if isinstance(value_field, str):
+                value = float(record[value_field])
+            else:
+                value = tuple(float(record[field]) for field in value_field)
+            self._factors[key] = value
+        self._indices: Dict[Tuple[str, ...], Dict[tuple, object]] = {
+            self.key_fields: self._factors
+        }
+
+    @classmethod
+    def from_arrays(
+        cls,
+        keys: Iterable[Iterable],
+        values: np.ndarray,
+        key_fields: Tuple[str, ...],
+        value_field: Union[str, Tuple[str, ...]],
+    ) -> "FactorIndex":
+        """Build the index from keys (already normalized) and an array of factors, e.g. of a compiled snapshot
+
+        :param keys: values of the key fields of each entry
+        :param values: factors, one row per entry and one column per value field
+        :param key_fields: names of the key fields
+        :param value_field: name of the value field, or tuple of names
+        :type keys: iterable of lists
+        :type values: np.ndarray
+        :type key_fields: tuple[str]
+        :type value_field: str or tuple[str]
+        :rtype: FactorIndex
+        """
+        index = cls((), key_fields, value_field)
+        for key, row in zip(keys, values.tolist()):
+            index._factors[tuple(key)] = (
+                row[0] if isinstance(value_field, str) else tuple(row)
+            )
+        return index
+
+    def __len__(self) -> int:
+        return len(self._factors)
+
+    def items(self):
+        """Full keys and factors of all entries
+
+        :return: view of (key tuple, factor) pairs
+        """
+        return self._factors.items()
+
+    @staticmethod
+    def _describe(fields, values) -> str:
+        return ", ".join(f"{f}={v!r}" for f, v in zip(fields, values))
+
+    def index(self, fields: Tuple[str, ...]) -> Dict[tuple, object]:
+        """Return the index over a subset of key fields, building it if necessary
+
+        :param fields: key fields, in the order of ``key_fields``
+        :type fields: tuple[str]
+        :return: mapping of key values to factors; ambiguous keys map to an internal marker
+        :rtype: dict
+        """
+        try:
+            return self._indices[fields]
+        except KeyError:
+            pass
+        positions = [self.key_fields.index(f) for f in fields]
+        index: Dict[tuple, object] = {}
+        for key, value in self._factors.items():
+            sub_key = tuple(key[p] for p in positions)
+            index[sub_key] = _AMBIGUOUS if sub_key in index else value
+        self._indices[fields] = index
+        return index
+
+    def get(self, **key):
+        """Look up the factor identified by the given key fields
+
+        :param key: values of (a subset of) the key fields, e.g. ``subcategory="car", size_class="small"``
+        :return: the factor
+        :raises KeyError: if no entry matches the key
+        :raises ValueError: if more than one entry matches the key
+        """
+        fields = tuple(f for f in self.key_fields if f in key)
+        if len(fields) != len(key):
+            unknown = sorted(set(key) - set(self.key_fields))
+            raise TypeError(
+                f"Unknown key fields {unknown}. Valid fields are {self.key_fields}"
+            )
+        values = tuple(_normalize(key[f]) for f in fields)
+        value = self.index(fields).get(values)
+        if value is None:
+            raise KeyError(f"No factor available for {self._describe(fields, values)}")
+        if value is _AMBIGUOUS:
+            raise ValueError(
+                f"Ambiguous factor lookup: more than one entry matches {self._describe(fields, values)}"
+            )
+        return value
+
+
+# lookups are too frequent for a check of the instrumentation flag; they are only wrapped while it is enabled
+instrument(FactorIndex, "get", "factors.lookup")
+
+
+def emission_factor_index(records: Iterable[Mapping]) -> FactorIndex:
+    """Build the index of emission factors (co2e per unit) from the rows of ``emission_factors.csv``"""
+    return FactorIndex(records, EMISSION_FACTOR_FIELDS, "co2e")
+
+
+def conversion_factor_index(records: Iterable[Mapping]) -> FactorIndex:
+    """Build the index of heating conversion factors (to kWh) from the rows of ``conversion_factors_heating.csv``"""
+    return FactorIndex(records, ("fuel", "unit"), "conversion_value")
+
+
+def detour_index(records: Iterable[Mapping]) -> FactorIndex:
+    """Build the index of detour (coefficient, constant) pairs from the rows of ``detour.csv``"""
+    return FactorIndex(
+        records, ("transportation_mode",), ("coefficient", "constant [km]")
+    )
+
+
+@timed("factors.load")
+def read_table(path: Path, numeric_fields: Tuple[str, ...] = ()) -> List[dict]:
+    """Read a factor table from a csv file into a list of records, without pandas
+
+    :param path: path of the csv file
+    :param numeric_fields: key columns that hold numbers; their values are converted to float (None if empty)
+    :type path: Path
+    :type numeric_fields: tuple[str]
+    :return: one dictionary per row
+    :rtype: list[dict]
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        records = list(csv.DictReader(f))
+    for record in records:
+        for field in numeric_fields:
+            record[field] = float(record[field]) if record[field] else None
+    return records
+
+
+# tables of the snapshot: csv file, numeric key fields and function building the index from the rows
+_SNAPSHOT_TABLES = {
+    "emission_factors": ("emission_factors.csv", ("occupancy",), emission_factor_index),
+    "conversion_factors": (
+        "conversion_factors_heating.csv",
+        (),
+        conversion_factor_index,
+    ),
+    "detour_parameters": ("detour.csv", (), detour_index),
+}
+
+
+def source_hash(data_dir: Union[str, Path] = DATA_DIR) -> str:
+    """SHA-256 of the csv files the snapshot is built from
+
+    :param data_dir: directory of the csv files
+    :type data_dir: str or Path
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    for filename, _, _ in _SNAPSHOT_TABLES.values():
+        content = (Path(data_dir) / filename).read_bytes()
+        digest.update(f"{filename}:{len(content)}:".encode())
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def read_factor_tables(data_dir: Union[str, Path] = DATA_DIR) -> Dict[str, FactorIndex]:
+    """Build the factor tables from their csv files, without a snapshot
+
+    :param data_dir: directory of the csv files
+    :type data_dir: str or Path
+    :return: factor index of each table: emission_factors, conversion_factors and detour_parameters
+    :rtype: dict[str, FactorIndex]
+    """
+    data_dir = Path(data_dir)
+    # building the index checks the table, e.g. for duplicate keys
+    return {
+        name: build(read_table(data_dir / filename, numeric_fields=numeric_fields))
+        for name, (filename, numeric_fields, build) in _SNAPSHOT_TABLES.items()
+    }
+
+
+@timed("factors.build")
+def build_factor_snapshot(
+    data_dir: Union[str, Path] = DATA_DIR,
+    snapshot_path: Union[str, Path] = FACTORS_SNAPSHOT,
+) -> Path:
+    """Compile the factor tables into a snapshot
+
+    :param data_dir: directory of the csv files
+    :param snapshot_path: path of the snapshot file to write
+    :type data_dir: str or Path
+    :type snapshot_path: str or Path
+    :return: path of the snapshot file
+    :rtype: Path
+    """
+    data_dir = Path(data_dir)
+    contents = {"source_hash": source_hash(data_dir), "tables": {}}
+    arrays = []
+    offset = 0
+    for name, index in read_factor_tables(data_dir).items():
+        keys = [list(key) for key, _ in index.items()]
+        values = np.array([value for _, value in index.items()], dtype="<f8")
+        values = values.reshape(len(keys), -1)
+        contents["tables"][name] = {
+            "key_fields": list(index.key_fields),
+            "value_field": index.value_field,
+            "keys": keys,
+            "offset": offset,
+            "shape": list(values.shape),
+        }
+        arrays.append(values)
+        offset += values.nbytes
+    toc = json.dumps(contents).encode("utf-8")
+    data = b"".join(values.tobytes() for values in arrays)
+    header = _SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(toc), hashlib.sha256(toc + data).digest()
+    )
+    padding = b"\0" * (-(len(header) + len(toc)) % _SNAPSHOT_ALIGNMENT)
+
+    snapshot_path = Path(snapshot_path)
+    # write to a temporary file of this build first, so that concurrent readers never see an incomplete snapshot and
+    # concurrent builds never write into the same file
+    tmp_file = tempfile.NamedTemporaryFile(
+        dir=snapshot_path.parent,
+        prefix=snapshot_path.name + ".",
+        suffix=".tmp",
+        delete=False,
+    )
+    tmp_path = Path(tmp_file.name)
+    try:
+        with tmp_file:
+            tmp_file.write(header + toc + padding + data)
+        tmp_path.replace(snapshot_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return snapshot_path
+
+
+def read_factor_snapshot(
+    snapshot_path: Union[str, Path], expected_source_hash: Optional[str] = None
+) -> Optional[Dict[str, FactorIndex]]:
+    """Load the factor tables from a snapshot
+
+    :param snapshot_path: path of the snapshot file
+    :param expected_source_hash: hash of the csv files (see ``source_hash``) the snapshot must have been built from
+    :type snapshot_path: str or Path
+    :type expected_source_hash: str
+    :return: factor index of each table; None if the snapshot is invalid, corrupt, of another format version or
+             built from other csv files
+    :rtype: dict[str, FactorIndex]
+    """
+    try:
+        raw = np.memmap(snapshot_path, dtype=np.uint8, mode="r")
+        magic, version, toc_length, checksum = _SNAPSHOT_HEADER.unpack_from(raw)
+    except (OSError, ValueError, struct.error):
+        return None
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return None
+    toc_end = _SNAPSHOT_HEADER.size + toc_length
+    data_start = toc_end + (-toc_end % _SNAPSHOT_ALIGNMENT)
+    toc, data = raw[_SNAPSHOT_HEADER.size : toc_end], raw[data_start:]
+    digest = hashlib.sha256(toc)
+    digest.update(data)
+    if digest.digest() != checksum:
+        return None
+    contents = json.loads(bytes(toc))
+    if expected_source_hash is not None and (
+        contents["source_hash"] != expected_source_hash
+    ):
+        return None
+
+    factors = data.view("<f8")
+    tables = {}
+    for name, table in contents["tables"].items():
+        rows, columns = table["shape"]
+        start = table["offset"] // factors.itemsize
+        value_field = table["value_field"]
+        tables[name] = FactorIndex.from_arrays(
+            table["keys"],
+            factors[start : start + rows * columns].reshape(rows, columns),
+            tuple(table["key_fields"]),
+            value_field if isinstance(value_field, str) else tuple(value_field),
+        )
+    return tables
+
+
+def _load_factor_tables(data_dir: Path, snapshot_path: Path) -> Dict[str, FactorIndex]:
+    expected_hash = source_hash(data_dir)
+    tables = read_factor_snapshot(snapshot_path, expected_hash)
+    if tables is not None:
+        return tables
+    try:
+        built_path = build_factor_snapshot(data_dir, snapshot_path)
+    except OSError:
+        # e.g. read-only installation; build the snapshot elsewhere and use it for this process only
+        warnings.warn(f"Factor snapshot could not be written to {snapshot_path}")
+        built_path = build_factor_snapshot(
+            data_dir, Path(tempfile.mkdtemp()) / snapshot_path.name
+        )
+    tables = read_factor_snapshot(built_path, expected_hash)
+    if tables is None:
+        # e.g. the snapshot was replaced by a build from other csv files in the meantime
+        warnings.warn(
+            f"Factor snapshot {built_path} could not be read, using the csv files"
+        )
+        tables = read_factor_tables(data_dir)
+    return tables
+
+
+@functools.lru_cache(maxsize=None)
+@timed("factors.snapshot")
+def load_factor_snapshot() -> Dict[str, FactorIndex]:
+    """Return the factor tables, (re)building the snapshot first if it is missing, invalid or outdated
+
+    If the snapshot can still not be read after building it, the tables are built from the csv files instead.
+
+    :return: factor index of each table: emission_factors, conversion_factors and detour_parameters
+    :rtype: dict[str, FactorIndex]
+    """
+    return _load_factor_tables(DATA_DIR, FACTORS_SNAPSHOT)
+
+
+@functools.lru_cache(maxsize=None)
+def emission_factors() -> FactorIndex:
+    """Index of the emission factors in ``data/emission_factors.csv``, loaded on first use"""
+    return load_factor_snapshot()["emission_factors"]
+
+
+@functools.lru_cache(maxsize=None)
+def conversion_factors() -> FactorIndex:
+    """Index of the conversion factors in ``data/conversion_factors_heating.csv``, loaded on first use"""
+    return load_factor_snapshot()["conversion_factors"]
+
+
+@functools.lru_cache(maxsize=None)
+def detour_parameters() -> FactorIndex:
+    """Index of the detour parameters in ``data/detour.csv``, loaded on first use"""
+    return load_factor_snapshot()["detour_parameters"]
+
+
+if __name__ == "__main__":
+    print(f"Factor snapshot written to {build_factor_snapshot()}")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Timing and counters of the stages of a calculation, e.g. to find out where the time of a slow batch goes
+
+Instrumentation is disabled by default; instrumented code then only checks a flag, and frequently called methods
+(see ``instrument``) are not wrapped at all. Once enabled (``enable()`` or ``with instrumented(): ...``), the
+following is recorded for all threads of the process:
+
+- stages (wall time per call, as histogram): ``pelias``, ``directions`` and ``matrix`` requests,
+  ``throttle.<endpoint>`` (waiting for the rate limit of an openrouteservice endpoint), ``stations.build``,
+  ``stations.load``, ``stations.partition``, ``stations.matcher`` and ``stations.match``, ``factors.load``,
+  ``factors.build``, ``factors.snapshot`` and ``factors.lookup``, and ``calculate.geocoding_stop`` and
+  ``calculate.geocoding_train_stop`` (geocoding of one stop of a trip, including the stages it goes through)
+- counters: ``requests.<endpoint>`` and ``errors.<endpoint>`` (failed requests) per openrouteservice endpoint,
+  ``cache.geocoding.hit``/``miss`` and ``cache.route.hit``/``miss``, and the statistics of the locations resolved
+  at once by ``calc_co2_businesstrip_batch`` (see ``co2calculator.prefetch.prefetch_businesstrips``), e.g.
+  ``prefetch.unique_locations`` and ``prefetch.calls_avoided``
+
+``snapshot()`` returns the values recorded so far. Hooks (``add_hook``) are called with each recorded value, e.g. to
+forward them to a metrics system.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# upper bounds of the histogram buckets in seconds: 1 µs to 100 s, 4 buckets per decade; the last bucket is unbounded
+BUCKET_BOUNDS = tuple(10 ** (k / 4) for k in range(-24, 9))
+
+_enabled = False
+_lock = threading.Lock()
+_stages: Dict[str, dict] = {}
+_counters: Dict[str, int] = {}
+_hooks: List[Callable[[str, str, float], None]] = []
+# methods wrapped only while recording: class, attribute, stage and the original function
+_methods: List[Tuple[type, str, str, Callable]] = []
+_NULL_CONTEXT = nullcontext()
+
+
+def enable() -> None:
+    """Start recording"""
+    global _enabled
+    with _lock:
+        if not _enabled:
+            for owner, attribute, name, function in _methods:
+                setattr(owner, attribute, _wrap(function, name))
+        _enabled = True
+
+
+def disable() -> None:
+    """Stop recording; the values recorded so far are kept"""
+    global _enabled
+    with _lock:
+        for owner, attribute, _, function in _methods:
+            setattr(owner, attribute, function)
+        _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def instrumented() -> Iterator[None]:
+    """Record within the context, e.g. ``with instrumented(): calc_co2_businesstrip_batch(trips)``"""
+    was_enabled = _enabled
+    enable()
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+
+
+def add_hook(hook: Callable[[str, str, float], None]) -> None:
+    """Call a function with each recorded value
+
+    The hook is called as ``hook(kind, name, value)``, with kind "timing" (value: seconds of one call of the stage)
+    or "count" (value: increment of the counter). It is called in the thread of the instrumented code, and should
+    therefore return quickly.
+
+    :param hook: function to call
+    :type hook: Callable[[str, str, float], None]
+    """
+    with _lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[str, str, float], None]) -> None:
+    """Stop calling a function added with ``add_hook``"""
+    with _lock:
+        _hooks.remove(hook)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """Record the duration of one call of a stage (if enabled)"""
+    if not _enabled:
+        return
+    with _lock:
+        stage = _stages.get(name)
+        if stage is None:
+            stage = _stages[name] = {
+                "count": 0,
+                "total": 0.0,
+                "min": seconds,
+                "max": seconds,
+                "histogram": [0] * (len(BUCKET_BOUNDS) + 1),
+            }
+        stage["count"] += 1
+        stage["total"] += seconds
+        stage["min"] = min(stage["min"], seconds)
+        stage["max"] = max(stage["max"], seconds)
+        stage["histogram"][bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        hooks = list(_hooks)
+    for hook in hooks:
+        hook("timing", name, seconds)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Increment a counter (if enabled)"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+        hooks = list(_hooks)
+    for hook in hooks:
+        hook("count", name, n)
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_timing(self.name, time.perf_counter() - self.start)
+
+
+def stage(name: str):
+    """Context manager recording the wall time of the enclosed code as one call of a stage (if enabled)
+
+    :param name: name of the stage, e.g. "pelias"
+    :type name: str
+    """
+    return _Timer(name) if _enabled else _NULL_CONTEXT
+
+
+def timed(name: str) -> Callable:
+    """Decorator recording the wall time of each call of the function as one call of a stage (if enabled)
+
+    :param name: name of the stage, e.g. "stations.build"
+    :type name: str
+    """
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record_timing(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def _wrap(function: Callable, name: str) -> Callable:
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record_timing(name, time.perf_counter() - start)
+
+    return wrapper
+
+
+def instrument(owner: type, attribute: str, name: str) -> None:
+    """Record the calls of a method as a stage, without any overhead while disabled
+
+    Unlike ``timed``, which checks whether recording is enabled on each call, the method is replaced by a timing
+    wrapper when recording is enabled, and restored when it is disabled. This is meant for methods called many
+    times per calculation.
+
+    :param owner: class of the method
+    :param attribute: name of the method
+    :param name: name of the stage, e.g. "factors.lookup"
+    :type owner: type
+    :type attribute: str
+    :type name: str
+    """
+    with _lock:
+        function = owner.__dict__[attribute]
+        _methods.append((owner, attribute, name, function))
+        if _enabled:
+            setattr(owner, attribute, _wrap(function, name))
+
+
+def snapshot() -> dict:
+    """Return the values recorded so far
+
+    :return: dictionary with keys "stages" (per stage: number of calls, total, minimum and maximum seconds and
+             histogram, i.e. number of calls per bucket of ``BUCKET_BOUNDS``), "counters" (per counter: its value)
+             and "bucket_bounds"
+    :rtype: dict
+    """
+    with _lock:
+        stages = {
+            name: {**stage, "histogram": list(stage["histogram"])}
+            for name, stage in _stages.items()
+        }
+        counters = dict(_counters)
+    return {
+        "stages": stages,
+        "counters": counters,
+        "bucket_bounds": list(BUCKET_BOUNDS),
+    }
+
+
+def reset() -> None:
+    """Discard the values recorded so far"""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
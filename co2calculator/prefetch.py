@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Resolution of the locations of many business trips before their emissions are calculated
+
+Trips of a batch often share locations (e.g. the institute as start of most trips), routes and airports. Instead of
+geocoding them once per trip, all trips are scanned first. Each distinct location, route and airport is then
+resolved once, concurrently, and the results are used for every trip which refers to it.
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from ._types import Kilometer
+from .cache import canonical_key
+from .calculate import (
+    _businesstrip_stops,
+    _crow_flies_distance,
+    _geocoding_stop,
+    _geocoding_train_stop,
+)
+from .distances import airports, geocoding_airport, get_route, get_route_distances
+
+# geocoding function for the stops of each mode, as used by the calc_co2_<mode> functions
+_GEOCODING_FUNCTIONS: Dict[str, Callable] = {
+    "car": _geocoding_stop,
+    "bus": _geocoding_stop,
+    "train": _geocoding_train_stop,
+}
+
+
+def _resolve_all(function: Callable, args: dict, max_workers: int) -> dict:
+    """Call the function for each of the arguments concurrently; results of failed calls are omitted
+
+    Calls may fail e.g. if a location cannot be found. The affected trips are left unresolved, so that the error is
+    raised when they are calculated.
+    """
+
+    def call(arg):
+        try:
+            return function(*arg)
+        except Exception:
+            return None
+
+    # each call runs in a copy of the caller's context, so that e.g. diagnostics are collected by the caller
+    contexts = [contextvars.copy_context() for _ in args]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(
+            zip(
+                args,
+                executor.map(
+                    lambda context, arg: context.run(call, arg),
+                    contexts,
+                    args.values(),
+                ),
+            )
+        )
+    return {key: result for key, result in results.items() if result is not None}
+
+
+def prefetch_businesstrips(
+    trips: Iterable[Mapping], max_workers: int = 8
+) -> Tuple[List[Optional[Kilometer]], dict]:
+    """Resolve the locations of business trips, with one request per distinct location, route and airport
+
+    For car, bus and train trips given by start and destination, the distance is computed as
+    ``calc_co2_businesstrip`` would compute it. Car routes are requested together from the matrix endpoint (see
+    ``co2calculator.distances.get_route_distances``). For plane trips, the airports which are not in the bundled airport
+    table are geocoded, so that later calculations find them without further requests.
+
+    :param trips: trips given as mappings with the parameters of ``calc_co2_businesstrip`` (transportation_mode,
+                  start, destination, distance, ...); trips with intermediate stops may give the list of their
+                  locations as ``stops`` instead of start and destination
+    :param max_workers: maximum number of concurrent requests
+    :type trips: Iterable[Mapping]
+    :type max_workers: int
+    :return: distance of each trip (None if the trip has a distance, is of another mode or could not be resolved)
+             and statistics: numbers of lookups of locations, routes and airports in the trips, numbers of distinct
+             lookups, and the number of requests avoided by resolving each of them only once
+    :rtype: tuple[list[float], dict]
+    """
+    # scan: stops (as location keys) of each trip, and the distinct locations, routes and airports
+    trip_stops: List[Optional[tuple]] = []
+    locations: Dict[str, tuple] = {}
+    routes: Dict[tuple, None] = {}
+    airport_codes: Dict[str, tuple] = {}
+    n_locations = n_routes = n_airports = 0
+    for trip in trips:
+        mode = trip.get("transportation_mode")
+        stops = None
+        if mode in _GEOCODING_FUNCTIONS and trip.get("distance") is None:
+            stops = trip.get("stops")
+            if stops is None:
+                try:
+                    stops = _businesstrip_stops(
+                        mode, trip.get("start"), trip.get("destination"), None
+                    )
+                except ValueError:
+                    # invalid trips are left to the calculation, which reports the error
+                    stops = None
+        elif mode == "plane":
+            for code in (trip.get("start"), trip.get("destination")):
+                if isinstance(code, str) and code.strip().upper() not in airports():
+                    n_airports += 1
+                    airport_codes.setdefault(code.strip().upper(), (code,))
+        if stops is None:
+            trip_stops.append(None)
+            continue
+        keys = []
+        for loc in stops:
+            key = canonical_key(_GEOCODING_FUNCTIONS[mode].__name__, loc)
+            locations.setdefault(key, (mode, loc))
+            keys.append(key)
+        n_locations += len(keys)
+        if mode == "car":
+            n_routes += 1
+            routes.setdefault(tuple(keys))
+        trip_stops.append((mode, tuple(keys)))
+
+    # resolve each distinct location, route and airport once
+    coords = _resolve_all(
+        lambda mode, loc: _GEOCODING_FUNCTIONS[mode](loc),
+        locations,
+        max_workers,
+    )
+    routable = {
+        route: ([coords[key] for key in route], "driving-car")
+        for route in routes
+        if all(key in coords for key in route)
+    }
+    try:
+        route_distances = dict(
+            zip(
+                routable,
+                get_route_distances([waypoints for waypoints, _ in routable.values()]),
+            )
+        )
+    except Exception:
+        # e.g. no matrix endpoint on a self-hosted instance: one request per route
+        route_distances = _resolve_all(get_route, routable, max_workers)
+    _resolve_all(geocoding_airport, airport_codes, max_workers)
+
+    # fan the results out to the trips
+    distances: List[Optional[Kilometer]] = []
+    for stops in trip_stops:
+        distance = None
+        if stops is not None:
+            mode, keys = stops
+            if mode == "car":
+                distance = route_distances.get(keys)
+            elif all(key in coords for key in keys):
+                distance = _crow_flies_distance([coords[key] for key in keys], mode)
+        distances.append(distance)
+
+    stats = {
+        "locations": n_locations,
+        "unique_locations": len(locations),
+        "routes": n_routes,
+        "unique_routes": len(routes),
+        "airports": n_airports,
+        "unique_airports": len(airport_codes),
+    }
+    stats["calls_avoided"] = (
+        n_locations
+        - len(locations)
+        + n_routes
+        - len(routes)
+        + n_airports
+        - len(airport_codes)
+    )
+    return distances, stats
+
+
+def prefetch_airports(codes: Iterable[str], max_workers: int = 8) -> List[str]:
+    """Geocode the airports which are not in the bundled airport table, each once and concurrently
+
+    Found airports are added to the airport table (see ``co2calculator.distances.geocoding_airport``).
+
+    :param codes: IATA codes of airports (normalized: stripped and upper case)
+    :param max_workers: maximum number of concurrent requests
+    :type codes: Iterable[str]
+    :type max_workers: int
+    :return: codes of the airports which could not be found
+    :rtype: list[str]
+    """
+    missing = {code: (code,) for code in codes if code not in airports()}
+    _resolve_all(geocoding_airport, missing, max_workers)
+    return [code for code in missing if code not in airports()]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Categorization of trips by distance, with configurable tables of distance bins"""
+
+import bisect
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class RangeBins:
+    """Table of distance bins: each bin reaches up to and including its limit; the last bin is unbounded
+
+    The bins of many distances are computed as integer codes (positions of the bins, -1 for missing distances),
+    which refer to the shared ``categories`` and ``descriptions`` of the table, instead of one string per distance.
+
+    :param limits: upper limits of all bins but the last in km, strictly increasing
+    :param categories: name of each bin (one more than limits)
+    :param descriptions: description of each bin (i.e., what range of distances the category corresponds to);
+                         default: the categories
+    :type limits: Sequence[float]
+    :type categories: Sequence[str]
+    :type descriptions: Sequence[str]
+    """
+
+    def __init__(
+        self,
+        limits: Sequence[float],
+        categories: Sequence[str],
+        descriptions: Optional[Sequence[str]] = None,
+    ):
+        limits = [float(limit) for limit in limits]
+        if any(lower >= upper for lower, upper in zip(limits, limits[1:])):
+            raise ValueError("Limits of the range bins must be strictly increasing")
+        descriptions = categories if descriptions is None else descriptions
+        if not len(categories) == len(descriptions) == len(limits) + 1:
+            raise ValueError(
+                "There must be one category and description more than limits"
+            )
+        self._limits = limits
+        self.limits = np.array(limits)
+        self.categories = tuple(categories)
+        self.descriptions = tuple(descriptions)
+        self._labels = tuple(zip(self.categories, self.descriptions))
+        self.code_dtype = np.int8 if len(self.categories) <= 127 else np.int32
+
+    def __repr__(self) -> str:
+        return f"RangeBins({self._limits}, {list(self.categories)})"
+
+    def code(self, distance: float) -> int:
+        """Bin of one distance, -1 if the distance is missing (None or NaN)"""
+        # NaN is the only value not equal to itself
+        if distance is None or distance != distance:
+            return -1
+        return bisect.bisect_left(self._limits, distance)
+
+    def codes(self, distance) -> np.ndarray:
+        """Bins of many distances, -1 for missing distances (NaN)
+
+        :param distance: distances in km
+        :type distance: array-like
+        :rtype: np.ndarray
+        """
+        distance = np.asarray(distance, dtype=float)
+        codes = np.searchsorted(self.limits, distance, side="left").astype(
+            self.code_dtype
+        )
+        codes[np.isnan(distance)] = -1
+        return codes
+
+    def categorize(self, distance: float) -> Tuple[Optional[str], Optional[str]]:
+        """Category and description of the bin of one distance (None for missing distances)"""
+        if distance is None or distance != distance:
+            return None, None
+        return self._labels[bisect.bisect_left(self._limits, distance)]
+
+
+# Range categories of trips (see co2calculator.calculate.range_categories)
+TRIP_RANGES = RangeBins(
+    [500, 1500, 4000],
+    ["very short haul", "short haul", "medium haul", "long haul"],
+    ["below 500 km", "500 to 1500 km", "1500 to 4000 km", "above 4000 km"],
+)
+# Ranges of flights in the emission factor table
+FLIGHT_RANGES = RangeBins([1500], ["short-haul", "long-haul"])
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Rate limiting of openrouteservice requests, so that concurrent calculations stay within the API quotas"""
+
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Token bucket allowing ``rate`` requests per minute, with bursts of up to ``capacity`` requests
+
+    Each request takes one token. If no token is left, the request is delayed until one has been refilled; waiting
+    requests are served in the order in which they asked for a token. The bucket is thread-safe; the async API
+    (``co2calculator.aio``) runs its requests in threads, which wait in ``acquire`` as well.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        :param rate: number of requests per minute
+        :param capacity: maximum number of requests sent at once; defaults to the rate, i.e. a whole minute's quota
+        :type rate: float
+        :type capacity: float
+        """
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return the time in seconds to wait until it is available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate / 60
+            )
+            self._updated = now
+            # tokens may become negative; they are then owed to the requests waiting for them
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * 60 / self.rate
+
+    def acquire(self) -> None:
+        """Wait (blocking the current thread) until a request may be sent"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
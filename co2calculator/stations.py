@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Index of train stations, built from the Trainline station database (data/stations/stations.csv)
+
+The csv file holds many columns for all stations in Europe. The index only keeps name, slug and coordinates of the
+stations with coordinates, partitioned by country and stored as numpy arrays. It is built once (automatically on
+first use, or with ``python -m co2calculator.stations``) and rebuilt when the csv file changes. A country's
+partition is read from the index when it is first needed and then kept in memory.
+
+Station names are matched to the slugs of a country's stations with :class:`StationMatcher`, which scores the
+same way as ``thefuzz.process.extractOne(name, slugs, scorer=fuzz.partial_ratio)``, but only scores the few
+slugs that share the most trigrams with the name.
+"""
+
+import bisect
+import csv
+import functools
+import os
+import sys
+import tempfile
+import threading
+import warnings
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+from .factors import DATA_DIR
+from .instrumentation import stage, timed
+
+STATIONS_CSV = DATA_DIR / "stations" / "stations.csv"
+STATIONS_INDEX = DATA_DIR / "stations_index.npz"
+
+# Maximum difference between the partial_ratio score of the match returned by StationMatcher and the score of the
+# best match found by scoring all stations
+SCORE_TOLERANCE = 10
+
+
+class StationPartition(NamedTuple):
+    """Train stations of one country"""
+
+    names: List[str]
+    slugs: List[str]
+    coords: np.ndarray  # (latitude, longitude) per station
+
+
+def _trigrams(text: str) -> set:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class StationMatcher:
+    """Fuzzy matching of station names against a list of station slugs
+
+    Slugs are compared with the partial_ratio score of thefuzz/rapidfuzz after the default processing (lower case,
+    letters and digits only), like ``thefuzz.process.extractOne`` does. Queries are resolved by
+
+    1. exact match of the processed name and slug (score 100)
+    2. slugs starting with the processed name (score 100)
+    3. scoring only the ``n_candidates`` slugs which share the most trigrams with the name
+
+    If the best candidate scores below ``100 - tolerance``, all slugs are scored. The score of the returned match is
+    therefore at most ``tolerance`` points below the best score of all slugs. Among equally scored slugs, the first
+    in the list is returned, except that exact and prefix matches are preferred over other slugs scoring 100.
+    """
+
+    def __init__(
+        self,
+        slugs: List[str],
+        n_candidates: int = 64,
+        tolerance: float = SCORE_TOLERANCE,
+    ):
+        """
+        :param slugs: station slugs to match against
+        :param n_candidates: number of slugs which are scored for a query
+        :param tolerance: maximum score difference to the best of all slugs
+        :type slugs: list[str]
+        :type n_candidates: int
+        :type tolerance: float
+        """
+        self.n_candidates = n_candidates
+        self.tolerance = tolerance
+        self._processed = [default_process(slug) for slug in slugs]
+        self._exact: Dict[str, int] = {}
+        for i, processed in enumerate(self._processed):
+            self._exact.setdefault(processed, i)
+        self._sorted = sorted((p, i) for i, p in enumerate(self._processed))
+        postings: Dict[str, list] = {}
+        for i, processed in enumerate(self._processed):
+            for trigram in _trigrams(processed):
+                postings.setdefault(trigram, []).append(i)
+        self._postings = {t: np.array(p, dtype=np.int32) for t, p in postings.items()}
+
+    def _prefix_match(self, query: str) -> int:
+        """Index of the first slug (in list order) starting with the query, or -1"""
+        start = bisect.bisect_left(self._sorted, (query, -1))
+        best = -1
+        for processed, i in self._sorted[start:]:
+            if not processed.startswith(query):
+                break
+            if best < 0 or i < best:
+                best = i
+        return best
+
+    def _best_of(self, query: str, candidates) -> Tuple[int, float]:
+        """Best scored slug among the candidates (indices in ascending order)"""
+        choice = process.extractOne(
+            query,
+            [self._processed[i] for i in candidates],
+            scorer=fuzz.partial_ratio,
+            processor=None,
+        )
+        if choice is None:
+            return -1, 0.0
+        _, score, position = choice
+        return int(candidates[position]), score
+
+    def match(self, name: str) -> Tuple[int, float]:
+        """Find the slug best matching a station name
+
+        :param name: station name, e.g. 'Heidelberg Hbf'
+        :type name: str
+        :return: index of the best matching slug (-1 if there are no slugs) and its score (0 to 100)
+        :rtype: tuple[int, float]
+        """
+        query = default_process(name)
+        i = self._exact.get(query, -1)
+        if i >= 0:
+            return i, 100.0
+        if query:
+            i = self._prefix_match(query)
+            if i >= 0:
+                return i, 100.0
+
+        best, score = -1, 0.0
+        trigrams = [self._postings[t] for t in _trigrams(query) if t in self._postings]
+        if trigrams:
+            counts = np.bincount(
+                np.concatenate(trigrams), minlength=len(self._processed)
+            )
+            n = min(self.n_candidates, len(counts))
+            candidates = np.sort(np.argpartition(counts, -n)[-n:])
+            best, score = self._best_of(query, candidates)
+        if score < 100 - self.tolerance:
+            best, score = self._best_of(query, range(len(self._processed)))
+        return best, score
+
+    def match_many(self, names: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the best matching slugs for several station names; each distinct name is matched once
+
+        :param names: station names
+        :type names: Iterable[str]
+        :return: indices of the best matching slugs and their scores
+        :rtype: tuple[np.ndarray, np.ndarray]
+        """
+        matches: Dict[str, Tuple[int, float]] = {}
+        results = [
+            (
+                matches[name]
+                if name in matches
+                else matches.setdefault(name, self.match(name))
+            )
+            for name in names
+        ]
+        indices = np.array([i for i, _ in results], dtype=int)
+        scores = np.array([score for _, score in results], dtype=float)
+        return indices, scores
+
+
+@timed("stations.build")
+def build_station_index(
+    csv_path: Union[str, Path] = STATIONS_CSV,
+    index_path: Union[str, Path] = STATIONS_INDEX,
+) -> Path:
+    """Build the station index from the station database
+
+    :param csv_path: path of the station database (semicolon-separated)
+    :param index_path: path of the index file to write
+    :type csv_path: str or Path
+    :type index_path: str or Path
+    :return: path of the index file
+    :rtype: Path
+    """
+    columns: Dict[str, Dict[str, list]] = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            # skip stations with no coordinates
+            if not row["latitude"] or not row["longitude"]:
+                continue
+            country = columns.setdefault(
+                row["country"], {"name": [], "slug": [], "coords": []}
+            )
+            country["name"].append(row["name"])
+            country["slug"].append(row["slug"])
+            country["coords"].append((float(row["latitude"]), float(row["longitude"])))
+
+    arrays = {"countries": np.array(sorted(columns), dtype=str)}
+    for country, values in columns.items():
+        arrays[f"{country}_name"] = np.array(values["name"], dtype=str)
+        arrays[f"{country}_slug"] = np.array(values["slug"], dtype=str)
+        arrays[f"{country}_coords"] = np.array(values["coords"], dtype=float)
+    index_path = Path(index_path)
+    # write to a temporary file of this build first, so that concurrent readers never see an incomplete index and
+    # concurrent builds never write into the same file
+    tmp_file = tempfile.NamedTemporaryFile(
+        dir=index_path.parent,
+        prefix=index_path.name + ".",
+        suffix=".tmp",
+        delete=False,
+    )
+    tmp_path = Path(tmp_file.name)
+    try:
+        with tmp_file:
+            np.savez(tmp_file, **arrays)
+        tmp_path.replace(index_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return index_path
+
+
+class StationIndex:
+    """Train stations partitioned by country, read from an index file built by ``build_station_index``"""
+
+    def __init__(self, index_path: Union[str, Path]):
+        """
+        :param index_path: path of the index file
+        :type index_path: str or Path
+        """
+        self._path = index_path
+        self._npz = np.load(index_path)
+        self.countries = frozenset(self._npz["countries"].tolist())
+        self._partitions: Dict[str, StationPartition] = {}
+        self._matchers: Dict[str, StationMatcher] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, country: str) -> bool:
+        return country in self.countries
+
+    def _reopen(self) -> None:
+        # a forked process must not read through the file handle of its parent, as they share the file offset
+        self._npz = np.load(self._path)
+        self._lock = threading.Lock()
+
+    def partition(self, country: str) -> StationPartition:
+        """Return the stations of a country
+
+        :param country: two-letter country code, e.g. 'DE'
+        :type country: str
+        :return: names, slugs and coordinates of the stations; empty if there are no stations in the country
+        :rtype: StationPartition
+        """
+        try:
+            return self._partitions[country]
+        except KeyError:
+            pass
+        with self._lock, stage("stations.partition"):
+            if country not in self._partitions:
+                if country in self.countries:
+                    partition = StationPartition(
+                        names=[
+                            sys.intern(n) for n in self._npz[f"{country}_name"].tolist()
+                        ],
+                        slugs=[
+                            sys.intern(s) for s in self._npz[f"{country}_slug"].tolist()
+                        ],
+                        coords=self._npz[f"{country}_coords"],
+                    )
+                else:
+                    partition = StationPartition([], [], np.empty((0, 2)))
+                self._partitions[country] = partition
+        return self._partitions[country]
+
+    def matcher(self, country: str) -> StationMatcher:
+        """Return the matcher for the station slugs of a country, built on first use
+
+        :param country: two-letter country code, e.g. 'DE'
+        :type country: str
+        :rtype: StationMatcher
+        """
+        try:
+            return self._matchers[country]
+        except KeyError:
+            pass
+        slugs = self.partition(country).slugs
+        with self._lock, stage("stations.matcher"):
+            if country not in self._matchers:
+                self._matchers[country] = StationMatcher(slugs)
+        return self._matchers[country]
+
+
+@functools.lru_cache(maxsize=None)
+def load_station_index() -> StationIndex:
+    """Return the station index, (re)building it first if it is missing or older than the station database
+
+    :return: station index
+    :rtype: StationIndex
+    """
+    index_path = STATIONS_INDEX
+    if STATIONS_CSV.exists() and (
+        not index_path.exists()
+        or index_path.stat().st_mtime < STATIONS_CSV.stat().st_mtime
+    ):
+        try:
+            build_station_index(STATIONS_CSV, index_path)
+        except OSError:
+            # e.g. read-only installation; build the index elsewhere and use it for this process only
+            warnings.warn(f"Station index could not be written to {index_path}")
+            index_path = build_station_index(
+                STATIONS_CSV, Path(tempfile.mkdtemp()) / STATIONS_INDEX.name
+            )
+    with stage("stations.load"):
+        return StationIndex(index_path)
+
+
+def _reopen_station_index() -> None:
+    if load_station_index.cache_info().currsize:
+        load_station_index()._reopen()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reopen_station_index)
+
+
+def match_stations(
+    names: Iterable[str], country: str
+) -> List[Tuple[str, str, List[float], float]]:
+    """Match several station names to the train stations of one country
+
+    :param names: station names, e.g. ['Heidelberg Hbf', 'Berlin Hbf']
+    :param country: two-letter country code, e.g. 'DE'
+    :type names: Iterable[str]
+    :type country: str
+    :return: name, country and coordinates [long, lat] of the best matching station and the match score (0 to 100)
+             for each name
+    :rtype: list[tuple[str, str, list[float], float]]
+    """
+    stations = load_station_index()
+    if country not in stations:
+        raise ValueError(f"No train stations available for country '{country}'")
+    partition = stations.partition(country)
+    indices, scores = stations.matcher(country).match_many(names)
+    return [
+        (
+            partition.names[i],
+            country,
+            [float(partition.coords[i, 1]), float(partition.coords[i, 0])],
+            float(score),
+        )
+        for i, score in zip(indices, scores)
+    ]
+
+
+if __name__ == "__main__":
+    print(f"Station index written to {build_station_index()}")
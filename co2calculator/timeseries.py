@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Electricity emissions of consumption time series, e.g. the 15-minute or hourly readings of smart meters
+
+The emission factor is either static (the factor of an energy mix in the emission factor table, or a given value) or
+varies over time (``FactorSeries``, e.g. the hourly carbon intensity of the grid). Long series can be passed as an
+iterator of chunks, which are processed one at a time, so that memory use is bounded by the size of a chunk:
+
+.. code-block:: python
+
+    reader = pd.read_csv("meter.csv", parse_dates=["time"], chunksize=100_000)
+    chunks = ((chunk["time"].to_numpy(), chunk["kwh"].to_numpy()) for chunk in reader)
+    months, consumption, emissions = electricity_emissions_by_period(chunks, "M", factors=intensity)
+"""
+
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from .constants import KWH_TO_TJ
+from .diagnostics import report
+from .factors import emission_factors
+
+
+class FactorSeries:
+    """Emission factors of electricity varying over time, in kg co2e per kWh
+
+    Each factor applies from its start time until the start time of the next factor; the last factor applies to all
+    later times.
+
+    :param start: start times of the factors, strictly increasing
+    :param factors: emission factors in kg co2e per kWh
+    :type start: array-like of datetime64
+    :type factors: array-like of float
+    """
+
+    def __init__(self, start, factors):
+        start = np.asarray(start, dtype="datetime64[ns]")
+        factors = np.asarray(factors, dtype=float)
+        if start.ndim != 1 or start.shape != factors.shape or not len(start):
+            raise ValueError(
+                "Start times and factors must be non-empty arrays of the same length"
+            )
+        if (start[1:] <= start[:-1]).any():
+            raise ValueError("Start times of the factors must be strictly increasing")
+        self.start = start
+        self.factors = factors
+
+    def __len__(self) -> int:
+        return len(self.factors)
+
+    def at(self, times) -> np.ndarray:
+        """Look up the factors applying at the given times
+
+        :param times: times, e.g. of meter readings
+        :type times: array-like of datetime64
+        :return: emission factor in kg co2e per kWh for each time
+        :rtype: np.ndarray
+        :raises ValueError: if a time is before the start time of the first factor
+        """
+        times = np.asarray(times, dtype="datetime64[ns]")
+        positions = np.searchsorted(self.start, times, side="right") - 1
+        if positions.size and positions.min() < 0:
+            raise ValueError(f"No emission factor available before {self.start[0]}")
+        return self.factors[positions]
+
+
+def electricity_factor(fuel_type: str = None) -> float:
+    """Static emission factor of electricity of an energy mix, in kg co2e per kWh
+
+    :param fuel_type: energy (mix) used for electricity [german_energy_mix, solar]
+    :type fuel_type: str
+    :rtype: float
+    """
+    if fuel_type is None:
+        fuel_type = "german_energy_mix"
+        report(
+            "electricity.fuel_type.default",
+            "No fuel type or energy mix specified. Using default value: '{default}'",
+            default=fuel_type,
+        )
+    co2e = emission_factors().get(category="electricity", fuel_type=fuel_type)
+    # co2 equivalents for heating and electricity refer to a consumption of 1 TJ
+    return co2e / KWH_TO_TJ
+
+
+def _resolve_factors(
+    fuel_type: Optional[str], factors: Union[FactorSeries, float, None]
+) -> Union[FactorSeries, float]:
+    if factors is None:
+        return electricity_factor(fuel_type)
+    if fuel_type is not None:
+        raise ValueError("Provide either a fuel type or emission factors, not both")
+    return factors if isinstance(factors, FactorSeries) else float(factors)
+
+
+def _emissions(
+    consumption, times, factors: Union[FactorSeries, float], energy_share
+) -> np.ndarray:
+    consumption = np.asarray(consumption, dtype=float)
+    if isinstance(factors, FactorSeries):
+        if times is None:
+            raise ValueError("Times of the readings are required for a factor series")
+        factors = factors.at(times)
+    return consumption * np.asarray(energy_share, dtype=float) * factors
+
+
+def _split(chunk) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """Times (or None) and consumption of a chunk given as (times, consumption) or as consumption only"""
+    if isinstance(chunk, tuple):
+        times, consumption = chunk
+        return times, consumption
+    return None, chunk
+
+
+def calc_co2_electricity_series(
+    consumption,
+    times=None,
+    fuel_type: str = None,
+    factors: Union[FactorSeries, float] = None,
+    energy_share=1.0,
+) -> np.ndarray:
+    """Function to compute the electricity emissions of each interval of a consumption time series
+
+    :param consumption: energy consumption in kWh per interval
+    :param times: times of the readings (e.g., start of each interval); required for a factor series
+    :param fuel_type: energy (mix) used for electricity [german_energy_mix, solar]; default: german_energy_mix
+                      (unless factors are given)
+    :param factors: emission factors in kg co2e per kWh instead of the factor of the fuel type: one for all
+                    intervals, or varying over time
+    :param energy_share: the research group's approximate share of the electricity energy consumption, per interval
+                         or one for all intervals
+    :type consumption: array-like
+    :type times: array-like of datetime64
+    :type fuel_type: str
+    :type factors: FactorSeries or float
+    :type energy_share: array-like or float
+    :return: emissions of electricity energy consumption per interval
+    :rtype: np.ndarray
+    """
+    return _emissions(
+        consumption, times, _resolve_factors(fuel_type, factors), energy_share
+    )
+
+
+def iter_electricity_emissions(
+    chunks: Iterable,
+    fuel_type: str = None,
+    factors: Union[FactorSeries, float] = None,
+    energy_share: float = 1.0,
+) -> Iterator[np.ndarray]:
+    """Function to compute the electricity emissions of each interval of a consumption time series given in chunks
+
+    :param chunks: chunks of the time series, each given as (times, consumption) or, for static factors, as
+                   consumption only (see ``calc_co2_electricity_series``)
+    :param fuel_type: as for ``calc_co2_electricity_series``
+    :param factors: as for ``calc_co2_electricity_series``
+    :param energy_share: the research group's approximate share of the electricity energy consumption
+    :type chunks: iterable
+    :type fuel_type: str
+    :type factors: FactorSeries or float
+    :type energy_share: float
+    :return: emissions per interval of each chunk
+    :rtype: iterator of np.ndarray
+    """
+    factors = _resolve_factors(fuel_type, factors)
+    for chunk in chunks:
+        times, consumption = _split(chunk)
+        yield _emissions(consumption, times, factors, energy_share)
+
+
+def total_electricity_emissions(
+    chunks: Iterable,
+    fuel_type: str = None,
+    factors: Union[FactorSeries, float] = None,
+    energy_share: float = 1.0,
+) -> Tuple[float, float]:
+    """Function to compute the total electricity emissions of a consumption time series given in chunks
+
+    :param chunks: as for ``iter_electricity_emissions``; a single array or (times, consumption) tuple is a series
+                   of one chunk
+    :param fuel_type: as for ``calc_co2_electricity_series``
+    :param factors: as for ``calc_co2_electricity_series``
+    :param energy_share: the research group's approximate share of the electricity energy consumption
+    :type chunks: iterable
+    :type fuel_type: str
+    :type factors: FactorSeries or float
+    :type energy_share: float
+    :return: total consumption in kWh, total emissions
+    :rtype: tuple[float, float]
+    """
+    if isinstance(chunks, (tuple, np.ndarray)):
+        chunks = [chunks]
+    factors = _resolve_factors(fuel_type, factors)
+    total_consumption = 0.0
+    total_emissions = 0.0
+    for chunk in chunks:
+        times, consumption = _split(chunk)
+        consumption = np.asarray(consumption, dtype=float)
+        total_consumption += float(consumption.sum())
+        total_emissions += float(
+            _emissions(consumption, times, factors, energy_share).sum()
+        )
+    return total_consumption, total_emissions
+
+
+def electricity_emissions_by_period(
+    chunks: Iterable,
+    period: str = "M",
+    fuel_type: str = None,
+    factors: Union[FactorSeries, float] = None,
+    energy_share: float = 1.0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Function to compute the electricity emissions of a consumption time series given in chunks, per period
+
+    :param chunks: as for ``iter_electricity_emissions``, each given as (times, consumption); a single
+                   (times, consumption) tuple is a series of one chunk
+    :param period: length of the periods as NumPy datetime unit, e.g. "h" (hours), "D" (days), "M" (months) or
+                   "Y" (years)
+    :param fuel_type: as for ``calc_co2_electricity_series``
+    :param factors: as for ``calc_co2_electricity_series``
+    :param energy_share: the research group's approximate share of the electricity energy consumption
+    :type chunks: iterable
+    :type period: str
+    :type fuel_type: str
+    :type factors: FactorSeries or float
+    :type energy_share: float
+    :return: start of the periods with readings (sorted), consumption in kWh per period, emissions per period
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray]
+    """
+    if isinstance(chunks, tuple):
+        chunks = [chunks]
+    factors = _resolve_factors(fuel_type, factors)
+    # sums of consumption and emissions per period; the number of periods is small compared to the number of readings
+    periods = np.empty(0, dtype=f"datetime64[{period}]")
+    sums = np.empty((2, 0))
+    for chunk in chunks:
+        times, consumption = _split(chunk)
+        if times is None:
+            raise ValueError("Times of the readings are required for sums per period")
+        consumption = np.asarray(consumption, dtype=float)
+        emissions = _emissions(consumption, times, factors, energy_share)
+        chunk_periods = np.asarray(times, dtype="datetime64[ns]").astype(periods.dtype)
+        # positions of the periods of the previous chunks and of the readings of this chunk among all periods
+        periods, positions = np.unique(
+            np.concatenate([periods, chunk_periods]), return_inverse=True
+        )
+        previous_sums = sums
+        sums = np.zeros((2, len(periods)))
+        sums[:, positions[: previous_sums.shape[1]]] = previous_sums
+        positions = positions[previous_sums.shape[1] :]
+        sums[0] += np.bincount(positions, consumption, len(periods))
+        sums[1] += np.bincount(positions, emissions, len(periods))
+    return periods, sums[0], sums[1]
@@ -5,226 +5,244 @@
 Parse xmls downloaded from Probas database (https://www.probas.umweltbundesamt.de/php/index.php) to a table with
 custom fields.
 
+Each xml is parsed to one record. The records are kept in a manifest together with the hashes of their xmls, so that
+re-running the script only parses new or changed xmls (in parallel), e.g. after adding a few Probas exports:
+
+    python parse_xmls.py [--workers N] [--force]
+
+With --check, the script only checks that data/emission_factors.csv equals the generated table.
+
 Hannah Weiser
 h.weiser@stud.uni-heidelberg
 Jan 2021
 """
 
-import pandas as pd
-import xml.etree.ElementTree as et
-import glob
+import argparse
+import hashlib
+import json
 import os
+import xml.etree.ElementTree as et
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
+import pandas as pd
 
-def read_xmls_mobility(idx, filepath, co2e_df):
+DATA_DIR = Path(__file__).parent
+COLUMNS = [
+    "category",
+    "subcategory",
+    "source",
+    "model",
+    "name",
+    "unit",
+    "size_class",
+    "occupancy",
+    "capacity",
+    "range",
+    "fuel_type",
+    "co2e_unit",
+    "co2e",
+]
+# increment when the records parsed from an xml change, to invalidate the manifest
+PARSER_VERSION = 2
+
+
+def iter_nodes(filepath):
     """
-    Function to write emission factors from Probas xml files for different modes of transport to an emission factor
-    dataframe
+    Iterate over the child nodes of the root of an xml file, without loading the whole tree: each node is complete
+    when yielded and discarded afterwards
 
-    :param idx: unique sequential number
     :param filepath: path to XML file
-    :param co2e_df: existing dataframe, to which the emission factors that are read from the XMLs are appended
 
-    :return: appended dataframe
+    :return: iterator of elements
+    """
+    root = None
+    depth = 0
+    for event, element in et.iterparse(filepath, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1:
+                yield element
+                root.clear()
+
+
+def read_xmls_mobility(filepath):
     """
-    xtree = et.parse(filepath)
-    filepath = os.path.normpath(filepath)
-    folder = filepath.split(os.sep)[-2]
-    xroot = xtree.getroot()
+    Function to read the emission factor from a Probas xml file for a mode of transport
+
+    :param filepath: path to XML file
+
+    :return: record of the emission factor
+    """
+    folder = os.path.normpath(filepath).split(os.sep)[-2]
+    record = {}
     unit = None
+    unit_co2e = None
     if folder == "car":
-        co2e_df.loc[idx, "category"] = "vehicle"
+        record["category"] = "vehicle"
     elif folder == "bus" or folder == "train":
-        co2e_df.loc[idx, "category"] = "public_transport"
-    co2e_df.loc[idx, "subcategory"] = folder
-    for node in xroot:
+        record["category"] = "public_transport"
+    record["subcategory"] = folder
+    for node in iter_nodes(filepath):
         if node.tag == "name":
-            co2e_df.loc[idx, "name"] = node.text
+            record["name"] = node.text
             # if not name "PKW" then size class has to be retrieved from name instead of entry
             # "Größenklasse / max. Beladung"
             if "klein" in node.text or "mini" in node.text:
-                co2e_df.loc[idx, "size_class"] = "small"
+                record["size_class"] = "small"
             elif "mittel" in node.text:
-                co2e_df.loc[idx, "size_class"] = "medium"
+                record["size_class"] = "medium"
             elif "gross" in node.text:
-                co2e_df.loc[idx, "size_class"] = "large"
+                record["size_class"] = "large"
             # for bus and train, get the "range" (i.e., long-distance vs. local) from name
             elif "Reise" in node.text or "fern" in node.text or "Fern" in node.text:
-                co2e_df.loc[idx, "range"] = "long-distance"
+                record["range"] = "long-distance"
             elif "nah" in node.text or "Nah" in node.text:
-                co2e_df.loc[idx, "range"] = "local"
+                record["range"] = "local"
         elif node.tag == "meta":
             for child in node:
                 if child.tag == "source":
-                    co2e_df.loc[idx, "source"] = child[0].text
+                    record["source"] = child[0].text
                 elif child.tag == "specificum":
-                    co2e_df.loc[idx, "model"] = child[0].text
+                    record["model"] = child[0].text
         elif node.tag == "technical_data":
             for child in node:
                 if child[0].text == "Größenklasse / max. Beladung":
-                    co2e_df.loc[idx, "size_class"] = child[1].text
+                    record["size_class"] = child[1].text
                 elif child[0].text == "Kraftstoff/Antrieb":
-                    co2e_df.loc[idx, "fuel_type"] = child[1].text
+                    record["fuel_type"] = child[1].text
                 elif child[0].text == "Auslastungsgrad":
-                    co2e_df.loc[idx, "occupancy"] = child[1].text
+                    record["occupancy"] = child[1].text
                 elif child[0].text == "Besetzungsgrad":
-                    co2e_df.loc[idx, "occupancy"] = child[1].text
+                    record["occupancy"] = child[1].text
                 elif child[0].text == "Kapazität":
-                    co2e_df.loc[idx, "capacity"] = child[1].text.replace(",", ".")
-                # elif child[0].text == "Schadstoffklasse":
-                #     co2e_df.loc[id, "Schadstoffklasse"] = child[1].text
-                elif child[0].text == "Straßenkategorie" and child[1].text == "innerorts":
-                      co2e_df.loc[idx, "range"] = "local"
+                    record["capacity"] = child[1].text.replace(",", ".")
+                elif (
+                    child[0].text == "Straßenkategorie"
+                    and child[1].text.lower() == "innerorts"
+                ):
+                    record["range"] = "local"
         elif node.tag == "outputs":
             for child in node:
                 if child[3].tag == "unit":
                     unit = child[3].text
-        elif node.tag == "emissions_air":
-            for child in node:
-                if child[0].text == "CO2":
-                    if not unit:
-                        unit = "P.km"
-                    if child[3].tag == "sum":
-                        co2e_df.loc[idx, "co2e"] = child[3].text.replace(",", ".")
-                    if child[3].tag == "unit":
-                        unit_co2e = child[3].text + "/" + unit
-                    elif child[4].tag == "unit":
-                        unit_co2e = child[4].text + "/" + unit
-        elif node.tag == "emissions_air_aggregated":
+        elif node.tag in ("emissions_air", "emissions_air_aggregated"):
+            substance = "CO2" if node.tag == "emissions_air" else "CO2-Äquivalent"
             for child in node:
-                if child[0].text == "CO2-Äquivalent":
+                if child[0].text == substance:
                     if not unit:
                         unit = "P.km"
                     if child[3].tag == "sum":
-                        co2e_df.loc[idx, "co2e"] = child[3].text.replace(",", ".")
+                        record["co2e"] = child[3].text.replace(",", ".")
                     if child[3].tag == "unit":
                         unit_co2e = child[3].text + "/" + unit
                     elif child[4].tag == "unit":
                         unit_co2e = child[4].text + "/" + unit
-    co2e_df.loc[idx, "unit"] = unit
-    co2e_df.loc[idx, "co2e_unit"] = unit_co2e
+    record["unit"] = unit
+    record["co2e_unit"] = unit_co2e
 
-    return co2e_df
+    return record
 
 
-def read_xmls_electricity(idx, filepath, co2e_df):
+def read_xmls_electricity(filepath):
     """
-    Function to write emission factors from Probas xml files for electricity sources to an emission factor
-    dataframe
+    Function to read the emission factor from a Probas xml file for an electricity source
 
-    :param idx: unique sequential number
     :param filepath: path to XML file
-    :param co2e_df: existing dataframe, to which the emission factors that are read from the XMLs are appended
 
-    :return: appended dataframe
+    :return: record of the emission factor
     """
-    xtree = et.parse(filepath)
-    xroot = xtree.getroot()
-    co2e_df.loc[idx, "category"] = "electricity"
-    for node in xroot:
+    record = {"category": "electricity"}
+    for node in iter_nodes(filepath):
         if node.tag == "name":
-            co2e_df.loc[idx, "name"] = node.text
+            record["name"] = node.text
             if "Solar" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "solar"
+                record["fuel_type"] = "solar"
             elif "KW" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "german_energy_mix"
-        elif node.tag == "meta":
-            for child in node:
-                if child.tag == "source":
-                    co2e_df.loc[idx, "source"] = child[0].text
-                elif child.tag == "specificum":
-                    co2e_df.loc[idx, "model"] = child[0].text
-        elif node.tag == "outputs":
-            for child in node:
-                if child[3].tag == "unit":
-                    unit = child[3].text
-        elif node.tag == "emissions_air_aggregated":
-            for child in node:
-                if child[0].text == "CO2-Äquivalent":
-                    if child[2].tag == "sum":
-                        co2e_df.loc[idx, "co2e"] = child[2].text.replace(",", ".")
-                    elif child[3].tag == "sum":
-                        co2e_df.loc[idx, "co2e"] = child[3].text.replace(",", ".")
-                    if child[3].tag == "unit":
-                        unit_co2e = child[3].text + "/" + unit
-                    elif child[4].tag == "unit":
-                        unit_co2e = child[4].text + "/" + unit
-    co2e_df.loc[idx, "unit"] = unit
-    co2e_df.loc[idx, "co2e_unit"] = unit_co2e
-
-    return co2e_df
+                record["fuel_type"] = "german_energy_mix"
+        else:
+            _read_energy_node(node, record)
+    _set_co2e_unit(record)
+
+    return record
+
+
+# fuel type of a heating, by part of the name of its process
+HEATING_FUEL_TYPES = {
+    "Braunkohle": "coal",
+    "Fernwärme": "district_heating",
+    "El-Heizung": "electricity",
+    "Gas-Heizung": "gas",
+    "mono-Luft": "heat_pump_air",
+    "mono-Erdreich": "heat_pump_ground",
+    "mono-Wasser": "heat_pump_water",
+    "Flüssiggas": "liquid_gas",
+    "Öl-Heizung": "oil",
+    "Pellet": "pellet",
+    "SolarKollektor": "solar",
+    "Hackschnitzel": "woodchips",
+}
 
 
-def read_xmls_heating(idx, filepath, co2e_df):
+def read_xmls_heating(filepath):
     """
-    Function to write emission factors from Probas xml files for different heating types to an emission factor
-    dataframe
+    Function to read the emission factor from a Probas xml file for a heating type
 
-    :param idx: unique sequential number
     :param filepath: path to XML file
-    :param co2e_df: existing dataframe, to which the emission factors that are read from the XMLs are appended
 
-    :return: appended dataframe
+    :return: record of the emission factor
     """
-    xtree = et.parse(filepath)
-    xroot = xtree.getroot()
-    co2e_df.loc[idx, "category"] = "heating"
-    for node in xroot:
+    record = {"category": "heating"}
+    for node in iter_nodes(filepath):
         if node.tag == "name":
-            if node.tag == "name":
-                co2e_df.loc[idx, "name"] = node.text
-            if "Braunkohle" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "coal"
-            elif "Fernwärme" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "district_heating"
-            elif "El-Heizung" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "electricity"
-            elif "Gas-Heizung" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "gas"
-            elif "mono-Luft" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "heat_pump_air"
-            elif "mono-Erdreich" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "heat_pump_ground"
-            elif "mono-Wasser" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "heat_pump_water"
-            elif "Flüssiggas" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "liquid_gas"
-            elif "Öl-Heizung" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "oil"
-            elif "Pellet" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "pellet"
-            elif "SolarKollektor" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "solar"
-            elif "Hackschnitzel" in node.text:
-                co2e_df.loc[idx, "fuel_type"] = "woodchips"
-        elif node.tag == "meta":
-            for child in node:
-                if child.tag == "source":
-                    co2e_df.loc[idx, "source"] = child[0].text
-                elif child.tag == "specificum":
-                    co2e_df.loc[idx, "model"] = child[0].text
-        elif node.tag == "outputs":
-            for child in node:
+            record["name"] = node.text
+            for part, fuel_type in HEATING_FUEL_TYPES.items():
+                if part in node.text:
+                    record["fuel_type"] = fuel_type
+                    break
+        else:
+            _read_energy_node(node, record)
+    _set_co2e_unit(record)
+
+    return record
+
+
+def _read_energy_node(node, record):
+    """Read the source, output unit and emission factor of an electricity source or heating type"""
+    if node.tag == "meta":
+        for child in node:
+            if child.tag == "source":
+                record["source"] = child[0].text
+            elif child.tag == "specificum":
+                record["model"] = child[0].text
+    elif node.tag == "outputs":
+        for child in node:
+            if child[3].tag == "unit":
+                record["unit"] = child[3].text
+    elif node.tag == "emissions_air_aggregated":
+        for child in node:
+            if child[0].text == "CO2-Äquivalent":
+                if child[2].tag == "sum":
+                    record["co2e"] = child[2].text.replace(",", ".")
+                elif child[3].tag == "sum":
+                    record["co2e"] = child[3].text.replace(",", ".")
                 if child[3].tag == "unit":
-                    unit = child[3].text
-        elif node.tag == "emissions_air_aggregated":
-            for child in node:
-                if child[0].text == "CO2-Äquivalent":
-                    if child[2].tag == "sum":
-                        co2e_df.loc[idx, "co2e"] = child[2].text.replace(",", ".")
-                    elif child[3].tag == "sum":
-                        co2e_df.loc[idx, "co2e"] = child[3].text.replace(",", ".")
-                    if child[3].tag == "unit":
-                        unit_co2e = child[3].text + "/" + unit
-                    elif child[4].tag == "unit":
-                        unit_co2e = child[4].text + "/" + unit
-    co2e_df.loc[idx, "unit"] = unit
-    co2e_df.loc[idx, "co2e_unit"] = unit_co2e
+                    record["co2e_unit"] = child[3].text
+                elif child[4].tag == "unit":
+                    record["co2e_unit"] = child[4].text
+
 
-    return co2e_df
+def _set_co2e_unit(record):
+    """Complete the unit of the emission factor with the output unit, e.g. 'kg' to 'kg/kWh'"""
+    if record.get("co2e_unit") is not None:
+        record["co2e_unit"] += "/" + record["unit"]
 
 
-#def read_xmls_planes(idx, filepath, co2e_df):
+# def read_xmls_planes(idx, filepath, co2e_df):
 #    """
 #    Function to write emission factors from Probas xml files for planes to an emission factor dataframe
 #
@@ -280,47 +298,132 @@ def read_xmls_heating(idx, filepath, co2e_df):
 #    return co2e_df
 
 
-def append_from_csv(filepath, df):
+# function reading an xml, by folder of the xml
+READERS = {
+    "car": read_xmls_mobility,
+    "bus": read_xmls_mobility,
+    "train": read_xmls_mobility,
+    # "plane": read_xmls_planes,
+    "electricity": read_xmls_electricity,
+    "heating": read_xmls_heating,
+}
+
+
+def read_xml(filepath):
     """
-    Function to read a csv to dataframe and append to existing dataframe
+    Function to read the emission factor from a Probas xml file, depending on its folder
 
-    :param filepath: path of .csv-file
-    :param df: exiting dataframe
+    :param filepath: path to XML file
 
-    :return: appended dataframe
+    :return: record of the emission factor
     """
-    new_df = pd.read_csv(filepath, sep=";")
-    df = df.append(new_df, ignore_index=True)
+    folder = os.path.normpath(filepath).split(os.sep)[-2]
+    return READERS[folder](filepath)
 
-    return df
 
+def file_hash(filepath):
+    """
+    Function to compute the SHA-256 of a file
 
-def rename_reformat_df(df, dictionary):
-    df.replace(dictionary, inplace=True)
+    :param filepath: path of the file
 
-    return df
+    :return: hex digest
+    """
+    with open(filepath, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_manifest(filepath):
+    """
+    Function to load the records of the xmls parsed before, with the hashes of the xmls
+
+    :param filepath: path of the manifest (.json-file)
+
+    :return: dictionary of path of xml: {"sha256": hash, "record": record}; empty if there is no manifest or it was
+             written by another version of the parser
+    """
+    try:
+        with open(filepath, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("parser_version") != PARSER_VERSION:
+        return {}
+    return manifest["files"]
+
+
+def save_manifest(filepath, files):
+    """
+    Function to save the records of the parsed xmls, with the hashes of the xmls
 
+    :param filepath: path of the manifest (.json-file)
+    :param files: dictionary of path of xml: {"sha256": hash, "record": record}
+    """
+    with open(filepath, "w", encoding="utf-8") as f:
+        json.dump(
+            {"parser_version": PARSER_VERSION, "files": files},
+            f,
+            ensure_ascii=False,
+            indent=1,
+            sort_keys=True,
+        )
 
-infiles = glob.glob("probas_xmls/*/*.xml")
 
-df = pd.DataFrame([], columns=["category", "subcategory", "source", "model", "name", "unit", "size_class",
-                               "occupancy", "capacity", "range", "fuel_type", "co2e_unit", "co2e"])
-# read xmls
-for i, f in enumerate(infiles):
-    f = os.path.normpath(f)
-    folder = f.split(os.sep)[-2]
-    if folder == "car" or folder == "train" or folder == "bus":
-        df = read_xmls_mobility(i, f, df)
-    #elif folder == "plane":
-    #    df = read_xmls_planes(i, f, df)
-    elif folder == "electricity":
-        df = read_xmls_electricity(i, f, df)
-    elif folder == "heating":
-        df = read_xmls_heating(i, f, df)
+def read_xmls(infiles, manifest, workers=None):
+    """
+    Function to read the emission factors from Probas xml files, parsing only the xmls not in the manifest or changed
+    since
+
+    :param infiles: paths of the XML files
+    :param manifest: records of the xmls parsed before, as returned by load_manifest
+    :param workers: number of processes parsing the xmls (default: number of CPUs)
+
+    :return: updated manifest, with the entries of the given xmls only; number of parsed xmls
+    """
+    files = {}
+    to_parse = []
+    for path in infiles:
+        key = Path(path).as_posix()
+        digest = file_hash(path)
+        entry = manifest.get(key)
+        if entry is not None and entry["sha256"] == digest:
+            files[key] = entry
+        else:
+            files[key] = {"sha256": digest}
+            to_parse.append(key)
+
+    if workers == 1 or len(to_parse) <= 1:
+        records = map(read_xml, to_parse)
+        for key, record in zip(to_parse, records):
+            files[key]["record"] = record
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            records = executor.map(read_xml, to_parse, chunksize=8)
+            for key, record in zip(to_parse, records):
+                files[key]["record"] = record
+
+    return files, len(to_parse)
+
+
+# manual corrections of the records of xmls, which lack the information or name the process differently
+CORRECTIONS = {
+    "probas_xmls/bus/Bus-Linie-BZ-DE-2020-Basis.xml": {
+        "size_class": "average",
+        "range": "local",
+    },
+    "probas_xmls/bus/Bus-Linie-CNG-DE-2020-Basis.xml": {
+        "size_class": "average",
+        "range": "local",
+    },
+    "probas_xmls/train/Strassen-Stadt-U-Bahn.xml": {"name": "Strassen-Stadt-U-Bahn"},
+}
+
+
+def rename_reformat_df(df, dictionary):
+    df.replace(dictionary, inplace=True)
+
+    return df
 
-other_files = glob.glob("other_sources/*.csv")
-for file in other_files:
-    df = append_from_csv(file, df)
 
 rename_dict = {
     "Durchschnittswert": "average",
@@ -340,9 +443,86 @@ rename_dict = {
     "km": "P.km",
     "kg/km": "kg/P.km",
     "H2 (energetisch)": "hydrogen",
-    "electricity-CZ-transport": "electric"
+    "electricity-CZ-transport": "electric",
 }
-df = rename_reformat_df(df, rename_dict)
 
-outfile = "emission_factors.csv"
-df.to_csv(outfile)
+
+def emission_factor_table(files):
+    """
+    Function to build the table of emission factors from the records of the xmls and the csv files of other sources
+
+    :param files: dictionary of path of xml (relative to the data directory): {"record": record}, as returned by
+                  read_xmls
+
+    :return: dataframe of emission factors
+    """
+    records = [
+        {**entry["record"], **CORRECTIONS.get(key, {})} for key, entry in files.items()
+    ]
+    df = pd.DataFrame(records, columns=COLUMNS)
+    other_files = sorted((DATA_DIR / "other_sources").glob("*.csv"), key=_listing_order)
+    df = pd.concat(
+        [df] + [pd.read_csv(file, sep=";") for file in other_files],
+        ignore_index=True,
+    )
+    return rename_reformat_df(df, rename_dict)
+
+
+def _listing_order(path):
+    # the rows of data/emission_factors.csv are in case-insensitive order of the paths of their files
+    return Path(path).as_posix().casefold()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of processes parsing the xmls (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="parse all xmls, ignoring the manifest"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="only check that the outfile equals the generated table, instead of writing it and the manifest",
+    )
+    parser.add_argument("--outfile", default=DATA_DIR / "emission_factors.csv")
+    parser.add_argument(
+        "--manifest", default=DATA_DIR / "probas_xmls" / "manifest.json"
+    )
+    args = parser.parse_args()
+    outfile = Path(args.outfile).resolve()
+    manifest_path = Path(args.manifest).resolve()
+
+    # paths relative to the data directory, so that the manifest does not depend on the working directory
+    os.chdir(DATA_DIR)
+    infiles = sorted(
+        (
+            path
+            for path in Path("probas_xmls").glob("*/*.xml")
+            if path.parent.name in READERS
+        ),
+        key=_listing_order,
+    )
+    manifest = {} if args.force else load_manifest(manifest_path)
+    files, n_parsed = read_xmls(infiles, manifest, workers=args.workers)
+    if not args.check:
+        save_manifest(manifest_path, files)
+    print(f"Parsed {n_parsed} of {len(files)} xmls")
+
+    table = emission_factor_table(files).to_csv()
+    if args.check:
+        if outfile.read_text(encoding="utf-8") != table:
+            raise SystemExit(
+                f"{outfile} differs from the table generated from the xmls"
+            )
+        print(f"{outfile} is up to date")
+    else:
+        outfile.write_text(table, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
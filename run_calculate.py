@@ -2,121 +2,432 @@
 # -*- coding: utf-8 -*-
 
 """
-description
-"""
+Compute the emissions of the business trips, electricity and heating consumption in questionnaire exports
+
+The input files (business_trips_<mode>.csv, electricity.csv, heating.csv, separated by semicolons) are read in
+chunks of a fixed number of rows. Each chunk is computed with the batch functions of co2calculator and appended to
+the output file <name>_calc.csv, so that memory use does not depend on the size of the input.
+
+With --workers N, chunks are computed by N worker processes. Each worker loads the factor tables once; chunks are
+sent to the workers as csv text and written in the order of the input, so that the output is identical to that of
+a single process.
+
+Rows which cannot be computed (e.g. an unknown fuel type) get no emissions and the reason in the column error of the
+output, and the other rows are computed as usual. With --strict, such a row aborts the computation of its file
+instead, and the output has no column error.
 
+Business trips given by start and destination share many locations and routes; each distinct one is requested only
+once per chunk. The number of requests this avoided is printed after each file.
 
+Usage: python run_calculate.py [--input-dir DIR] [--output-dir DIR] [--chunksize N] [--workers N] [--strict]
+"""
+
+import argparse
+import io
 import os
-import pandas as pd
+import sys
+from collections import Counter, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Deque, Iterable, Iterator, Optional, Tuple
+
 import numpy as np
-import glob
-from co2calculator import calc_co2_businesstrip, calc_co2_heating, calc_co2_electricity
+import pandas as pd
+
+from co2calculator import (
+    calc_co2_businesstrip_batch,
+    calc_co2_electricity_batch,
+    calc_co2_heating_batch,
+    warmup,
+)
+from co2calculator import instrumentation
+from co2calculator.diagnostics import collect_diagnostics
+from co2calculator.distances import get_rate_limit, set_rate_limit
 
 script_path = os.path.dirname(os.path.realpath(__file__))
 
+# columns of the input files: explicit dtypes, and the parameters of the calculation functions they map to
+BUSINESS_TRIP_DTYPES = {
+    "car": {
+        "distance_km": float,
+        "car_size": str,
+        "car_fuel": str,
+        "passengers": "Int64",
+    },
+    "bus": {
+        "distance_km": float,
+        "bus_size": str,
+        "bus_fuel": str,
+        "occupancy": "Int64",
+    },
+    "train": {"distance_km": float, "train_fuel": str},
+    "plane": {"IATA_start": str, "IATA_destination": str, "flight_class": str},
+    "ferry": {"start": str, "destination": str, "seating_class": str},
+}
+BUSINESS_TRIP_COLUMNS = {
+    "distance_km": "distance",
+    "car_size": "size",
+    "bus_size": "size",
+    "car_fuel": "fuel_type",
+    "bus_fuel": "fuel_type",
+    "train_fuel": "fuel_type",
+    "IATA_start": "start",
+    "IATA_destination": "destination",
+    "flight_class": "seating",
+    "seating_class": "seating",
+}
+COMMON_DTYPES = {"stops": str, "roundtrip": "boolean"}
+ELECTRICITY_DTYPES = {"consumption_kwh": float, "fuel_type": str}
+HEATING_DTYPES = {"consumption": float, "energy_unit": str, "fuel_type": str}
 
-if __name__ == "__main__":
 
-    # test with dummy data
-    business_trip_data = glob.glob(f"{script_path}/data/test_data_users/business_trips*.csv")
-
-    print("Computing business trip emissions...")
-    for f in business_trip_data:
-        user_data = pd.read_csv(f, sep=";")
-        for i in range(user_data.shape[0]):
-            if "_car" in f:
-                distance = user_data["distance_km"].values[i]
-                size_class = user_data["car_size"].values[i]
-                fuel_type = user_data["car_fuel"].values[i]
-                passengers = user_data["passengers"].values[i]
-                if np.isnan(distance):
-                    distance = None
-                    start = str(user_data["stops"].values[i]).split("-")[0]
-                    dest = str(user_data["stops"].values[i]).split("-")[1]
-                else:
-                    start = None
-                    dest = None
-                roundtrip = bool(user_data["roundtrip"].values[i])
-                total_co2e = calc_co2_businesstrip("car", passengers=passengers, size=size_class,
-                                                   fuel_type=fuel_type, distance=distance, start=start,
-                                                   destination=dest, roundtrip=roundtrip)
-                user_data.loc[i, "co2e_kg"] = total_co2e
-            elif "_bus" in f:
-                distance = user_data["distance_km"].values[i]
-                size_class = user_data["bus_size"].values[i]
-                fuel_type = user_data["bus_fuel"].values[i]
-                occupancy = user_data["occupancy"].values[i]
-                roundtrip = bool(user_data["roundtrip"].values[i])
-                if np.isnan(distance):
-                    distance = None
-                    start = str(user_data["stops"].values[i]).split("-")[0]
-                    dest = str(user_data["stops"].values[i]).split("-")[1]
-                else:
-                    start = None
-                    dest = None
-                total_co2e = calc_co2_businesstrip("bus", size=size_class, fuel_type=fuel_type, occupancy=occupancy,
-                                                   distance=distance, start=start,
-                                                   destination=dest, roundtrip=roundtrip)
-                user_data.loc[i, "co2e_kg"] = total_co2e
-            elif "_train" in f:
-                distance = user_data["distance_km"].values[i]
-                fuel_type = user_data["train_fuel"].values[i]
-                roundtrip = bool(user_data["roundtrip"].values[i])
-                if np.isnan(distance):
-                    distance = None
-                    start = str(user_data["stops"].values[i]).split("-")[0]
-                    dest = str(user_data["stops"].values[i]).split("-")[1]
-                else:
-                    start = None
-                    dest = None
-                total_co2e = calc_co2_businesstrip("train", fuel_type=fuel_type, distance=distance, start=start,
-                                                   destination=dest, roundtrip=roundtrip)
-                user_data.loc[i, "co2e_kg"] = total_co2e
-            elif "_plane" in f:
-                iata_start = user_data["IATA_start"].values[i]
-                iata_dest = user_data["IATA_destination"].values[i]
-                flight_class = user_data["flight_class"].values[i]
-                roundtrip = bool(user_data["roundtrip"].values[i])
-                total_co2e = calc_co2_businesstrip("plane", start=iata_start, destination=iata_dest,
-                                                   roundtrip=roundtrip, seating=flight_class)
-                user_data.loc[i, "co2e_kg"] = total_co2e
-            elif "_ferry" in f:
-                start = user_data["start"].values[i]
-                dest = user_data["destination"].values[i]
-                seating = user_data["seating_class"].values[i]
-                roundtrip = bool(user_data["roundtrip"].values[i])
-                total_co2e = calc_co2_businesstrip("ferry", start=start, destination=dest,
-                                                   roundtrip=roundtrip, seating=seating)
-                user_data.loc[i, "co2e_kg"] = total_co2e
-
-            print("Writing file: %s" % f.replace(".csv", "_calc.csv"))
-            # user_data.to_csv(f.replace(".csv", "_calc.csv"), sep=";", index=False)
-
-    electricity_data = glob.glob(f"{script_path}/data/test_data_users/electricity.csv")
-
-    print("Computing electricity emissions...")
-    for f in electricity_data:
-        user_data = pd.read_csv(f, sep=";")
-        for i in range(user_data.shape[0]):
-            consumption = user_data["consumption_kwh"].values[i]
-            fuel_type = user_data["fuel_type"].values[i]
-            total_co2e = calc_co2_electricity(consumption, fuel_type)
-            user_data.loc[i, "co2e_kg"] = total_co2e
-
-            print("Writing file: %s" % f.replace(".csv", "_calc.csv"))
-            # user_data.to_csv(f.replace(".csv", "_calc.csv"), sep=";")
-
-    heating_data = glob.glob(f"{script_path}/data/test_data_users/heating.csv")
-
-    print("Computing heating emissions...")
-    for f in heating_data:
-        user_data = pd.read_csv(f, sep=";")
-        for i in range(user_data.shape[0]):
-            consumption = user_data["consumption"].values[i]
-            unit = user_data["energy_unit"].values[i]
-            fuel_type = user_data["fuel_type"].values[i]
-            total_co2e = calc_co2_heating(consumption, unit, fuel_type)
-            user_data.loc[i, "co2e_kg"] = total_co2e
-
-            print("Writing file: %s" % f.replace(".csv", "_calc.csv"))
-            # user_data.to_csv(f.replace(".csv", "_calc.csv"), sep=";", index=False)
\ No newline at end of file
+def normalize_labels(values: pd.Series) -> pd.Series:
+    """Turn labels as shown in the questionnaire (e.g. 'Economy class') into parameter values ('economy_class')"""
+    return values.str.strip().str.lower().str.replace(" ", "_")
+
+
+def parse_location(text: str) -> dict:
+    """Turn a location given as '<address>, <locality>, <country>' into a dictionary for structured geocoding"""
+    parts = [part.strip() for part in text.split(",")]
+    location = {"country": parts[-1]} if len(parts) > 1 else {}
+    if len(parts) > 1:
+        parts = parts[:-1]
+    location["locality"] = parts[-1]
+    if len(parts) > 1:
+        location["address"] = ", ".join(parts[:-1])
+    return location
+
+
+def business_trips(chunk: pd.DataFrame, transportation_mode: str) -> pd.DataFrame:
+    """Map the columns of a chunk of business trips to the parameters of calc_co2_businesstrip"""
+    trips = chunk.rename(columns=BUSINESS_TRIP_COLUMNS)
+    trips["transportation_mode"] = transportation_mode
+    for column in ("fuel_type", "seating"):
+        if column in trips:
+            trips[column] = normalize_labels(trips[column])
+    if "stops" in trips:
+        # stops are given as '<start>-<stop>-...-<destination>'; only used if the distance is missing
+        trips["stops"] = (
+            trips["stops"]
+            .where(trips["distance"].isna())
+            .map(
+                lambda stops: [parse_location(stop) for stop in stops.split("-")],
+                na_action="ignore",
+            )
+        )
+    if transportation_mode == "ferry":
+        for column in ("start", "destination"):
+            trips[column] = trips[column].map(parse_location, na_action="ignore")
+    return trips
+
+
+def input_dtypes(name: str) -> dict:
+    """Dtypes of the columns of an input file, given its name without extension"""
+    if name.startswith("business_trips_"):
+        transportation_mode = name[len("business_trips_") :]
+        return {**COMMON_DTYPES, **BUSINESS_TRIP_DTYPES[transportation_mode]}
+    elif name == "electricity":
+        return ELECTRICITY_DTYPES
+    elif name == "heating":
+        return HEATING_DTYPES
+    raise ValueError(f"Unknown input file '{name}.csv'")
+
+
+def read_blocks(path: Path, chunksize: int) -> Iterator[str]:
+    """Split an input file into blocks of csv text of up to chunksize rows, each starting with the header line
+
+    Blocks are cut at record boundaries: lines ending within a quoted field are kept with the rest of their record.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        header = ""
+        for line in f:
+            header += line
+            if header.count('"') % 2 == 0:
+                break
+        block, record, n_rows, n_blocks = [], "", 0, 0
+        for line in f:
+            record += line
+            if record.count('"') % 2:
+                continue
+            block.append(record)
+            n_rows += 1
+            record = ""
+            if n_rows == chunksize:
+                yield header + "".join(block)
+                block, n_rows, n_blocks = [], 0, n_blocks + 1
+        if record:
+            block.append(record)
+        if block or not n_blocks:
+            yield header + "".join(block)
+
+
+def compute_emissions(name: str, chunk: pd.DataFrame) -> np.ndarray:
+    """Compute the emissions of the rows of a chunk of an input file
+
+    :param name: name of the input file without extension, e.g. 'business_trips_car'
+    :param chunk: rows of the input file
+    :return: emissions of each row in kg co2e
+    """
+    if name.startswith("business_trips_"):
+        emissions, _, _, _ = calc_co2_businesstrip_batch(
+            business_trips(chunk, name[len("business_trips_") :])
+        )
+    elif name == "electricity":
+        emissions = calc_co2_electricity_batch(
+            chunk["consumption_kwh"],
+            normalize_labels(chunk["fuel_type"]),
+        )
+    else:
+        emissions = calc_co2_heating_batch(
+            chunk["consumption"],
+            normalize_labels(chunk["fuel_type"]),
+            unit=chunk["energy_unit"].str.strip(),
+        )
+    return np.asarray(emissions, dtype=float)
+
+
+def compute_rows(
+    name: str, chunk: pd.DataFrame, diagnostics: Counter
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the emissions of the rows of a chunk, isolating the rows which cannot be computed
+
+    A chunk that fails is split in halves, which are computed separately, until the failing rows are found; the
+    other rows are still computed in batches.
+
+    :param name: name of the input file without extension
+    :param chunk: rows of the input file
+    :param diagnostics: number of default values and fallbacks used per diagnostics code, updated with those of the
+                        rows that were computed
+    :return: emissions of each row (NaN for failed rows), and the error of each row (None for computed rows)
+    """
+    try:
+        with collect_diagnostics() as collected:
+            emissions = compute_emissions(name, chunk)
+    except Exception as e:
+        if len(chunk) == 1:
+            return np.full(1, np.nan), np.array([f"{type(e).__name__}: {e}"], object)
+        half = len(chunk) // 2
+        first = compute_rows(name, chunk.iloc[:half], diagnostics)
+        second = compute_rows(name, chunk.iloc[half:], diagnostics)
+        return np.concatenate([first[0], second[0]]), np.concatenate(
+            [first[1], second[1]]
+        )
+    diagnostics.update(collected.counts)
+    return emissions, np.full(len(chunk), None, object)
+
+
+def requests_avoided() -> int:
+    """Number of requests avoided so far by resolving each distinct location, route and airport of a batch once"""
+    return instrumentation.snapshot()["counters"].get("prefetch.calls_avoided", 0)
+
+
+def compute_block(
+    name: str, text: str, header: bool, strict: bool = False
+) -> Tuple[str, int, Counter, int, int]:
+    """Compute the emissions of a block of an input file
+
+    :param name: name of the input file without extension, e.g. 'business_trips_car'
+    :param text: csv text of the block, starting with the header line
+    :param header: whether to include the header line in the output
+    :param strict: whether a row which cannot be computed raises its error, instead of being reported in the column
+                   error of the output
+    :return: csv text of the block with the emissions appended as column co2e_kg (and the column error, unless
+             strict), its number of rows, the number of default values and fallbacks used per diagnostics code (see
+             co2calculator.diagnostics), the number of rows which could not be computed, and the number of requests
+             avoided by resolving each distinct location, route and airport once
+    """
+    chunk = pd.read_csv(io.StringIO(text), sep=";", dtype=input_dtypes(name))
+    diagnostics = Counter()
+    # blocks are computed one at a time per process, so the difference of the counter is that of this block
+    n_avoided = requests_avoided()
+    with instrumentation.instrumented():
+        if strict:
+            with collect_diagnostics() as collected:
+                chunk["co2e_kg"] = compute_emissions(name, chunk)
+            diagnostics.update(collected.counts)
+            n_errors = 0
+        else:
+            chunk["co2e_kg"], chunk["error"] = compute_rows(name, chunk, diagnostics)
+            n_errors = int(chunk["error"].notna().sum())
+    n_avoided = requests_avoided() - n_avoided
+    text = chunk.to_csv(sep=";", index=False, header=header, lineterminator="\n")
+    return text, len(chunk), diagnostics, n_errors, n_avoided
+
+
+def init_worker(workers: int) -> None:
+    """Prepare a worker process: load the factor tables, and split the API rate limits among the workers"""
+    warmup(batch=True)
+    for endpoint in ("pelias", "directions", "matrix"):
+        limit = get_rate_limit(endpoint)
+        if limit is not None:
+            rate, burst = limit
+            set_rate_limit(endpoint, rate / workers, burst=max(1.0, burst / workers))
+
+
+def compute_blocks(
+    name: str,
+    blocks: Iterable[str],
+    executor: Optional[Executor] = None,
+    max_pending: int = 2,
+    strict: bool = False,
+) -> Iterator[Tuple[str, int, Counter, int, int]]:
+    """Compute the blocks of an input file, in the worker processes of the executor if given
+
+    Results are returned in the order of the blocks. At most max_pending blocks are submitted to the executor at a
+    time, so that memory use does not depend on the size of the input.
+    """
+    blocks = ((text, i == 0) for i, text in enumerate(blocks))
+    if executor is None:
+        for text, header in blocks:
+            yield compute_block(name, text, header, strict)
+        return
+
+    pending: Deque[Future] = deque()
+    try:
+        for text, header in blocks:
+            pending.append(executor.submit(compute_block, name, text, header, strict))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def process_file(
+    path: Path,
+    output_path: Path,
+    chunksize: int,
+    executor: Optional[Executor] = None,
+    max_pending: int = 2,
+    strict: bool = False,
+) -> Tuple[int, Counter, int, int]:
+    """Compute the emissions of one input file chunk by chunk and write them to the output file
+
+    Chunks are passed to the executor (if given) as csv text, so that no DataFrames are pickled. The output does
+    not depend on whether the chunks are computed in this process or by an executor.
+
+    :return: number of processed rows, the number of default values and fallbacks used per diagnostics code, the
+             number of rows which could not be computed, and the number of requests avoided (see compute_block)
+    """
+    name = path.stem
+    input_dtypes(name)
+
+    n_rows = 0
+    n_errors = 0
+    n_avoided = 0
+    diagnostics = Counter()
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            blocks = read_blocks(path, chunksize)
+            for text, n, counts, errors, avoided in compute_blocks(
+                name, blocks, executor, max_pending, strict
+            ):
+                f.write(text)
+                n_rows += n
+                n_errors += errors
+                n_avoided += avoided
+                diagnostics.update(counts)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    # only replace the previous output once the whole file has been computed
+    tmp_path.replace(output_path)
+    return n_rows, diagnostics, n_errors, n_avoided
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--input-dir",
+        type=Path,
+        default=Path(script_path) / "data" / "test_data_users",
+        help="directory of the input files (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=None,
+        help="directory of the output files (default: the input directory)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=10000,
+        help="number of rows computed at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes computing chunks in parallel; the output is the same as with a single "
+        "process (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="abort the computation of a file at the first row which cannot be computed, instead of reporting the "
+        "row in the column error of the output",
+    )
+    args = parser.parse_args(argv)
+    if args.chunksize < 1 or args.workers < 1:
+        parser.error("--chunksize and --workers must be positive")
+    output_dir = args.output_dir or args.input_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    executor = None
+    if args.workers > 1:
+        # load the tables before the workers are started, so that forked workers share them instead of loading them
+        warmup(batch=True)
+        executor = ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=init_worker,
+            initargs=(args.workers,),
+        )
+
+    paths = sorted(args.input_dir.glob("business_trips_*.csv"))
+    paths += [args.input_dir / "electricity.csv", args.input_dir / "heating.csv"]
+    failed = False
+    try:
+        for path in paths:
+            if not path.exists() or path.stem.endswith("_calc"):
+                continue
+            output_path = output_dir / f"{path.stem}_calc.csv"
+            print(f"Computing emissions of {path.name}...")
+            try:
+                n_rows, diagnostics, n_errors, n_avoided = process_file(
+                    path,
+                    output_path,
+                    args.chunksize,
+                    executor,
+                    2 * args.workers,
+                    args.strict,
+                )
+            except Exception as e:
+                print(f"Failed to compute {path.name}: {e}", file=sys.stderr)
+                failed = True
+                continue
+            print(f"Writing file: {output_path} ({n_rows} rows)")
+            if n_avoided:
+                print(
+                    f"  {n_avoided} request(s) avoided by resolving each distinct location, route and airport once"
+                )
+            if n_errors:
+                print(
+                    f"  {n_errors} row(s) could not be computed, see column error",
+                    file=sys.stderr,
+                )
+            # one line per kind of default value or fallback, instead of a warning per row
+            for code, count in sorted(diagnostics.items()):
+                print(f"  {code}: {count} row(s)", file=sys.stderr)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
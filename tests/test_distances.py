@@ -4,17 +4,27 @@
 
 import os
 from pathlib import Path
+from co2calculator.cache import MemoryCache
 from co2calculator.distances import (
+    configure_client,
+    get_client,
     haversine,
+    pairwise_haversine,
     geocoding_airport,
+    geocoding_structured,
     is_valid_geocoding_dict,
     geocoding_train_stations,
+    get_route,
+    get_route_distances,
+    set_geocoding_cache,
+    set_route_cache,
 )
 from co2calculator.calculate import calc_co2_plane, calc_co2_train
 import math
 import numpy as np
 import pytest
 from dotenv import load_dotenv
+from pytest_mock import MockerFixture
 
 load_dotenv()
 ORS_API_KEY = os.environ.get("ORS_API_KEY")
@@ -39,6 +49,26 @@ def test_haversine():
     assert distance == pytest.approx(distance_expected, rel=0.01)
 
 
+def test_haversine__arrays():
+    """Test haversine function with arrays of coordinates and pairwise distance matrix"""
+    # FRA, BCN, MUC airports (lat, long)
+    coords = np.array([[50.0264, 8.5431], [41.2971, 2.07846], [48.3538, 11.7861]])
+
+    legs = haversine(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    matrix = pairwise_haversine(coords)
+    matrix_chunked = pairwise_haversine(
+        coords, coords[:2], dtype=np.float32, chunk_size=2
+    )
+
+    assert legs.shape == (2,)
+    assert legs[0] == pytest.approx(haversine(*coords[0], *coords[1]))
+    assert matrix.shape == (3, 3)
+    assert np.allclose(np.diag(matrix), 0)
+    assert matrix[[0, 1], [1, 2]] == pytest.approx(legs)
+    assert matrix_chunked.dtype == np.float32
+    assert np.allclose(matrix_chunked, matrix[:, :2], rtol=1e-5)
+
+
 @pytest.mark.xfail(reason="API Key issues")
 def test_geocoding_airport_FRA():
     """Test geocoding of airports using IATA code"""
@@ -71,11 +101,65 @@ def test_geocoding_airport_JFK():
     assert np.allclose(coords[::-1], res_coords, atol=0.03)
 
 
+def test_geocoding_airport__offline(mocker: MockerFixture):
+    """Test geocoding of airports from the bundled airport table, with Pelias only for unknown codes"""
+    patched_pelias = mocker.patch(
+        "co2calculator.distances._pelias",
+        return_value=[
+            {
+                "properties": {
+                    "name": "Nowhere Airport",
+                    "country_a": "XXX",
+                    "addendum": {"osm": {"iata": "QQQ"}},
+                },
+                "geometry": {"coordinates": [1.0, 2.0]},
+            }
+        ],
+    )
+
+    name, coords, country = geocoding_airport("fra")
+    assert (name, country) == ("Frankfurt am Main International Airport", "DEU")
+    assert np.allclose(coords, [8.570556, 50.033056], atol=0.03)
+    patched_pelias.assert_not_called()
+
+    assert geocoding_airport("QQQ") == ("Nowhere Airport", [1.0, 2.0], "XXX")
+    patched_pelias.assert_called_once_with("search", text="QQQ Airport")
+
+
 def test_geocoding_structured():
     """To do"""
     pass
 
 
+def test_geocoding_structured__cached(mocker: MockerFixture):
+    """Test: Geocode equivalent locations twice with a geocoding cache set.
+    Expect: Pelias is queried only once; the cached result is used for the second call.
+    """
+    feature = {
+        "properties": {
+            "name": "Heidelberg",
+            "country": "Germany",
+            "layer": "locality",
+            "confidence": 1,
+        },
+        "geometry": {"coordinates": [8.69, 49.41]},
+    }
+    patched_pelias = mocker.patch(
+        "co2calculator.distances.pelias_structured",
+        return_value={"features": [feature]},
+    )
+    mocker.patch("co2calculator.distances.get_client")
+    set_geocoding_cache(MemoryCache())
+    try:
+        first = geocoding_structured({"locality": "Heidelberg", "country": "DE"})
+        second = geocoding_structured({"country": "de", "locality": "heidelberg"})
+    finally:
+        set_geocoding_cache(None)
+
+    patched_pelias.assert_called_once()
+    assert first == second
+
+
 def test_valid_geocoding_dict():
     """Test if a valid geocoding dictionary is recognized as valid"""
     # Given parameters
@@ -209,3 +293,102 @@ def test_geocoding_train_stations_outside_europe():
 
     # Check if expected result matches calculated result
     assert co2e == pytest.approx(co2e_kg_expected, abs=0.1)
+
+
+@pytest.mark.parametrize(
+    "symmetric,expected_calls",
+    [
+        pytest.param(False, 2, id="directional"),
+        pytest.param(True, 1, id="symmetric"),
+    ],
+)
+def test_get_route__cached(
+    mocker: MockerFixture, symmetric: bool, expected_calls: int
+) -> None:
+    """Test: Route A to B twice (with slightly different coordinates) and B to A once with a route cache set.
+    Expect: Coordinates are matched at the cache precision; the reverse route is only cached if symmetric.
+    """
+    patched_directions = mocker.patch(
+        "co2calculator.distances.directions",
+        return_value={"routes": [{"summary": {"distance": 42000}}]},
+    )
+    mocker.patch("co2calculator.distances.get_client")
+    cache = MemoryCache()
+    set_route_cache(cache, precision=3, symmetric=symmetric)
+    try:
+        a, b, a_nearby = [8.6821, 49.4077], [13.4132, 52.5219], [8.68208, 49.40773]
+        assert get_route([a, b], "driving-car") == 42
+        assert get_route([a_nearby, b], "driving-car") == 42
+        assert get_route([b, a], "driving-car") == 42
+    finally:
+        set_route_cache(None)
+
+    assert patched_directions.call_count == expected_calls
+    assert cache.stats()["hits"] == 3 - expected_calls
+
+
+@pytest.mark.parametrize(
+    "max_elements,expected_requests",
+    [
+        pytest.param(3500, 1, id="one request per group"),
+        pytest.param(2, 3, id="chunked"),
+    ],
+)
+def test_get_route_distances(
+    mocker: MockerFixture, max_elements: int, expected_requests: int
+) -> None:
+    """Test: Obtain the distances of routes from five origins to one destination, two other routes and a route with
+    an intermediate stop.
+    Expect: Routes to the common destination are requested as matrix; the other routes are requested from the
+    directions endpoint, and the route with an intermediate stop is obtained with get_route.
+    """
+
+    def matrix(client, locations, profile, sources, destinations, metrics, units):
+        # distance: difference of longitudes
+        return {
+            "distances": [
+                [abs(locations[s][0] - locations[d][0]) for d in destinations]
+                for s in sources
+            ]
+        }
+
+    def route(client, coords, profile):
+        distance = abs(coords[0][0] - coords[1][0]) * 1000
+        return {"routes": [{"summary": {"distance": distance}}]}
+
+    patched_matrix = mocker.patch(
+        "co2calculator.distances.distance_matrix", side_effect=matrix
+    )
+    patched_directions = mocker.patch(
+        "co2calculator.distances.directions", side_effect=route
+    )
+    patched_get_route = mocker.patch(
+        "co2calculator.distances.get_route", return_value=99.0
+    )
+    mocker.patch("co2calculator.distances.get_client")
+    workplace = [0.0, 0.0]
+    routes = [[[float(i), 1.0], workplace] for i in range(1, 6)]
+    routes += [[[10.0, 0.0], [20.0, 0.0]], [[30.0, 0.0], [32.0, 0.0]]]
+    routes += [[[1.0, 1.0], [2.0, 2.0], [3.0, 3.0]]]
+
+    distances = get_route_distances(routes, max_elements=max_elements)
+
+    assert distances == [1.0, 2.0, 3.0, 4.0, 5.0, 10.0, 2.0, 99.0]
+    assert patched_matrix.call_count == expected_requests
+    assert patched_directions.call_count == 2
+    patched_get_route.assert_called_once()
+
+
+def test_get_client__shared(mocker: MockerFixture):
+    """Test: Request the client twice after configuring a self-hosted instance.
+    Expect: One client is created with the configured base URL and reused.
+    """
+    patched_client = mocker.patch("co2calculator.distances.openrouteservice.Client")
+    configure_client(base_url="http://localhost:8080/ors/", pool_maxsize=20)
+    try:
+        assert get_client() is get_client()
+    finally:
+        configure_client()
+
+    patched_client.assert_called_once()
+    assert patched_client.call_args.kwargs["base_url"] == "http://localhost:8080/ors"
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.aio module"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from pytest_mock import MockerFixture
+
+import co2calculator.aio as candidate
+from co2calculator.calculate import calc_co2_businesstrip
+
+
+def test_acalc_co2_car__concurrent_geocoding(mocker: MockerFixture) -> None:
+    """Test: Calculate car-trip emissions based on several stops, each geocoded in 0.2 s.
+    Expect: Stops are geocoded concurrently; emissions are the same as for the given distance.
+    """
+    stops = [{"locality": str(i)} for i in range(4)]
+    threads = set()
+
+    def geocoding_structured(loc):
+        threads.add(threading.get_ident())
+        time.sleep(0.2)
+        return "NAME", "COUNTRY", [float(loc["locality"]), 0.0], "RES"
+
+    mocker.patch(
+        "co2calculator.calculate.geocoding_structured", side_effect=geocoding_structured
+    )
+    patched_get_route = mocker.patch("co2calculator.aio.get_route", return_value=100)
+
+    start = time.perf_counter()
+    emissions, distance = asyncio.run(candidate.acalc_co2_car(stops=stops))
+    elapsed = time.perf_counter() - start
+
+    assert (emissions, distance) == pytest.approx((21.5, 100))
+    assert elapsed < 0.6
+    assert len(threads) == len(stops)
+    # coordinates are passed in the order of the stops
+    patched_get_route.assert_called_once_with(
+        [[float(i), 0.0] for i in range(4)], "driving-car"
+    )
+
+
+@pytest.mark.parametrize("transportation_mode", ["car", "bus", "train"])
+def test_acalc_co2_businesstrip(
+    mocker: MockerFixture, transportation_mode: str
+) -> None:
+    """Test: Calculate business-trip emissions asynchronously for start and destination.
+    Expect: Same result as calc_co2_businesstrip for the distance along the stops.
+    """
+    mocker.patch(
+        "co2calculator.aio._STOP_DISTANCES",
+        {transportation_mode: mocker.AsyncMock(return_value=250.0)},
+    )
+
+    result = asyncio.run(
+        candidate.acalc_co2_businesstrip(
+            transportation_mode, start={}, destination={}, roundtrip=True
+        )
+    )
+
+    assert result == calc_co2_businesstrip(
+        transportation_mode, distance=250.0, roundtrip=True
+    )
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.batch module"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from pytest_mock import MockerFixture
+
+import co2calculator.batch as candidate
+from co2calculator.calculate import (
+    calc_co2_businesstrip,
+    calc_co2_commuting,
+    calc_co2_electricity,
+    calc_co2_heating,
+    calc_co2_plane,
+    commuting_emissions_group,
+)
+from co2calculator.diagnostics import collect_diagnostics
+
+TRIPS = pd.DataFrame(
+    {
+        "transportation_mode": ["car", "car", "bus", "bus", "train", "train"],
+        "distance": [444, 10, 549, 10, 1162, 10],
+        "size": ["medium", None, "large", None, None, None],
+        "fuel_type": ["gasoline", "electric", "diesel", None, "electric", None],
+        "occupancy": [None, None, 80, 20, None, None],
+        "passengers": [3, None, None, None, None, None],
+        "roundtrip": [False, True, False, True, False, False],
+    }
+)
+
+
+def test_calc_co2_businesstrip_batch__matches_scalar():
+    """Test: Calculate distance-based trips of all vectorized modes in one batch.
+    Expect: Same results as calc_co2_businesstrip for every trip.
+    """
+    emissions, distance, category, description = candidate.calc_co2_businesstrip_batch(
+        TRIPS
+    )
+
+    records = TRIPS.astype(object).where(TRIPS.notna(), None).to_dict("records")
+    for i, record in enumerate(records):
+        expected = calc_co2_businesstrip(**record)
+        assert emissions[i] == pytest.approx(expected[0])
+        assert distance[i] == expected[1]
+        assert category[i] == expected[2]
+        assert description[i] == expected[3]
+
+
+def test_calc_co2_businesstrip_batch__columns():
+    """Test: Pass the trips as mapping of column names to arrays.
+    Expect: Returns one result per trip.
+    """
+    emissions, distance, _, _ = candidate.calc_co2_businesstrip_batch(
+        {"transportation_mode": np.array(["train", "train"]), "distance": [10, 20]}
+    )
+
+    assert emissions == pytest.approx([0.329, 0.658])
+    assert list(distance) == [10, 20]
+
+
+def test_calc_co2_businesstrip_batch__scalar_fallback(mocker: MockerFixture):
+    """Test: Calculate ferry trips in a batch.
+    Expect: Ferry trips are passed to calc_co2_businesstrip.
+    """
+    patched = mocker.patch(
+        "co2calculator.calculate.calc_co2_businesstrip",
+        return_value=(100.0, 1000.0, "short haul", "500 to 1500 km"),
+    )
+
+    emissions, distance, _, _ = candidate.calc_co2_businesstrip_batch(
+        {
+            "transportation_mode": ["ferry", "car"],
+            "start": [{"locality": "Kiel", "country": "DE"}, None],
+            "destination": [{"locality": "Oslo", "country": "NO"}, None],
+            "distance": [None, 100],
+            "roundtrip": [True, False],
+        }
+    )
+
+    patched.assert_called_once()
+    assert emissions == pytest.approx([200.0, 21.5])
+    assert list(distance) == [1000.0, 100.0]
+
+
+def test_calc_co2_plane_batch__matches_scalar():
+    """Test: Calculate short- and long-haul flights of all seating classes, with IATA codes in any case.
+    Expect: Same results as calc_co2_plane; unavailable seating classes are reported once per combination.
+    """
+    start = ["FRA", "fra ", "FRA", "FRA", "FRA"]
+    destination = ["LJU", "JFK", "ZRH", "ZRH", "JFK"]
+    seating = [None, "first_class", "premium_economy_class", "business_class", None]
+
+    with collect_diagnostics() as diagnostics:
+        emissions, distance = candidate.calc_co2_plane_batch(
+            start, destination, seating, roundtrip=[False, True, False, False, False]
+        )
+
+    for i, args in enumerate(zip(start, destination, seating)):
+        with collect_diagnostics():
+            expected_emissions, expected_distance = calc_co2_plane(*args)
+        factor = 2 if i == 1 else 1
+        assert emissions[i] == pytest.approx(factor * expected_emissions)
+        assert distance[i] == pytest.approx(expected_distance)
+    assert diagnostics.counts == {
+        "plane.seating.default": 2,
+        "plane.seating.unavailable": 1,
+    }
+    assert diagnostics.rows("plane.seating.unavailable").tolist() == [2]
+    with pytest.raises(ValueError):
+        candidate.calc_co2_plane_batch(["FRA"], ["LJU"], "standing")
+
+
+def test_calc_co2_plane_batch__missing_distance(mocker: MockerFixture):
+    """Test: Calculate flights for which the distance between the airports is NaN.
+    Expect: Raises ValueError naming the routes, instead of using the long-haul factor.
+    """
+    mocker.patch(
+        "co2calculator.batch.haversine", return_value=np.array([np.nan, 500.0])
+    )
+
+    with pytest.raises(ValueError, match="'FRA', 'LJU'"):
+        candidate.calc_co2_plane_batch(["FRA", "FRA"], ["LJU", "ZRH"])
+
+
+def test_calc_co2_businesstrip_batch__invalid():
+    """Test: Batch with trip specifics for which no emission factor exists.
+    Expect: Raises ValueError.
+    """
+    with pytest.raises(ValueError):
+        candidate.calc_co2_businesstrip_batch(
+            {
+                "transportation_mode": ["car", "car"],
+                "distance": [1, 1],
+                "size": ["tiny", "average"],
+            }
+        )
+
+
+def test_calc_co2_electricity_batch__matches_scalar():
+    """Test: Calculate electricity emissions of several records at once.
+    Expect: Same results as calc_co2_electricity for every record.
+    """
+    consumption = [10000, 250.5, 0]
+    fuel_type = ["german_energy_mix", "solar", "german_energy_mix"]
+
+    emissions = candidate.calc_co2_electricity_batch(
+        consumption, fuel_type, energy_share=0.5
+    )
+
+    assert emissions == pytest.approx(
+        [
+            calc_co2_electricity(c, f, energy_share=0.5)
+            for c, f in zip(consumption, fuel_type)
+        ]
+    )
+
+
+def test_calc_co2_heating_batch__matches_scalar():
+    """Test: Calculate heating emissions of records with different fuel types and units.
+    Expect: Same results as calc_co2_heating; invalid fuel type and unit combinations raise ValueError.
+    """
+    consumption = [250, 1000, 30, 120]
+    fuel_type = ["woodchips", "gas", "oil", "gas"]
+    unit = ["kg", "kWh", "l", "m^3"]
+
+    emissions = candidate.calc_co2_heating_batch(consumption, fuel_type, unit=unit)
+
+    assert emissions == pytest.approx(
+        [calc_co2_heating(*args) for args in zip(consumption, fuel_type, unit)]
+    )
+    with pytest.raises(ValueError):
+        candidate.calc_co2_heating_batch([1, 1], ["woodchips", "solar"], unit="l")
+
+
+def test_calc_co2_heating_batch__invalid():
+    """Test: Calculate heating emissions of records with several invalid fuel type and unit combinations.
+    Expect: One ValueError listing every invalid combination with its number of records.
+    """
+    with pytest.raises(ValueError) as error:
+        candidate.calc_co2_heating_batch(
+            [1, 2, 3, 4],
+            ["oil", "solar", "solar", "uranium"],
+            unit=["l", "kg", "kg", "kWh"],
+        )
+
+    assert "('solar', 'kg'): 2" in str(error.value)
+    assert "('uranium', 'kWh'): 1" in str(error.value)
+    assert "oil" not in str(error.value)
+
+
+def test_calc_co2_heating_batch__area_share():
+    """Test: Calculate heating emissions of records with shares of the building area of at most 1 and above.
+    Expect: Same results and diagnostic as calc_co2_heating; the records with a share above 1 are reported.
+    """
+    area_share = [0.5, 1.5, 1.0, 2.0]
+
+    with collect_diagnostics() as diagnostics:
+        emissions = candidate.calc_co2_heating_batch(
+            [1000] * 4, "gas", unit="kWh", area_share=area_share
+        )
+
+    with collect_diagnostics() as scalar_diagnostics:
+        expected = [calc_co2_heating(1000, "gas", "kWh", share) for share in area_share]
+    assert emissions == pytest.approx(expected)
+    assert diagnostics.counts == {"heating.area_share.invalid": 2}
+    assert scalar_diagnostics.counts == diagnostics.counts
+    assert diagnostics.rows("heating.area_share.invalid").tolist() == [1, 3]
+
+
+COMMUTES = pd.DataFrame(
+    {
+        "user": [1, 1, 2, 3, 3, 4, 5],
+        "group": [1, 1, 1, 2, 2, 2, 2],
+        "transportation_mode": [
+            "car",
+            "tram",
+            "bicycle",
+            "bus",
+            "train",
+            "motorbike",
+            "pedelec",
+        ],
+        "weekly_distance": [30, 12, 50, 40, 100, 60, 25],
+        "size": ["medium", None, None, "large", None, None, None],
+        "fuel_type": ["gasoline", None, None, None, "electric", None, None],
+        "occupancy": [None, None, None, 80, None, None, None],
+        "passengers": [1, None, None, None, None, None, None],
+        "workweeks": [46, 46, 40, 44, 44, 30, 20],
+    }
+)
+
+
+def test_calc_co2_commuting_batch__matches_scalar():
+    """Test: Calculate commutes of all modes of transport in one batch.
+    Expect: Same weekly emissions as calc_co2_commuting for every commute; annual emissions are multiplied by
+    the workweeks.
+    """
+    weekly, annual = candidate.calc_co2_commuting_batch(COMMUTES)
+
+    parameters = ["transportation_mode", "weekly_distance", "size", "fuel_type"]
+    parameters += ["occupancy", "passengers"]
+    records = COMMUTES[parameters].astype(object).where(COMMUTES.notna(), None)
+    expected = [calc_co2_commuting(**record) for record in records.to_dict("records")]
+    assert weekly == pytest.approx(expected)
+    assert annual == pytest.approx(weekly * COMMUTES["workweeks"].to_numpy())
+    with pytest.raises(ValueError, match="plane"):
+        candidate.calc_co2_commuting_batch(
+            {"transportation_mode": ["plane"], "weekly_distance": [1], "workweeks": [1]}
+        )
+
+
+def test_commuting_emissions_group_batch():
+    """Test: Extrapolate the commuting emissions of two groups with participants and one without.
+    Expect: Same results as commuting_emissions_group per group, with the number of distinct users as participants;
+    NaN for the group without participants.
+    """
+    groups = pd.DataFrame(
+        {
+            "id": [1, 2, 3],
+            "name": ["a", "b", "c"],
+            "representative_user_id": [1, 3, 6],
+            "n_members": [30, 6, 10],
+        }
+    )
+    _, annual = candidate.calc_co2_commuting_batch(COMMUTES)
+
+    result = candidate.commuting_emissions_group_batch(COMMUTES, groups)
+
+    assert result["n_participants"].tolist() == [2, 3, 0]
+    assert result.loc[1, "group_co2e"] == pytest.approx(
+        commuting_emissions_group(annual[:3].sum(), 2, 30)
+    )
+    assert result.loc[2, "group_co2e"] == pytest.approx(
+        commuting_emissions_group(annual[3:].sum(), 3, 6)
+    )
+    assert np.isnan(result.loc[3, "group_co2e"])
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.cache module"""
+
+import os
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from co2calculator.cache import Cache, MemoryCache, SQLiteCache, canonical_key
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path: Path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemoryCache(**kwargs)
+        return SQLiteCache(tmp_path / "cache.sqlite", **kwargs)
+
+    return make
+
+
+def test_canonical_key():
+    """Test: Build keys for equivalent requests.
+    Expect: Case, whitespace and order of dictionary keys do not matter.
+    """
+    assert canonical_key("structured", {"locality": "Heidelberg", "country": "DE"}) == (
+        canonical_key("structured", {"country": "de", "locality": " heidelberg  "})
+    )
+    assert canonical_key("search", "FRA Airport") != canonical_key(
+        "search", "MUC Airport"
+    )
+
+
+def test_get_set(make_cache):
+    """Test: Store values, including an empty (negative) result.
+    Expect: Values are returned; missing keys return None and count as misses.
+    """
+    cache = make_cache()
+    cache.set("a", [{"name": "Heidelberg"}])
+    cache.set("b", [])
+
+    assert cache.get("a") == [{"name": "Heidelberg"}]
+    assert cache.get("b") == []
+    assert cache.get("c") is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl(make_cache, mocker: MockerFixture):
+    """Test: Read an entry after its time to live.
+    Expect: Entry has expired.
+    """
+    cache = make_cache(ttl=60)
+    mocker.patch("co2calculator.cache.time.time", return_value=1000.0)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+    mocker.patch("co2calculator.cache.time.time", return_value=1060.0)
+    assert cache.get("a") is None
+
+
+def test_lru_eviction(make_cache, mocker: MockerFixture):
+    """Test: Store more entries than allowed.
+    Expect: The least recently used entry is evicted.
+    """
+    clock = mocker.patch("co2calculator.cache.time.time", return_value=1.0)
+    cache = make_cache(max_entries=2)
+    cache.set("a", 1)
+    clock.return_value = 2.0
+    cache.set("b", 2)
+    clock.return_value = 3.0
+    cache.get("a")
+    clock.return_value = 4.0
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache__incomplete_backend():
+    """Test: Instantiate a cache class which does not implement all methods.
+    Expect: Raises TypeError.
+    """
+
+    class IncompleteCache(Cache):
+        def get(self, key: str):
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteCache()
+
+
+def test_sqlite_get__no_writes(tmp_path: Path, mocker: MockerFixture):
+    """Test: Read entries of an SQLite cache repeatedly, then store another value.
+    Expect: Reads do not write to the database; the access times are written with the stored value.
+    """
+    clock = mocker.patch("co2calculator.cache.time.time", return_value=1.0)
+    cache = SQLiteCache(tmp_path / "cache.sqlite")
+    cache.set("a", 1)
+    cache.set("b", 2)
+    changes = cache._db.total_changes
+
+    clock.return_value = 2.0
+    for _ in range(10):
+        assert cache.get("a") == 1
+    assert cache._db.total_changes == changes
+
+    cache.set("c", 3)
+    accessed = dict(cache._db.execute("SELECT key, accessed FROM cache").fetchall())
+    assert accessed == {"a": 2.0, "b": 1.0, "c": 2.0}
+
+
+def test_sqlite_persistence(tmp_path: Path):
+    """Test: Open the same database file twice.
+    Expect: Entries stored by the first cache are found by the second.
+    """
+    SQLiteCache(tmp_path / "cache.sqlite", table="geocoding").set("a", {"x": 1})
+
+    assert SQLiteCache(tmp_path / "cache.sqlite", table="geocoding").get("a") == {
+        "x": 1
+    }
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+def test_sqlite_fork(tmp_path: Path):
+    """Test: Use a cache in a forked process, e.g. a worker of a process pool.
+    Expect: The child uses its own connection; its entries are found by the parent.
+    """
+    cache = SQLiteCache(tmp_path / "cache.sqlite")
+    cache.set("a", 1)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = cache.get("a") == 1
+            cache.set("b", 2)
+        except BaseException:
+            ok = False
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert cache.get("b") == 2
@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 """Unit tests for co2calculator.calculate module"""
 
+import subprocess
+import sys
 from typing import Optional, List, Dict
 
 import pytest
@@ -257,7 +259,8 @@ def test_calc_co2_bus__stops_based(
     assert actual_emissions == expected_emissions
 
     assert patched_geocoding.call_count == len(stops)
-    assert patched_haversine.call_count == len(stops) - 1
+    # all legs are computed in one call
+    patched_haversine.assert_called_once()
     patched_apply_detour.assert_called_once()
 
 
@@ -338,7 +341,8 @@ def test_calc_co2_train__stops_based(
     assert actual_emissions == expected_emissions
 
     assert patched_geocoding.call_count == len(stops)
-    assert patched_haversine.call_count == len(stops) - 1
+    # all legs are computed in one call
+    patched_haversine.assert_called_once()
     patched_apply_detour.assert_called_once()
 
 
@@ -350,6 +354,14 @@ def test_calc_co2_train__failed():
         candidate.calc_co2_train(distance=None, stops=None)
 
 
+def test_calc_co2_train__default_fuel_type():
+    """Test: Calculate a train trip without fuel type.
+    Expect: The warning about the default value names the train fuel type.
+    """
+    with pytest.warns(UserWarning, match="Train fuel type was not provided"):
+        candidate.calc_co2_train(distance=100, vehicle_range="local")
+
+
 @pytest.mark.parametrize(
     "seating_class,mocked_distance,expected_emissions",
     [
@@ -411,6 +423,20 @@ def test_calc_co2_plane__failed(mocker: MockerFixture):
     patched_haversine.assert_called_once()
 
 
+def test_calc_co2_plane__missing_distance(mocker: MockerFixture):
+    """Test: Calculate plane-trip emissions when the distance between the airports is NaN.
+    Expect: Raises ValueError instead of using the long-haul factor.
+    """
+    mocker.patch(
+        "co2calculator.calculate.geocoding_airport",
+        return_value=("TEST", (1.0, 2.0), "TEST"),
+    )
+    mocker.patch("co2calculator.calculate.haversine", return_value=float("nan"))
+
+    with pytest.raises(ValueError):
+        candidate.calc_co2_plane(start="SOME", destination="SOME")
+
+
 @pytest.mark.parametrize(
     "seating_class,expected_emissions",
     [
@@ -529,6 +555,21 @@ def test_commuting_bike():
     assert co2e == pytest.approx(co2e_kg_expected, rel=0.01)
 
 
+def test_commuting_train():
+    """Test: Calculate the emissions of commuting by train.
+    Expect: The emissions of calc_co2_train for a local train, as a number rather than an (emissions, distance) tuple.
+    """
+    co2e = candidate.calc_co2_commuting(
+        transportation_mode="train", weekly_distance=60, fuel_type="diesel"
+    )
+
+    expected, _ = candidate.calc_co2_train(
+        distance=60, fuel_type="diesel", vehicle_range="local"
+    )
+    assert isinstance(co2e, float)
+    assert co2e == pytest.approx(expected)
+
+
 @pytest.mark.parametrize(
     "distance,expected_category, expected_description",
     [
@@ -600,3 +641,64 @@ def test_calc_co2_businesstrip(
     )
 
     patched_method.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    "transportation_mode,start,destination,valid",
+    [
+        pytest.param("plane", "FRA", "JFK", True, id="plane: IATA codes"),
+        pytest.param(
+            "plane", {"address": "A"}, {"address": "B"}, False, id="plane: dicts"
+        ),
+        pytest.param("car", {"address": "A"}, {"address": "B"}, True, id="car: dicts"),
+        pytest.param("car", "FRA", "JFK", False, id="car: strings"),
+    ],
+)
+def test_businesstrip_stops__location_types(
+    transportation_mode: str, start, destination, valid: bool
+) -> None:
+    """Test: Check the start and destination of a business trip given as IATA codes or as location dictionaries.
+    Expect: Plane trips require IATA codes, other trips require dictionaries; otherwise ValueError is raised.
+    """
+    if valid:
+        assert candidate._businesstrip_stops(
+            transportation_mode, start, destination, None
+        ) == [start, destination]
+    else:
+        with pytest.raises(ValueError):
+            candidate._businesstrip_stops(transportation_mode, start, destination, None)
+
+
+def test_businesstrip_stops__missing_locations() -> None:
+    """Test: Check a business trip with a start but neither destination nor distance.
+    Expect: Raises ValueError.
+    """
+    with pytest.raises(ValueError):
+        candidate._businesstrip_stops("car", {"address": "A"}, None, None)
+
+
+def test_scalar_calculation__without_pandas():
+    """Test: Import co2calculator and calculate a trip in a fresh interpreter.
+    Expect: pandas is not imported.
+    """
+    code = (
+        "import sys, co2calculator; "
+        "co2calculator.calc_co2_car(distance=10, passengers=1, size='small', fuel_type='diesel'); "
+        "co2calculator.calc_co2_heating(250, fuel_type='woodchips', unit='kg'); "
+        "assert 'pandas' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_factor_dataframes__package():
+    """Test: Access the DataFrame of the emission factors through the package.
+    Expect: The table of data/emission_factors.csv, loaded on first access.
+    """
+    import co2calculator
+
+    emission_factor_df = co2calculator.emission_factor_df
+
+    assert {"subcategory", "co2e"} <= set(emission_factor_df.columns)
+    assert len(emission_factor_df) == len(candidate.emission_factors())
+    with pytest.raises(AttributeError):
+        co2calculator.no_such_attribute
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.diagnostics module"""
+
+import warnings
+
+import pytest
+
+import co2calculator.diagnostics as candidate
+from co2calculator.batch import calc_co2_businesstrip_batch
+from co2calculator.calculate import calc_co2_car
+
+
+def test_report__warns_by_default():
+    """Test: Calculate a car trip without size outside of collect_diagnostics.
+    Expect: A warning is emitted, as before.
+    """
+    with pytest.warns(UserWarning, match="Size of car was not provided"):
+        calc_co2_car(distance=100, passengers=1, fuel_type="diesel")
+
+
+def test_collect_diagnostics():
+    """Test: Calculate car trips without parameters within collect_diagnostics.
+    Expect: No warning is emitted; the defaults are counted per code, with the message of the first event.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        with candidate.collect_diagnostics() as diagnostics:
+            calc_co2_car(distance=100)
+            calc_co2_car(distance=100, size="small")
+
+    assert diagnostics.counts == {
+        "car.passengers.default": 2,
+        "car.size.default": 1,
+        "car.fuel_type.default": 2,
+    }
+    assert diagnostics.messages["car.size.default"] == (
+        "Size of car was not provided. Using default value: 'average'"
+    )
+    assert candidate.current_diagnostics() is None
+
+
+def test_collect_diagnostics__batch_rows():
+    """Test: Calculate a batch of car and plane trips with missing parameters within collect_diagnostics.
+    Expect: Events of the column-wise and the scalar calculation are attributed to their rows.
+    """
+    with candidate.collect_diagnostics() as diagnostics:
+        calc_co2_businesstrip_batch(
+            {
+                "transportation_mode": ["car", "plane", "car", "plane"],
+                "start": [None, "FRA", None, "FRA"],
+                "destination": [None, "LJU", None, "JFK"],
+                "distance": [100, None, 200, None],
+                "size": [None, None, "small", None],
+                "fuel_type": ["diesel", None, "diesel", None],
+                "passengers": [1, None, 2, None],
+                "seating": [None, "economy_class", None, None],
+            }
+        )
+
+    assert diagnostics.counts == {"car.size.default": 1, "plane.seating.default": 1}
+    assert diagnostics.rows("car.size.default").tolist() == [0]
+    assert diagnostics.rows("plane.seating.default").tolist() == [3]
+    assert diagnostics.per_row() == {
+        0: {"car.size.default": 1},
+        3: {"plane.seating.default": 1},
+    }
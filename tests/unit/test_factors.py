@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.factors module"""
+
+import math
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import co2calculator.factors as factors_module
+from co2calculator.factors import (
+    DATA_DIR,
+    FactorIndex,
+    build_factor_snapshot,
+    emission_factor_index,
+    emission_factors,
+    read_factor_snapshot,
+    read_factor_tables,
+    read_table,
+    source_hash,
+)
+
+RECORDS = [
+    {"subcategory": "bus", "size_class": "large", "occupancy": 20.0, "co2e": 0.08},
+    {"subcategory": "bus", "size_class": "large", "occupancy": 50.0, "co2e": 0.03},
+    {
+        "subcategory": "bicycle",
+        "size_class": math.nan,
+        "occupancy": None,
+        "co2e": 0.009,
+    },
+]
+
+
+@pytest.fixture
+def index() -> FactorIndex:
+    return FactorIndex(RECORDS, ("subcategory", "size_class", "occupancy"), "co2e")
+
+
+def test_get__full_key(index: FactorIndex):
+    """Test: Look up a factor by all key fields; numeric values of different types match.
+    Expect: Returns the factor of the matching record.
+    """
+    assert index.get(subcategory="bus", size_class="large", occupancy=50) == 0.03
+
+
+def test_get__partial_key(index: FactorIndex):
+    """Test: Look up a factor by a subset of the key fields; empty cells match None.
+    Expect: Returns the factor of the single matching record.
+    """
+    assert index.get(subcategory="bicycle") == 0.009
+    assert index.get(subcategory="bicycle", size_class=None) == 0.009
+
+
+def test_get__ambiguous(index: FactorIndex):
+    """Test: Look up a factor by key fields matching more than one record.
+    Expect: Raises ValueError.
+    """
+    with pytest.raises(ValueError):
+        index.get(subcategory="bus", size_class="large")
+
+
+def test_get__missing(index: FactorIndex):
+    """Test: Look up a factor that does not exist.
+    Expect: Raises KeyError.
+    """
+    with pytest.raises(KeyError):
+        index.get(subcategory="bus", size_class="small", occupancy=50)
+
+
+def test_build__duplicate_keys():
+    """Test: Build an index from records with identical keys.
+    Expect: Raises ValueError.
+    """
+    records = [{"subcategory": "car", "co2e": 0.2}, {"subcategory": "car", "co2e": 0.3}]
+    with pytest.raises(ValueError):
+        emission_factor_index(records)
+
+
+def test_tuple_values():
+    """Test: Build an index with several value columns.
+    Expect: Returns the tuple of values.
+    """
+    index = FactorIndex(
+        [{"mode": "plane", "coefficient": 1, "constant": 95}],
+        ("mode",),
+        ("coefficient", "constant"),
+    )
+
+    assert index.get(mode="plane") == (1.0, 95.0)
+
+
+def test_emission_factors__bundled_table():
+    """Test: Load the bundled emission factor table.
+    Expect: Numeric key columns are parsed, so lookups by occupancy match.
+    """
+    factors = emission_factors()
+
+    assert factors.get(
+        subcategory="bus",
+        size_class="large",
+        fuel_type="diesel",
+        occupancy=80,
+        range="long-distance",
+    ) == pytest.approx(0.0224)
+
+
+def test_snapshot__round_trip(tmp_path):
+    """Test: Build a snapshot of the bundled tables and read it.
+    Expect: The tables read from the snapshot equal the tables read from the csv files.
+    """
+    snapshot_path = build_factor_snapshot(DATA_DIR, tmp_path / "factors.snapshot")
+    tables = read_factor_snapshot(snapshot_path, source_hash(DATA_DIR))
+
+    assert sorted(tables) == [
+        "conversion_factors",
+        "detour_parameters",
+        "emission_factors",
+    ]
+    expected = emission_factor_index(
+        read_table(DATA_DIR / "emission_factors.csv", numeric_fields=("occupancy",))
+    )
+    assert dict(tables["emission_factors"].items()) == dict(expected.items())
+    assert tables["detour_parameters"].get(transportation_mode="plane") == (1.0, 95.0)
+
+
+def test_snapshot__outdated(tmp_path):
+    """Test: Build a snapshot, then change one of its csv files.
+    Expect: The snapshot is rejected for the new hash of the csv files.
+    """
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for filename in ("emission_factors.csv", "conversion_factors_heating.csv"):
+        shutil.copy(DATA_DIR / filename, data_dir)
+    detour = (DATA_DIR / "detour.csv").read_text()
+    (data_dir / "detour.csv").write_text(detour)
+    snapshot_path = build_factor_snapshot(data_dir, tmp_path / "factors.snapshot")
+    assert read_factor_snapshot(snapshot_path, source_hash(data_dir)) is not None
+
+    (data_dir / "detour.csv").write_text(detour.replace("95", "100"))
+
+    assert read_factor_snapshot(snapshot_path, source_hash(data_dir)) is None
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        pytest.param(lambda content: content[:-8] + b"\xff" * 8, id="factors"),
+        pytest.param(lambda content: b"XXXXXXXX" + content[8:], id="magic"),
+        pytest.param(lambda content: content[:20], id="truncated"),
+        pytest.param(lambda content: b"", id="empty"),
+    ],
+)
+def test_snapshot__corrupt(tmp_path, corrupt):
+    """Test: Read a snapshot whose content was modified or truncated.
+    Expect: The snapshot is rejected.
+    """
+    snapshot_path = build_factor_snapshot(DATA_DIR, tmp_path / "factors.snapshot")
+    snapshot_path.write_bytes(corrupt(snapshot_path.read_bytes()))
+
+    assert read_factor_snapshot(snapshot_path) is None
+
+
+def test_snapshot__concurrent_builds(tmp_path):
+    """Test: Build the same snapshot in several threads at once.
+    Expect: Every build leaves a valid snapshot and no temporary files.
+    """
+    snapshot_path = tmp_path / "factors.snapshot"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = list(
+            executor.map(
+                lambda _: build_factor_snapshot(DATA_DIR, snapshot_path), range(16)
+            )
+        )
+
+    assert paths == [snapshot_path] * 16
+    assert read_factor_snapshot(snapshot_path, source_hash(DATA_DIR)) is not None
+    assert [path.name for path in tmp_path.iterdir()] == ["factors.snapshot"]
+
+
+def test_load_factor_tables__unreadable_snapshot(tmp_path, monkeypatch):
+    """Test: Load the factor tables while the snapshot cannot be read even after building it.
+    Expect: A warning, and the tables built from the csv files instead of None.
+    """
+    monkeypatch.setattr(factors_module, "read_factor_snapshot", lambda *args: None)
+
+    with pytest.warns(UserWarning, match="could not be read"):
+        tables = factors_module._load_factor_tables(
+            DATA_DIR, tmp_path / "factors.snapshot"
+        )
+
+    expected = read_factor_tables(DATA_DIR)
+    assert sorted(tables) == sorted(expected)
+    assert dict(tables["emission_factors"].items()) == dict(
+        expected["emission_factors"].items()
+    )
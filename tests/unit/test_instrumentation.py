@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.instrumentation module"""
+
+import pytest
+from pytest_mock import MockerFixture
+
+import co2calculator.instrumentation as candidate
+from co2calculator.cache import MemoryCache
+from co2calculator.calculate import calc_co2_electricity
+from co2calculator.distances import geocoding_structured, set_geocoding_cache
+from co2calculator.factors import FactorIndex
+
+
+@pytest.fixture(autouse=True)
+def clean_instrumentation():
+    candidate.reset()
+    yield
+    candidate.disable()
+    candidate.reset()
+
+
+def test_disabled():
+    """Test: Run a calculation without enabling instrumentation.
+    Expect: Nothing is recorded, and factor lookups are not wrapped.
+    """
+    original_get = FactorIndex.get
+    calc_co2_electricity(1000, "german_energy_mix")
+
+    assert candidate.snapshot()["stages"] == {}
+    assert FactorIndex.get is original_get
+
+
+def test_instrumented_stages_and_hooks():
+    """Test: Record a calculation, with a hook.
+    Expect: Factor lookups are recorded as stage and passed to the hook; the lookup is unwrapped afterwards.
+    """
+    original_get = FactorIndex.get
+    events = []
+
+    def hook(kind, name, value):
+        events.append((kind, name))
+
+    candidate.add_hook(hook)
+    try:
+        with candidate.instrumented():
+            calc_co2_electricity(1000, "german_energy_mix")
+            calc_co2_electricity(2000, "german_energy_mix")
+    finally:
+        candidate.remove_hook(hook)
+
+    lookups = candidate.snapshot()["stages"]["factors.lookup"]
+    assert lookups["count"] == 2
+    assert sum(lookups["histogram"]) == 2
+    assert 0 < lookups["min"] <= lookups["max"] <= lookups["total"]
+    assert events == [("timing", "factors.lookup")] * 2
+    assert FactorIndex.get is original_get
+
+
+def test_network_counters(mocker: MockerFixture):
+    """Test: Geocode a location twice with a cache, then once more while the request fails.
+    Expect: Cache hits and misses, requests and errors are counted.
+    """
+    feature = {
+        "properties": {
+            "name": "Heidelberg",
+            "country": "Germany",
+            "layer": "locality",
+            "confidence": 1,
+        },
+        "geometry": {"coordinates": [8.69, 49.41]},
+    }
+    patched_pelias = mocker.patch(
+        "co2calculator.distances.pelias_structured",
+        return_value={"features": [feature]},
+    )
+    mocker.patch("co2calculator.distances.get_client")
+    set_geocoding_cache(MemoryCache())
+    try:
+        with candidate.instrumented():
+            geocoding_structured({"locality": "Heidelberg", "country": "DE"})
+            geocoding_structured({"locality": "Heidelberg", "country": "DE"})
+            patched_pelias.side_effect = OSError("connection reset")
+            with pytest.raises(OSError):
+                geocoding_structured({"locality": "Berlin", "country": "DE"})
+    finally:
+        set_geocoding_cache(None)
+
+    snapshot = candidate.snapshot()
+    assert snapshot["counters"] == {
+        "cache.geocoding.hit": 1,
+        "cache.geocoding.miss": 2,
+        "requests.pelias": 2,
+        "errors.pelias": 1,
+    }
+    assert snapshot["stages"]["pelias"]["count"] == 2
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for data/parse_xmls.py script"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+PARSE_XMLS = Path(__file__).parents[2] / "data" / "parse_xmls.py"
+
+
+def test_parse_xmls__reproduces_emission_factors(tmp_path):
+    """Test: Parse all Probas xmls and csv files of other sources, and check the generated table.
+    Expect: The generated table equals data/emission_factors.csv; the check writes no manifest.
+    """
+    manifest_path = tmp_path / "manifest.json"
+    result = subprocess.run(
+        [
+            sys.executable,
+            str(PARSE_XMLS),
+            "--check",
+            "--workers",
+            "1",
+            "--manifest",
+            str(manifest_path),
+        ],
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert not manifest_path.exists()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.prefetch module"""
+
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+
+import co2calculator.prefetch as candidate
+from co2calculator.batch import calc_co2_businesstrip_batch
+from co2calculator.calculate import calc_co2_businesstrip
+
+COORDS = {"heidelberg": [8.7, 49.4], "berlin": [13.4, 52.5], "munich": [11.6, 48.1]}
+HEIDELBERG, BERLIN, MUNICH = (
+    {"locality": "Heidelberg"},
+    {"locality": "Berlin"},
+    {"locality": "Munich"},
+)
+TRIPS = [
+    {"transportation_mode": "car", "start": HEIDELBERG, "destination": BERLIN},
+    {
+        "transportation_mode": "car",
+        "start": {"locality": "heidelberg "},
+        "destination": BERLIN,
+    },
+    {"transportation_mode": "car", "start": MUNICH, "destination": BERLIN},
+    {"transportation_mode": "bus", "start": MUNICH, "destination": BERLIN},
+    {"transportation_mode": "bus", "start": MUNICH, "destination": BERLIN},
+    {"transportation_mode": "bus", "distance": 100},
+    {"transportation_mode": "plane", "start": "FRA", "destination": "LJU"},
+]
+
+
+@pytest.fixture
+def patched_geocoding(mocker: MockerFixture):
+    def geocoding_structured(loc):
+        return "NAME", "DE", COORDS[loc["locality"].strip().lower()], "RES"
+
+    return mocker.patch(
+        "co2calculator.calculate.geocoding_structured",
+        side_effect=geocoding_structured,
+    )
+
+
+def test_prefetch_businesstrips(mocker: MockerFixture, patched_geocoding) -> None:
+    """Test: Resolve trips which share locations and routes.
+    Expect: Each distinct location and route is requested once; the distances are assigned to all trips.
+    """
+    patched_route = mocker.patch(
+        "co2calculator.prefetch.get_route_distances",
+        side_effect=lambda routes: [600.0 if r[0][0] < 10 else 580.0 for r in routes],
+    )
+
+    distances, stats = candidate.prefetch_businesstrips(TRIPS)
+
+    assert distances[:3] == [600.0, 600.0, 580.0]
+    assert distances[3] == distances[4] == pytest.approx(1.5 * 490, rel=0.05)
+    assert distances[5:] == [None, None]
+    assert patched_geocoding.call_count == 3
+    # both distinct car routes in one request
+    assert len(patched_route.call_args.args[0]) == 2
+    assert stats["calls_avoided"] == (10 - 3) + (3 - 2)
+
+
+def test_calc_co2_businesstrip_batch__prefetch(
+    mocker: MockerFixture, patched_geocoding
+) -> None:
+    """Test: Calculate a batch of trips given by start and destination.
+    Expect: Same results as calc_co2_businesstrip for each trip.
+    """
+    mocker.patch("co2calculator.calculate.get_route", return_value=600.0)
+    mocker.patch(
+        "co2calculator.prefetch.get_route_distances",
+        side_effect=lambda routes: [600.0] * len(routes),
+    )
+
+    emissions, distance, _, _ = calc_co2_businesstrip_batch(TRIPS[:6])
+
+    expected = [calc_co2_businesstrip(**trip)[:2] for trip in TRIPS[:6]]
+    assert np.allclose(emissions, [e for e, _ in expected])
+    assert np.allclose(distance, [d for _, d in expected])
+    assert patched_geocoding.call_count == 3 + 2 * 5
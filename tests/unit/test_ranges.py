@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.ranges module"""
+
+import numpy as np
+import pytest
+
+import co2calculator.ranges as candidate
+from co2calculator.batch import range_categories_batch
+
+
+def test_codes__limits_inclusive():
+    """Test: Compute the bins of distances at, below and above the limits, and of missing distances.
+    Expect: A distance equal to a limit is in the lower bin; missing distances have code -1, like for one distance.
+    """
+    distance = [0, 500, 500.5, 1500, 4000, 4000.5, np.nan]
+
+    codes = candidate.TRIP_RANGES.codes(distance)
+
+    assert codes.tolist() == [0, 0, 1, 1, 2, 3, -1]
+    assert [candidate.TRIP_RANGES.code(d) for d in distance] == codes.tolist()
+    assert candidate.FLIGHT_RANGES.codes([1500, 1501]).tolist() == [0, 1]
+
+
+def test_custom_bins__batch():
+    """Test: Categorize distances in a batch with custom bins.
+    Expect: Categoricals of the custom categories and descriptions, sharing the codes of the bins.
+    """
+    bins = candidate.RangeBins(
+        [100], ["regional", "national"], ["<= 100 km", "> 100 km"]
+    )
+
+    categories, descriptions = range_categories_batch([50, 150, np.nan], bins)
+
+    assert list(categories.categories) == ["regional", "national"]
+    assert categories.tolist()[:2] == ["regional", "national"]
+    assert descriptions.tolist()[:2] == ["<= 100 km", "> 100 km"]
+    assert categories.codes.tolist() == descriptions.codes.tolist() == [0, 1, -1]
+    with pytest.raises(ValueError):
+        candidate.RangeBins([100, 50], ["a", "b", "c"])
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.ratelimit module"""
+
+import pytest
+from pytest_mock import MockerFixture
+
+from co2calculator.ratelimit import TokenBucket
+
+
+def test_token_bucket(mocker: MockerFixture) -> None:
+    """Test: Take more tokens than the capacity of a bucket with 60 tokens per minute.
+    Expect: Requests within the capacity pass at once; later requests wait one second per token.
+    """
+    clock = mocker.patch("co2calculator.ratelimit.time.monotonic", return_value=0.0)
+    sleep = mocker.patch("co2calculator.ratelimit.time.sleep")
+    bucket = TokenBucket(60, capacity=2)
+
+    bucket.acquire()
+    bucket.acquire()
+    sleep.assert_not_called()
+    bucket.acquire()
+    bucket.acquire()
+    assert [c.args[0] for c in sleep.call_args_list] == pytest.approx([1.0, 2.0])
+
+    # after 10 s, the bucket is full again
+    clock.return_value = 10.0
+    sleep.reset_mock()
+    bucket.acquire()
+    sleep.assert_not_called()
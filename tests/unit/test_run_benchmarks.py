@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for benchmarks/run_benchmarks.py script"""
+
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+RUN_BENCHMARKS = Path(__file__).parents[2] / "benchmarks" / "run_benchmarks.py"
+
+
+@pytest.fixture(scope="module")
+def candidate():
+    spec = importlib.util.spec_from_file_location("run_benchmarks", RUN_BENCHMARKS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_batch_throughput(candidate):
+    """Test: Measure the batch throughput of run_calculate.py for input files of 10 rows.
+    Expect: One result with the number of rows and rows per second for each input file.
+    """
+    results = candidate.batch_throughput([10])
+
+    assert sorted(results) == [
+        "run_calculate[business_trips_car,10]",
+        "run_calculate[business_trips_plane,10]",
+        "run_calculate[electricity,10]",
+        "run_calculate[heating,10]",
+    ]
+    assert all(result["rows"] == 10 for result in results.values())
+    assert all(result["rows_per_s"] > 0 for result in results.values())
+
+
+def test_batch_throughput__filter(candidate):
+    """Test: Measure the batch throughput with a filter matching the heating input only.
+    Expect: Only the heating benchmark is run.
+    """
+    results = candidate.batch_throughput([10], name_filter="heating")
+
+    assert list(results) == ["run_calculate[heating,10]"]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for run_calculate.py script"""
+
+import pandas as pd
+import pytest
+from pytest_mock import MockerFixture
+
+import run_calculate as candidate
+from co2calculator import calc_co2_heating
+
+HEATING = """id;consumption;energy_unit;fuel_type
+1;250;kg;woodchips
+2;100;kWh;oil
+3;300;l;woodchips
+4;1000;kWh;gas
+5;50;kg;pellet
+"""
+BUS_TRIPS = """id;bus_fuel;bus_size;occupancy;distance_km;stops;roundtrip
+1;diesel;large;80;;Heidelberg, Germany-Berlin, Germany;False
+2;diesel;large;80;;Heidelberg, Germany-Berlin, Germany;True
+3;diesel;large;80;;Berlin, Germany-Heidelberg, Germany;False
+"""
+COORDS = {"Heidelberg": [8.7, 49.4], "Berlin": [13.4, 52.5]}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_main__bad_row(tmp_path, workers: int):
+    """Test: Compute a heating file in chunks of two rows, one of which has a unit not available for its fuel type.
+    Expect: The other rows are computed as usual; the bad row has no emissions and its error in the column error.
+    """
+    (tmp_path / "heating.csv").write_text(HEATING)
+
+    exit_code = candidate.main(
+        ["--input-dir", str(tmp_path), "--chunksize", "2", "--workers", str(workers)]
+    )
+
+    assert exit_code == 0
+    output = pd.read_csv(tmp_path / "heating_calc.csv", sep=";")
+    assert output["id"].tolist() == [1, 2, 3, 4, 5]
+    assert output["error"].notna().tolist() == [False, False, True, False, False]
+    assert "ValueError" in output.loc[2, "error"]
+    assert output["co2e_kg"].isna().tolist() == [False, False, True, False, False]
+    assert output.loc[3, "co2e_kg"] == pytest.approx(calc_co2_heating(1000, "gas"))
+
+
+def test_main__bad_row_strict(tmp_path):
+    """Test: Compute a heating file with a bad row with --strict.
+    Expect: The computation of the file fails, and no output is written.
+    """
+    (tmp_path / "heating.csv").write_text(HEATING)
+
+    exit_code = candidate.main(
+        ["--input-dir", str(tmp_path), "--chunksize", "2", "--strict"]
+    )
+
+    assert exit_code == 1
+    assert not (tmp_path / "heating_calc.csv").exists()
+
+
+def test_main__requests_avoided(tmp_path, mocker: MockerFixture, capsys):
+    """Test: Compute bus trips which share their start and destination.
+    Expect: Each location is geocoded once, and the number of requests avoided is printed.
+    """
+    (tmp_path / "business_trips_bus.csv").write_text(BUS_TRIPS)
+    patched_geocoding = mocker.patch(
+        "co2calculator.calculate.geocoding_structured",
+        side_effect=lambda loc: ("NAME", "DE", COORDS[loc["locality"]], "RES"),
+    )
+
+    exit_code = candidate.main(["--input-dir", str(tmp_path)])
+
+    assert exit_code == 0
+    output = pd.read_csv(tmp_path / "business_trips_bus_calc.csv", sep=";")
+    assert output["co2e_kg"].notna().all()
+    assert patched_geocoding.call_count == 2
+    assert "  4 request(s) avoided" in capsys.readouterr().out
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.stations module"""
+
+import random
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+from co2calculator.distances import geocoding_train_stations
+from co2calculator.stations import (
+    SCORE_TOLERANCE,
+    StationIndex,
+    StationMatcher,
+    build_station_index,
+    match_stations,
+)
+
+STATIONS_CSV = """id;name;slug;uic;uic8_sncf;latitude;longitude;parent_station_id;country;time_zone
+1;Heidelberg Hbf;heidelberg-hbf;8000156;;49.403567;8.675442;;DE;Europe/Berlin
+2;Heidelberg-Altstadt;heidelberg-altstadt;8000155;;49.41475;8.71882;;DE;Europe/Berlin
+3;Berlin Hbf;berlin-hbf;8011160;;52.525592;13.369545;;DE;Europe/Berlin
+4;Berlin Geisterbahnhof;berlin-geisterbahnhof;;;;;;DE;Europe/Berlin
+5;Basel SBB;basel-sbb;8500010;;47.547408;7.589547;;CH;Europe/Zurich
+"""
+
+
+@pytest.fixture
+def station_index(tmp_path: Path) -> StationIndex:
+    csv_path = tmp_path / "stations.csv"
+    csv_path.write_text(STATIONS_CSV, encoding="utf-8")
+    return StationIndex(build_station_index(csv_path, tmp_path / "index.npz"))
+
+
+def test_build_station_index__concurrent_builds(tmp_path: Path):
+    """Test: Build the same station index in several threads at once.
+    Expect: Every build leaves a valid index and no temporary files.
+    """
+    csv_path = tmp_path / "stations.csv"
+    csv_path.write_text(STATIONS_CSV, encoding="utf-8")
+    index_path = tmp_path / "index.npz"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = list(
+            executor.map(lambda _: build_station_index(csv_path, index_path), range(16))
+        )
+
+    assert paths == [index_path] * 16
+    assert StationIndex(index_path).countries == {"DE", "CH"}
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "index.npz",
+        "stations.csv",
+    ]
+
+
+def test_station_index__partitions(station_index: StationIndex):
+    """Test: Build an index from a station database.
+    Expect: Stations are partitioned by country; stations without coordinates are dropped.
+    """
+    assert station_index.countries == {"DE", "CH"}
+    germany = station_index.partition("DE")
+    assert germany.slugs == ["heidelberg-hbf", "heidelberg-altstadt", "berlin-hbf"]
+    assert germany.coords[2].tolist() == [52.525592, 13.369545]
+    assert station_index.partition("FR").slugs == []
+
+
+def test_geocoding_train_stations(
+    mocker: MockerFixture, station_index: StationIndex
+) -> None:
+    """Test: Geocode a train station by name.
+    Expect: Returns name, country and [long, lat] of the best match within the country.
+    """
+    mocker.patch(
+        "co2calculator.distances.load_station_index", return_value=station_index
+    )
+
+    name, country, coords = geocoding_train_stations(
+        {"country": "DE", "station_name": "Berlin Hbf"}
+    )
+
+    assert (name, country, coords) == ("Berlin Hbf", "DE", [13.369545, 52.525592])
+
+
+def test_geocoding_train_stations__unknown_country(
+    mocker: MockerFixture, station_index: StationIndex
+) -> None:
+    """Test: Geocode a train station in a country without stations in the database.
+    Expect: Raises ValueError, so that callers can fall back to address geocoding.
+    """
+    mocker.patch(
+        "co2calculator.distances.load_station_index", return_value=station_index
+    )
+
+    with pytest.warns(UserWarning), pytest.raises(ValueError):
+        geocoding_train_stations({"country": "CN", "station_name": "Beijing"})
+
+
+def test_station_matcher__same_as_full_scan():
+    """Test: Match station names against many slugs, with and without candidate pruning.
+    Expect: Pruned matches score at most SCORE_TOLERANCE below the full scan; mostly the same slug.
+    """
+    rng = random.Random(0)
+    syllables = [
+        "ber",
+        "lin",
+        "hei",
+        "del",
+        "burg",
+        "furt",
+        "stadt",
+        "bach",
+        "au",
+        "feld",
+        "heim",
+        "dorf",
+    ]
+    suffixes = ["hbf", "sud", "nord", "ost", "west", "bahnhof", "altstadt", ""]
+    slugs = [
+        "-".join(
+            filter(
+                None,
+                [
+                    "".join(rng.sample(syllables, rng.randint(2, 3))),
+                    rng.choice(suffixes),
+                ],
+            )
+        )
+        for _ in range(2000)
+    ]
+    queries = [slug.replace("-", " ").title() for slug in rng.sample(slugs, 50)]
+    queries += [q[1:-2] for q in queries] + ["Bergfeld Sued", "Heimdorf Bf", "xyz"]
+    matcher = StationMatcher(slugs)
+
+    same = 0
+    for query in queries:
+        # what thefuzz.process.extractOne(query, slugs, scorer=fuzz.partial_ratio) returns
+        expected_slug, expected_score, _ = process.extractOne(
+            query, slugs, scorer=fuzz.partial_ratio, processor=default_process
+        )
+        expected_score = round(expected_score)
+        i, score = matcher.match(query)
+        assert round(score) >= expected_score - SCORE_TOLERANCE
+        same += slugs[i] == expected_slug or round(score) == expected_score
+    assert same >= 0.95 * len(queries)
+
+
+def test_match_stations(mocker: MockerFixture, station_index: StationIndex) -> None:
+    """Test: Match several station names within one country.
+    Expect: Name, country, [long, lat] and score of the best match for each name.
+    """
+    mocker.patch(
+        "co2calculator.stations.load_station_index", return_value=station_index
+    )
+
+    matches = match_stations(["Heidelberg Altstadt", "berlin", "Heidelberg Hbf"], "DE")
+
+    assert [m[0] for m in matches] == [
+        "Heidelberg-Altstadt",
+        "Berlin Hbf",
+        "Heidelberg Hbf",
+    ]
+    assert matches[1][2] == [13.369545, 52.525592]
+    assert all(m[3] == 100 for m in matches)
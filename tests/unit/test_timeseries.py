@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Unit tests for co2calculator.timeseries module"""
+
+import numpy as np
+import pytest
+
+import co2calculator.timeseries as candidate
+from co2calculator.calculate import calc_co2_electricity
+
+# hourly readings over two days, and factors changing every day at noon
+TIMES = np.arange("2023-01-31", "2023-02-02", dtype="datetime64[h]")
+CONSUMPTION = np.arange(len(TIMES), dtype=float)
+FACTORS = candidate.FactorSeries(
+    ["2023-01-31", "2023-01-31T12:00", "2023-02-01T12:00"], [0.5, 0.2, 0.1]
+)
+
+
+def test_factor_series():
+    """Test: Look up the factors at times before, at and after the start times of the factors.
+    Expect: Each factor applies from its start time on; times before the first factor raise ValueError.
+    """
+    factors = FACTORS.at(["2023-01-31T11:59", "2023-01-31T12:00", "2024-01-01"])
+
+    assert factors.tolist() == [0.5, 0.2, 0.1]
+    with pytest.raises(ValueError):
+        FACTORS.at(["2023-01-30"])
+    with pytest.raises(ValueError):
+        candidate.FactorSeries(["2023-01-02", "2023-01-01"], [0.5, 0.2])
+
+
+def test_static_factor__matches_scalar():
+    """Test: Calculate the emissions of a series with the factor of an energy mix, in chunks and as a whole.
+    Expect: The total equals calc_co2_electricity of the total consumption.
+    """
+    chunks = (CONSUMPTION[i : i + 10] for i in range(0, len(CONSUMPTION), 10))
+
+    consumption, emissions = candidate.total_electricity_emissions(
+        chunks, fuel_type="solar", energy_share=0.5
+    )
+
+    expected = calc_co2_electricity(CONSUMPTION.sum(), "solar", energy_share=0.5)
+    assert consumption == CONSUMPTION.sum()
+    assert emissions == pytest.approx(expected)
+    assert candidate.calc_co2_electricity_series(
+        CONSUMPTION, fuel_type="solar", energy_share=0.5
+    ).sum() == pytest.approx(expected)
+
+
+def test_factor_series__by_period():
+    """Test: Calculate the emissions of a series with factors varying over time, per day, in chunks crossing days.
+    Expect: Consumption and emissions per day equal the sums of the readings of each day.
+    """
+    chunks = (
+        (TIMES[i : i + 7], CONSUMPTION[i : i + 7]) for i in range(0, len(TIMES), 7)
+    )
+
+    days, consumption, emissions = candidate.electricity_emissions_by_period(
+        chunks, "D", factors=FACTORS
+    )
+
+    per_interval = CONSUMPTION * FACTORS.at(TIMES)
+    assert days.astype(str).tolist() == ["2023-01-31", "2023-02-01"]
+    assert consumption.tolist() == [CONSUMPTION[:24].sum(), CONSUMPTION[24:].sum()]
+    assert emissions == pytest.approx(
+        [per_interval[:24].sum(), per_interval[24:].sum()]
+    )
+    with pytest.raises(ValueError):
+        candidate.calc_co2_electricity_series(CONSUMPTION, factors=FACTORS)